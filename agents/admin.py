@@ -39,7 +39,7 @@ class UserAdmin(BaseUserAdmin):
 
 @admin.register(AgentSession)
 class AgentSessionAdmin(admin.ModelAdmin):
-    list_display = ['session_id', 'agent_type', 'user', 'created_at', 'updated_at']
+    list_display = ['session_id', 'agent_type', 'user', 'message_count', 'last_message_at', 'updated_at']
     list_filter = ['agent_type', 'created_at']
     search_fields = ['session_id', 'user__username']
 
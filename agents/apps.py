@@ -6,4 +6,4 @@ class AgentsConfig(AppConfig):
     name = 'agents'
 
     def ready(self):
-        import agents.signals  # noqa: F401 — registers post_save signals
+        import agents.signals  # noqa: F401 — registers post_save + connection_created signals
@@ -0,0 +1,28 @@
+"""
+Recompute AgentSession.message_count / last_message_at / last_agent_type
+from the Message table.
+
+Usage:
+    python manage.py backfill_session_counters
+    python manage.py backfill_session_counters --user-id 42 --batch-size 1000
+"""
+from django.core.management.base import BaseCommand
+
+from agents.models import AgentSession
+from agents.services.message_store import backfill_session_counters
+
+
+class Command(BaseCommand):
+    help = "Backfill denormalized session counters from existing messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help="Only sessions owned by this user")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = AgentSession.objects.all()
+        if options['user_id']:
+            queryset = queryset.filter(user_id=options['user_id'])
+
+        updated = backfill_session_counters(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled counters for {updated} session(s)"))
@@ -0,0 +1,135 @@
+"""
+Write-concurrency benchmark for the SQLite connection PRAGMAs.
+
+Simulates chat turns (a Message + Event + AuditLog insert per transaction)
+from several writer threads while reader threads page through history, once
+with SQLite defaults and once with each configured pragma profile, against
+a scratch database file.
+
+Usage:
+    python manage.py bench_sqlite_writes
+    python manage.py bench_sqlite_writes --writers 16 --turns 200 --readers 4
+"""
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from agents.services.sqlite_tuning import apply_sqlite_pragmas
+
+SCHEMA = """
+CREATE TABLE message (id INTEGER PRIMARY KEY, session_id INTEGER, role TEXT, content TEXT, created_at REAL);
+CREATE INDEX message_session ON message (session_id, created_at);
+CREATE TABLE event (id INTEGER PRIMARY KEY, session_id INTEGER, event_type TEXT, payload TEXT, ts REAL);
+CREATE TABLE auditlog (id INTEGER PRIMARY KEY, session_id INTEGER, action TEXT, details TEXT, ts REAL);
+"""
+
+# Python's sqlite3 default: 5 s lock wait, rollback journal, synchronous=FULL
+BASELINE = {}
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent chat-style writes under different SQLite PRAGMA profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--turns', type=int, default=100, help="Transactions per writer")
+        parser.add_argument('--timeout', type=float, default=0.1,
+                            help="Python-level lock timeout (s) so busy_timeout is what's measured")
+
+    def handle(self, *args, **options):
+        profiles = {'baseline (defaults)': BASELINE}
+        profiles.update(getattr(settings, 'SQLITE_PRAGMA_PROFILES', {}))
+
+        self.stdout.write(
+            f"{'profile':<22} {'turns/s':>9} {'p95 ms':>8} {'locked':>7} {'reads':>7}"
+        )
+        for name, pragmas in profiles.items():
+            result = self._run(pragmas, **options)
+            self.stdout.write(
+                f"{name:<22} {result['throughput']:>9.1f} {result['p95_ms']:>8.1f} "
+                f"{result['locked']:>7} {result['reads']:>7}"
+            )
+
+    def _run(self, pragmas, *, writers, readers, turns, timeout, **_):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "bench.sqlite3"
+            setup = sqlite3.connect(db_path)
+            setup.executescript(SCHEMA)
+            setup.close()
+
+            latencies, errors, reads = [], [], [0]
+            lock = threading.Lock()
+            stop = threading.Event()
+
+            def connect():
+                conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+                apply_sqlite_pragmas(conn.cursor(), pragmas)
+                return conn
+
+            def writer(worker_id):
+                conn = connect()
+                for turn in range(turns):
+                    started = time.perf_counter()
+                    try:
+                        with conn:
+                            now = time.time()
+                            conn.execute(
+                                "INSERT INTO message (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                                (worker_id, 'agent', 'x' * 512, now),
+                            )
+                            conn.execute(
+                                "INSERT INTO event (session_id, event_type, payload, ts) VALUES (?, ?, ?, ?)",
+                                (worker_id, 'AGENT_RESPONSE', '{}', now),
+                            )
+                            conn.execute(
+                                "INSERT INTO auditlog (session_id, action, details, ts) VALUES (?, ?, ?, ?)",
+                                (worker_id, 'Agent Message Processed', '{}', now),
+                            )
+                    except sqlite3.OperationalError as exc:
+                        with lock:
+                            errors.append(str(exc))
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                conn.close()
+
+            def reader(worker_id):
+                conn = connect()
+                while not stop.is_set():
+                    try:
+                        conn.execute(
+                            "SELECT * FROM message WHERE session_id = ? ORDER BY created_at DESC LIMIT 50",
+                            (worker_id % max(writers, 1),),
+                        ).fetchall()
+                        with lock:
+                            reads[0] += 1
+                    except sqlite3.OperationalError:
+                        pass
+                conn.close()
+
+            reader_threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+            writer_threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            started = time.perf_counter()
+            for t in reader_threads + writer_threads:
+                t.start()
+            for t in writer_threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            for t in reader_threads:
+                t.join()
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0
+        return {
+            'throughput': len(latencies) / elapsed if elapsed else 0.0,
+            'p95_ms': p95,
+            'locked': len(errors),
+            'reads': reads[0],
+        }
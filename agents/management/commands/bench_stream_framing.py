@@ -0,0 +1,117 @@
+"""
+Bytes-on-the-wire and CPU benchmark for the chat stream framings.
+
+Replays a synthetic streamed reply (one event per token, ids as a
+resumable stream carries them, tokens arriving at --rate per second)
+through each framing of agents.services.stream_framing, for SSE and for
+WebSocket frames, and compares it with the default ``json`` framing.
+
+Usage:
+    python manage.py bench_stream_framing
+    python manage.py bench_stream_framing --tokens 2000 --rate 200 --repeat 50
+"""
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from agents.services.stream_framing import ChunkBatcher, FLUSH_INTERVAL, encode_sse, encode_ws, msgpack
+
+WORDS = (
+    "plan", "your", "week", "study", "review", "notes", "for", "the", "exam", "on",
+    "Friday", "take", "a", "walk", "after", "lunch", "and", "drink", "water", "café",
+)
+
+
+def ws_header_bytes(payload: int) -> int:
+    """Server-to-client WebSocket frame header size (unmasked)."""
+    return 2 if payload < 126 else 4 if payload < 65536 else 10
+
+
+class Command(BaseCommand):
+    help = "Compare bytes and CPU per token of the stream framings against the current format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=500, help="Tokens in the synthetic reply")
+        parser.add_argument('--rate', type=float, default=100.0, help="Tokens per second from the model")
+        parser.add_argument('--interval', type=float, default=FLUSH_INTERVAL, help="Batch flush interval (s)")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs to average CPU time over")
+
+    def handle(self, *args, **options):
+        events, times = self._reply(options['tokens'], options['rate'])
+        payload = sum(len(e['content'].encode()) for e in events if e['type'] == 'chunk')
+        tokens = options['tokens']
+
+        cases = [
+            ('SSE', 'json', False),
+            ('SSE', 'compact', True),
+            ('WebSocket', 'json', False),
+            ('WebSocket', 'compact', True),
+        ]
+        if msgpack is not None:
+            cases.append(('WebSocket', 'msgpack', True))
+        else:
+            self.stdout.write("msgpack is not installed; skipping the msgpack framing")
+
+        self.stdout.write(
+            f"{tokens} tokens at {options['rate']:g}/s, {payload} bytes of text, "
+            f"flush interval {options['interval'] * 1000:g} ms"
+        )
+        self.stdout.write(
+            f"{'transport':<10} {'framing':<8} {'frames':>7} {'bytes':>9} {'B/token':>8} "
+            f"{'overhead':>9} {'us/token':>9} {'vs json':>8}"
+        )
+        baseline = {}
+        for transport, framing, batched in cases:
+            result = self._measure(events, times, transport, framing, batched, options)
+            base = baseline.setdefault(transport, result)
+            self.stdout.write(
+                f"{transport:<10} {framing:<8} {result['frames']:>7} {result['bytes']:>9} "
+                f"{result['bytes'] / tokens:>8.1f} {(result['bytes'] - payload) / payload:>8.1%} "
+                f"{result['cpu'] / tokens * 1e6:>9.2f} {result['bytes'] / base['bytes']:>7.0%}"
+            )
+
+    def _reply(self, tokens, rate):
+        """A stream's events (agent_selected, chunks, actions_applied) and arrival times."""
+        rng = random.Random(0)
+        stream_id = uuid.uuid4().hex
+        events = [{'type': 'agent_selected', 'agent': 'study_agent', 'session_id': str(uuid.uuid4()),
+                   'model': 'llama-3.3-70b-versatile'}]
+        events += [{'type': 'chunk', 'content': f" {rng.choice(WORDS)}"} for _ in range(tokens)]
+        events.append({'type': 'actions_applied', 'actions': [{'type': 'task', 'status': 'created', 'id': 42}]})
+        events = [{**event, 'id': f"{stream_id}:{seq}"} for seq, event in enumerate(events)]
+        # Jittered token arrivals around the model's rate
+        times, now = [], 0.0
+        for _ in events:
+            times.append(now)
+            now += rng.expovariate(rate)
+        return events, times
+
+    def _measure(self, events, times, transport, framing, batched, options):
+        """Frames and bytes for one run, CPU seconds averaged over --repeat runs."""
+        if transport == 'SSE':
+            def size(event):
+                return len(encode_sse(event, framing).encode())
+        else:
+            def size(event):
+                message = encode_ws(event, framing)
+                body = message['bytes'] if 'bytes' in message else message['text'].encode()
+                return ws_header_bytes(len(body)) + len(body)
+
+        started = time.process_time()
+        for _ in range(options['repeat']):
+            frames = sizes = 0
+            batcher = ChunkBatcher(options['interval']) if batched else None
+            for event, now in zip(events, times):
+                out = [event]
+                if batcher is not None:
+                    # A pending batch due before this arrival was flushed by the timer
+                    out = batcher.flush() if batcher.deadline is not None and now >= batcher.deadline else []
+                    out += batcher.add(event, now)
+                # (the reply ends with actions_applied, which flushes the last batch)
+                for frame in out:
+                    frames += 1
+                    sizes += size(frame)
+        cpu = (time.process_time() - started) / options['repeat']
+        return {'frames': frames, 'bytes': sizes, 'cpu': cpu}
@@ -0,0 +1,34 @@
+"""
+Export everything one user owns to (gzip) JSONL.
+
+Usage:
+    python manage.py export_user_data --email me@example.com --output me.jsonl.gz
+    python manage.py export_user_data --user-id 42 --output /exports/42.jsonl.gz
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.models import User
+from agents.services.user_export import CHUNK_SIZE, export_user_data
+
+
+class Command(BaseCommand):
+    help = "Stream one user's sessions, messages and saved data to a JSONL export."
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--user-id', type=int)
+        target.add_argument('--email')
+        parser.add_argument('--output', required=True, help="Path; compressed when it ends in .gz")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user_id']} if options['user_id'] else {'email__iexact': options['email']}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError("User not found")
+
+        counts = export_user_data(user, options['output'], chunk_size=options['chunk_size'])
+        for record_type, count in counts.items():
+            self.stdout.write(f"{record_type:<22} {count:>8}")
+        self.stdout.write(self.style.SUCCESS(f"Exported {user.email} to {options['output']}"))
@@ -0,0 +1,37 @@
+"""
+Load a user export produced by `export_user_data`.
+
+Usage:
+    python manage.py import_user_data me.jsonl.gz                    # creates the user
+    python manage.py import_user_data me.jsonl.gz --into-email me@example.com
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.models import User
+from agents.services.user_export import CHUNK_SIZE, ExportFormatError, import_user_data
+
+
+class Command(BaseCommand):
+    help = "Bulk-import a JSONL user export, remapping ids."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--into-email', help="Import into this existing user instead of creating one")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['into_email']:
+            try:
+                user = User.objects.get(email__iexact=options['into_email'])
+            except User.DoesNotExist:
+                raise CommandError("Target user not found")
+
+        try:
+            result = import_user_data(options['path'], user=user, chunk_size=options['chunk_size'])
+        except ExportFormatError as exc:
+            raise CommandError(str(exc))
+
+        for record_type, count in result['counts'].items():
+            self.stdout.write(f"{record_type:<22} {count:>8}")
+        self.stdout.write(self.style.SUCCESS(f"Imported into user {result['user_id']}"))
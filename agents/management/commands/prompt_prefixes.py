@@ -0,0 +1,59 @@
+"""
+Report each agent's cacheable prompt prefix: the system prompt and user
+profile messages that should be byte-identical on every turn, and check
+that per-turn context doesn't leak into them.
+
+Usage:
+    python manage.py prompt_prefixes
+    python manage.py prompt_prefixes --user-id 42
+"""
+import hashlib
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.models import User, UserProfile
+from agents.services.orchestrator import orchestrator
+from agents.services.prompt_cache import CHARS_PER_TOKEN
+
+
+class Command(BaseCommand):
+    help = "Measure the byte-identical prompt prefix of every agent."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help="Use this user's profile instead of a sample one")
+
+    def handle(self, *args, **options):
+        profile = None
+        if options['user_id']:
+            user = User.objects.filter(pk=options['user_id']).first()
+            if user is None:
+                raise CommandError(f"No user with id {options['user_id']}")
+            profile = UserProfile.objects.filter(user=user).first()
+
+        self.stdout.write(f"{'agent':<22}{'prefix tokens':>15}  stable  sha256")
+        unstable = []
+        for agent, runner in orchestrator.agents.items():
+            context = profile.get_agent_context(agent) if profile else {'name': 'Sample User', 'timezone': 'UTC'}
+            # Two turns with different per-turn context must share the prefix
+            first = runner._build_prefix(dict(context))
+            second = runner._build_prefix({
+                **context,
+                'saved_items': ["Task: Review notes"],
+                'collaborating_agents': ['wellness'],
+                'retrieved_notes': [{'label': 'Note', 'snippet': '...'}],
+            })
+
+            encoded = json.dumps(first, ensure_ascii=False).encode()
+            stable = encoded == json.dumps(second, ensure_ascii=False).encode()
+            if not stable:
+                unstable.append(agent)
+            prefix_chars = sum(len(m['content']) for m in first)
+            self.stdout.write(
+                f"{agent:<22}{prefix_chars // CHARS_PER_TOKEN:>15}"
+                f"  {'yes' if stable else 'NO':<6}  {hashlib.sha256(encoded).hexdigest()[:12]}"
+            )
+
+        if unstable:
+            raise CommandError(f"Per-turn content changes the prefix of: {', '.join(unstable)}")
+        self.stdout.write(self.style.SUCCESS("Every agent's prefix is byte-identical across turns."))
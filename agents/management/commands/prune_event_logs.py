@@ -0,0 +1,54 @@
+"""
+Archive Event/AuditLog rows past their retention age to gzip JSONL, delete
+them in chunks, then vacuum.  Safe to run repeatedly from cron.
+
+Usage:
+    python manage.py prune_event_logs
+    python manage.py prune_event_logs --event-days 30 --audit-days 90 --vacuum full
+    python manage.py prune_event_logs --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+from agents.services.retention import CHUNK_SIZE, VACUUM_MODES, run_retention
+
+
+class Command(BaseCommand):
+    help = "Archive and delete old events and audit logs, then compact the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event-days', type=int, help="Keep events newer than this (default: EVENT_RETENTION_DAYS)")
+        parser.add_argument('--audit-days', type=int,
+                            help="Keep audit logs newer than this (default: AUDIT_LOG_RETENTION_DAYS)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--vacuum', choices=VACUUM_MODES, default='auto')
+        parser.add_argument('--archive-dir', help="Override settings.ARCHIVE_DIR")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be pruned")
+
+    def handle(self, *args, **options):
+        summary = run_retention(
+            event_days=options['event_days'],
+            audit_days=options['audit_days'],
+            chunk_size=options['chunk_size'],
+            vacuum=options['vacuum'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run'],
+        )
+
+        for key in ('audit_logs', 'events'):
+            result = summary[key]
+            if summary['dry_run']:
+                line = f"would prune {result['matched']}"
+            else:
+                line = f"pruned {result['deleted']}"
+            line = f"{result['model']}: {line} row(s) older than {result['cutoff']}"
+            if result['archive_path']:
+                line += f" -> {result['archive_path']}"
+            self.stdout.write(line)
+
+        compaction = summary['compaction']
+        if compaction.get('before'):
+            freed = compaction['before']['page_count'] - compaction['after']['page_count']
+            self.stdout.write(f"Compaction: {compaction['action']} freed {freed} page(s)")
+        else:
+            self.stdout.write(f"Compaction: {compaction['action']}")
+        self.stdout.write(self.style.SUCCESS("Retention run complete"))
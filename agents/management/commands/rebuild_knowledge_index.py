@@ -0,0 +1,32 @@
+"""
+Rebuild the knowledge agent's retrieval index from notes, messages and
+saved items.  Needed after writes that bypass model signals (bulk imports,
+raw SQL backfills); normal writes keep the index current on their own.
+
+Usage:
+    python manage.py rebuild_knowledge_index
+    python manage.py rebuild_knowledge_index --user-id 42
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from agents.models import User
+from agents.services.knowledge_index import REBUILD_CHUNK_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the knowledge retrieval index for one user or everyone."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help="Only this user's documents")
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user_id']:
+            user = User.objects.filter(pk=options['user_id']).first()
+            if user is None:
+                raise CommandError(f"No user with id {options['user_id']}")
+
+        counts = rebuild_index(user, chunk_size=options['chunk_size'])
+        summary = ", ".join(f"{n} {source_type}" for source_type, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {sum(counts.values())} document(s): {summary}"))
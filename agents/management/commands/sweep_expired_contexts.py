@@ -0,0 +1,33 @@
+"""
+Delete expired AgentContext rows in small batches.
+
+Run it from cron, or let it loop on its own with --every.
+
+Usage:
+    python manage.py sweep_expired_contexts
+    python manage.py sweep_expired_contexts --batch-size 1000 --every 300
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from agents.services.context_manager import SWEEP_BATCH_SIZE, sweep_expired_contexts
+
+
+class Command(BaseCommand):
+    help = "Sweep expired agent contexts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument('--every', type=int, metavar='SECONDS',
+                            help="Keep running, sweeping every SECONDS (default: sweep once)")
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_expired_contexts(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Swept {deleted} expired context(s)"))
+            if not options['every']:
+                break
+            close_old_connections()
+            time.sleep(options['every'])
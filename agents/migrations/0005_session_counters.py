@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0004_habits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentsession',
+            name='last_agent_type',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='agentsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agentsession',
+            name='message_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='agentsession',
+            index=models.Index(fields=['user', '-updated_at'], name='agents_agen_user_id_9f0f37_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0005_session_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='habit',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='agents.agentsession'),
+        ),
+    ]
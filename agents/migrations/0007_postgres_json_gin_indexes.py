@@ -0,0 +1,44 @@
+"""
+GIN index on Message.metadata for PostgreSQL deployments.
+
+Message.metadata is filtered by key (``metadata__has_key='agent_type'``)
+and extracted with ``KT('metadata__agent_type')`` when session counters are
+backfilled.  On PostgreSQL JSONField is ``jsonb`` and a GIN index serves
+``?`` / ``@>`` lookups; SQLite has no equivalent, so this is a no-op there.
+
+Built CONCURRENTLY so it can be applied to a live table, hence atomic=False.
+"""
+from django.db import migrations
+
+GIN_INDEXES = [
+    ('agents_message_metadata_gin', 'agents_message', 'metadata'),
+]
+
+
+def create_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in GIN_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" USING gin ("{column}")'
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _table, _column in GIN_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('agents', '0006_habit_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
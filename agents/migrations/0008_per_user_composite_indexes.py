@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0007_postgres_json_gin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='agents_meal_user_id_5fa3ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', '-created_at'], name='agents_meal_user_id_a35e5f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['session', 'created_at'], name='agents_mess_session_18396c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', '-created_at'], name='agents_stud_user_id_82463d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'status', 'priority'], name='agents_task_user_id_d0edb3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'priority', 'due_date'], name='agents_task_user_id_4ace68_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wellnessactivity',
+            index=models.Index(fields=['user', 'activity_type', 'recorded_at'], name='agents_well_user_id_e9fee0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wellnessactivity',
+            index=models.Index(fields=['user', 'recorded_at'], name='agents_well_user_id_df00b7_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-19 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0008_per_user_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentcontext',
+            index=models.Index(fields=['session', 'expires_at'], name='agents_agen_session_b582ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentcontext',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='agents_ctx_expires_at_idx'),
+        ),
+    ]
@@ -0,0 +1,134 @@
+"""
+Full-text search over Message.content.
+
+SQLite: an FTS5 index (``agents_message_fts``) whose external content is a
+view over messages joined to their session.  Besides the text it indexes
+an ``owner`` token (``u<user_id>``), so a per-user query intersects two
+posting lists instead of filtering every match across all users.
+Triggers on ``agents_message`` keep it in sync; a trigger on session
+ownership changes re-indexes that session's messages.  Skipped when the
+SQLite build lacks FTS5 (search then falls back to LIKE).  A later
+migration that rebuilds ``agents_message`` on SQLite drops its triggers and
+must re-create them (``SQLITE_FORWARD`` here) and ``'rebuild'`` the index.
+
+PostgreSQL: a GIN expression index on ``to_tsvector('english', content)``,
+matching the expression ``SearchVector('content', config='english')``
+emits.  Built CONCURRENTLY, hence atomic=False.
+"""
+from django.db import migrations
+
+OWNER = "'u' || COALESCE({alias}.user_id, 0)"
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIEW agents_message_fts_source AS
+    SELECT m.id AS id, m.content AS content, {OWNER.format(alias='s')} AS owner
+    FROM agents_message m JOIN agents_agentsession s ON s.id = m.session_id
+    """,
+    """
+    CREATE VIRTUAL TABLE agents_message_fts USING fts5(
+        content, owner,
+        content='agents_message_fts_source', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER agents_message_fts_ai AFTER INSERT ON agents_message BEGIN
+        INSERT INTO agents_message_fts (rowid, content, owner)
+        SELECT new.id, new.content, {OWNER.format(alias='s')}
+        FROM agents_agentsession s WHERE s.id = new.session_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER agents_message_fts_ad AFTER DELETE ON agents_message BEGIN
+        INSERT INTO agents_message_fts (agents_message_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, {OWNER.format(alias='s')}
+        FROM agents_agentsession s WHERE s.id = old.session_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER agents_message_fts_au AFTER UPDATE OF content, session_id ON agents_message BEGIN
+        INSERT INTO agents_message_fts (agents_message_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, {OWNER.format(alias='s')}
+        FROM agents_agentsession s WHERE s.id = old.session_id;
+        INSERT INTO agents_message_fts (rowid, content, owner)
+        SELECT new.id, new.content, {OWNER.format(alias='s')}
+        FROM agents_agentsession s WHERE s.id = new.session_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER agents_message_fts_owner AFTER UPDATE OF user_id ON agents_agentsession BEGIN
+        INSERT INTO agents_message_fts (agents_message_fts, rowid, content, owner)
+        SELECT 'delete', m.id, m.content, {OWNER.format(alias='old')}
+        FROM agents_message m WHERE m.session_id = old.id;
+        INSERT INTO agents_message_fts (rowid, content, owner)
+        SELECT m.id, m.content, {OWNER.format(alias='new')}
+        FROM agents_message m WHERE m.session_id = new.id;
+    END
+    """,
+    # Index existing history
+    "INSERT INTO agents_message_fts (agents_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS agents_message_fts_owner",
+    "DROP TRIGGER IF EXISTS agents_message_fts_au",
+    "DROP TRIGGER IF EXISTS agents_message_fts_ad",
+    "DROP TRIGGER IF EXISTS agents_message_fts_ai",
+    "DROP TABLE IF EXISTS agents_message_fts",
+    "DROP VIEW IF EXISTS agents_message_fts_source",
+]
+
+POSTGRES_INDEX = 'agents_message_content_tsv'
+
+
+def _sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Loadable/bundled builds may not report the compile option
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp._fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        if not _sqlite_has_fts5(schema_editor):
+            return
+        with schema_editor.connection.cursor() as cursor:
+            for statement in SQLITE_FORWARD:
+                cursor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{POSTGRES_INDEX}" ON "agents_message" '
+            "USING gin (to_tsvector('english'::regconfig, COALESCE(\"content\", '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            for statement in SQLITE_REVERSE:
+                cursor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{POSTGRES_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('agents', '0009_agentcontext_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
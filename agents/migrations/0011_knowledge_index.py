@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-19 09:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0010_message_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KnowledgeDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_type', models.CharField(choices=[('message', 'Message'), ('study_session', 'Study Session'), ('task', 'Task'), ('meal_plan', 'Meal Plan'), ('wellness_activity', 'Wellness Activity'), ('habit', 'Habit')], max_length=20)),
+                ('source_id', models.BigIntegerField()),
+                ('label', models.CharField(max_length=255)),
+                ('text', models.TextField()),
+                ('length', models.PositiveIntegerField(help_text='Indexed token count (BM25 document length)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='agents.agentsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='knowledge_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='KnowledgePosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.IntegerField()),
+                ('tf', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='agents.knowledgedocument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='knowledgedocument',
+            index=models.Index(fields=['user', 'source_type'], name='agents_know_user_id_1de264_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='knowledgedocument',
+            unique_together={('source_type', 'source_id')},
+        ),
+        migrations.AddIndex(
+            model_name='knowledgeposting',
+            index=models.Index(fields=['user', 'term'], name='agents_know_user_id_6c7b69_idx'),
+        ),
+    ]
@@ -169,11 +169,21 @@ class AgentSession(models.Model):
         ('orchestrator', 'Orchestrator'),
     ])
     session_id = models.CharField(max_length=255, unique=True)
+    
+    # Denormalized activity counters, maintained by message_store.record_message
+    # (backfill with `manage.py backfill_session_counters`)
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_agent_type = models.CharField(max_length=50, blank=True, default='')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at']),
+        ]
     
     def __str__(self):
         return f"{self.agent_type} - {self.session_id}"
@@ -193,6 +203,10 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # History pages: session filter + (created_at, id) keyset order
+            models.Index(fields=['session', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
@@ -218,6 +232,10 @@ class MealPlan(models.Model):
     
     class Meta:
         ordering = ['date', 'meal_type']
+        indexes = [
+            models.Index(fields=['user', 'date', '-created_at']),
+            models.Index(fields=['user', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.meal_name} - {self.date}"
@@ -248,6 +266,10 @@ class Task(models.Model):
     
     class Meta:
         ordering = ['-priority', 'due_date']
+        indexes = [
+            models.Index(fields=['user', 'status', 'priority']),
+            models.Index(fields=['user', 'priority', 'due_date']),
+        ]
     
     def __str__(self):
         return self.title
@@ -266,6 +288,9 @@ class StudySession(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.subject} - {self.created_at.date()}"
@@ -292,6 +317,10 @@ class WellnessActivity(models.Model):
     class Meta:
         ordering = ['-recorded_at']
         verbose_name_plural = 'Wellness Activities'
+        indexes = [
+            models.Index(fields=['user', 'activity_type', 'recorded_at']),
+            models.Index(fields=['user', 'recorded_at']),
+        ]
     
     def __str__(self):
         return f"{self.activity_type} - {self.recorded_at.date()}"
@@ -384,6 +413,14 @@ class AgentContext(models.Model):
         unique_together = ['session', 'context_type', 'key']
         indexes = [
             models.Index(fields=['session', 'context_type']),
+            # Read path: "expires_at IS NULL OR expires_at > now" per session
+            models.Index(fields=['session', 'expires_at']),
+            # Sweeper: only rows that can expire are indexed
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(expires_at__isnull=False),
+                name='agents_ctx_expires_at_idx',
+            ),
         ]
     
     def __str__(self):
@@ -415,6 +452,8 @@ class Habit(models.Model):
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='habits')
+    # Conversation the habit was created from (null for habits added in the UI)
+    session = models.ForeignKey(AgentSession, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, default='')
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other')
@@ -448,25 +487,31 @@ class Habit(models.Model):
     def __str__(self):
         return f"{self.icon} {self.name} (streak: {self.current_streak})"
     
-    def calculate_streak(self):
-        """Recalculate current streak from HabitLog entries."""
-        from datetime import date, timedelta
+    def calculate_streak(self, today=None):
+        """
+        Recalculate current streak from HabitLog entries.
+
+        ``today`` is the user's local date; when omitted it is resolved from
+        the owner's profile timezone (not the server clock).
+        """
+        from datetime import timedelta
+        from agents.services.user_time import user_local_today
         
-        today = date.today()
-        streak = 0
-        check_date = today
+        if today is None:
+            today = user_local_today(self.user)
         
-        while True:
-            log = self.logs.filter(date=check_date, completed=True).exists()
-            if log:
-                streak += 1
-                check_date -= timedelta(days=1)
-            else:
-                # Allow today to be incomplete (streak isn't broken until tomorrow)
-                if check_date == today:
-                    check_date -= timedelta(days=1)
-                    continue
-                break
+        # One indexed query on (habit, date) instead of one query per day
+        completed_dates = set(
+            self.logs.filter(completed=True, date__lte=today)
+            .values_list('date', flat=True)
+        )
+        
+        streak = 0
+        # Allow today to be incomplete (streak isn't broken until tomorrow)
+        check_date = today if today in completed_dates else today - timedelta(days=1)
+        while check_date in completed_dates:
+            streak += 1
+            check_date -= timedelta(days=1)
         
         self.current_streak = streak
         if streak > self.best_streak:
@@ -496,3 +541,51 @@ class HabitLog(models.Model):
         status = '✅' if self.completed else '⬜'
         return f"{status} {self.habit.name} — {self.date}"
 
+
+class KnowledgeDocument(models.Model):
+    """
+    One indexed piece of a user's knowledge (a message, study session or
+    saved item) for the knowledge agent's retrieval index.
+    Kept in sync on write by ``services.knowledge_index``.
+    """
+    SOURCE_CHOICES = [
+        ('message', 'Message'),
+        ('study_session', 'Study Session'),
+        ('task', 'Task'),
+        ('meal_plan', 'Meal Plan'),
+        ('wellness_activity', 'Wellness Activity'),
+        ('habit', 'Habit'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='knowledge_documents')
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.BigIntegerField()
+    # Only set for messages, so clearing or deleting a session drops them
+    session = models.ForeignKey(AgentSession, on_delete=models.CASCADE, null=True, blank=True)
+    label = models.CharField(max_length=255)
+    text = models.TextField()
+    length = models.PositiveIntegerField(help_text="Indexed token count (BM25 document length)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['source_type', 'source_id']
+        indexes = [
+            models.Index(fields=['user', 'source_type']),
+        ]
+
+    def __str__(self):
+        return self.label
+
+
+class KnowledgePosting(models.Model):
+    """Inverted-index entry: a hashed term and its frequency in one document."""
+    document = models.ForeignKey(KnowledgeDocument, on_delete=models.CASCADE, related_name='postings')
+    # Denormalized from the document so a query reads one (user, term) range
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    term = models.IntegerField()
+    tf = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'term']),
+        ]
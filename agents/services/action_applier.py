@@ -216,7 +216,7 @@ class ActionApplier:
                 elif action_name == 'create_wellness_activity':
                     obj = await sync_to_async(save_wellness_activity)(data=validated_data, session=session, user=user)
                 elif action_name == 'create_habit':
-                    obj = await self._create_habit(validated_data, user)
+                    obj = await self._create_habit(validated_data, user, session)
                 else:
                     obj = None
 
@@ -237,7 +237,9 @@ class ActionApplier:
 
         return applied
 
-    async def _create_habit(self, data: Dict[str, Any], user: Optional[User]) -> Optional[Habit]:
+    async def _create_habit(
+        self, data: Dict[str, Any], user: Optional[User], session: Optional[AgentSession] = None
+    ) -> Optional[Habit]:
         if not user or not user.is_authenticated:
             return None
 
@@ -249,6 +251,7 @@ class ActionApplier:
             'icon': data.get('icon', '✅'),
             'color': data.get('color', '#8B5CF6'),
             'is_active': True,
+            'session': session,
         }
 
         name = data.get('name') or data.get('title')
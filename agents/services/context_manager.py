@@ -12,6 +12,45 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+SWEEP_BATCH_SIZE = 500
+
+
+def _live_contexts_q(now=None) -> models.Q:
+    """Rows that have not expired (served by the (session, expires_at) index)."""
+    return models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now or timezone.now())
+
+
+def sweep_expired_contexts(
+    session: Optional[AgentSession] = None,
+    batch_size: int = SWEEP_BATCH_SIZE,
+    now=None,
+) -> int:
+    """
+    Delete expired AgentContext rows in batches of *batch_size*.
+
+    Each batch is one short DELETE by primary key, picked through the
+    partial ``expires_at`` index, so a large backlog never holds the write
+    lock for long.  Scope to one *session* or sweep every session.
+    Returns the number of rows deleted.
+    """
+    now = now or timezone.now()
+    expired = AgentContext.objects.filter(expires_at__lt=now)
+    if session is not None:
+        expired = expired.filter(session=session)
+
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('expires_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += AgentContext.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+
+    if deleted:
+        logger.info(f"Swept {deleted} expired agent contexts")
+    return deleted
+
 
 class ContextManager:
     """
@@ -37,9 +76,7 @@ class ContextManager:
             query = AgentContext.objects.filter(session=self.session)
             
             # Filter expired contexts
-            query = query.filter(
-                models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
-            )
+            query = query.filter(_live_contexts_q())
             
             if context_type:
                 query = query.filter(context_type=context_type)
@@ -92,6 +129,51 @@ class ContextManager:
         
         return context
     
+    async def set_contexts(
+        self,
+        context_type: str,
+        values: Dict[str, Any],
+        expires_in_hours: Optional[int] = None
+    ) -> List[AgentContext]:
+        """
+        Store several keys of one context type in a single upsert statement
+        
+        Args:
+            context_type: Type of context (USER_PREFERENCES, etc.)
+            values: Mapping of context key -> context data
+            expires_in_hours: Optional expiration time in hours, applied to every key
+            
+        Returns:
+            List of created or updated AgentContext rows
+        """
+        if not values:
+            return []
+        
+        expires_at = None
+        if expires_in_hours:
+            expires_at = timezone.now() + timedelta(hours=expires_in_hours)
+        
+        rows = [
+            AgentContext(
+                session=self.session,
+                context_type=context_type,
+                key=key,
+                value=value,
+                expires_at=expires_at
+            )
+            for key, value in values.items()
+        ]
+        contexts = await sync_to_async(AgentContext.objects.bulk_create)(
+            rows,
+            update_conflicts=True,
+            unique_fields=['session', 'context_type', 'key'],
+            update_fields=['value', 'expires_at', 'updated_at']
+        )
+        
+        logger.info(f"Upserted {len(contexts)} {context_type} contexts for session {self.session.session_id}")
+        
+        return contexts
+    
     async def get_conversation_history(self, limit: int = 10) -> List[Dict[str, str]]:
         """
         Get recent conversation history for the session
@@ -190,13 +272,12 @@ class ContextManager:
             'session_contexts': await self.get_context()
         }
     
-    async def cleanup_expired_contexts(self):
-        """Remove expired contexts from the database"""
-        deleted_count = AgentContext.objects.filter(
-            session=self.session,
-            expires_at__lt=timezone.now()
-        ).delete()[0]
+    async def cleanup_expired_contexts(self) -> int:
+        """Remove this session's expired contexts from the database"""
+        deleted_count = await sync_to_async(sweep_expired_contexts)(session=self.session)
         
         if deleted_count > 0:
             logger.info(f"Cleaned up {deleted_count} expired contexts for session {self.session.session_id}")
+        
+        return deleted_count
 
@@ -6,19 +6,41 @@ Provides:
 - PRAGMA integrity_check before every backup.
 - Restore from backup with pre-restore validation.
 - Cleanup of old backups beyond a retention window.
+
+WAL mode (see sqlite_tuning): the live DB may have ``-wal``/``-shm``
+sidecar files holding committed pages not yet in the main file.  Backups
+go through the online backup API (which reads through the WAL) and are
+written as self-contained rollback-journal files.  Restores run the same
+API in the other direction, into the live database, so its WAL and open
+readers stay consistent; the file is never replaced underneath them.
+
+Backups copy ``BACKUP_PAGES_PER_STEP`` pages at a time with a short sleep
+between steps, so writers can take the lock in between instead of stalling
+behind one long copy.  A write to the source restarts a stepped copy; after
+``BACKUP_MAX_RESTARTS`` restarts the rest is copied in a single step, so a
+busy database cannot starve the backup.  The finished copy is stream-compressed (gzip, or
+zstd when the optional ``zstandard`` package is installed).  Pass a
+``progress`` callable to receive per-step dicts with throughput figures.
 """
 from __future__ import annotations
 
+import gzip
 import logging
 import os
-import shutil
 import sqlite3
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from django.conf import settings
 
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -26,14 +48,74 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 BACKUP_DIR = getattr(settings, "BACKUP_DIR", settings.BASE_DIR / "backups")
 RETENTION_DAYS = int(getattr(settings, "BACKUP_RETENTION_DAYS", 30))
+DB_ENGINE = settings.DATABASES["default"]["ENGINE"]
+# File path for SQLite; just the database name under other backends.
 DB_PATH = settings.DATABASES["default"]["NAME"]
 
+BACKUP_COMPRESSION = getattr(settings, "BACKUP_COMPRESSION", "gzip")  # gzip | zstd | none
+BACKUP_PAGES_PER_STEP = int(getattr(settings, "BACKUP_PAGES_PER_STEP", 1024))
+BACKUP_STEP_SLEEP = float(getattr(settings, "BACKUP_STEP_SLEEP", 0.005))  # seconds
+# Restarts (source written mid-copy) tolerated before copying in one step
+BACKUP_MAX_RESTARTS = int(getattr(settings, "BACKUP_MAX_RESTARTS", 3))
+BACKUP_CHECK = getattr(settings, "BACKUP_CHECK", "full")  # full | quick | none
+
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
 
+def is_sqlite_backend() -> bool:
+    """True when the default database is a local SQLite file."""
+    return DB_ENGINE.endswith("sqlite3")
+
+
+def backend_capabilities() -> Dict[str, Any]:
+    """Describe which tooling in this module applies to the configured backend."""
+    sqlite = is_sqlite_backend()
+    return {
+        "engine": DB_ENGINE,
+        "file_backups": sqlite,
+        "restore": sqlite,
+        "integrity_check": "pragma" if sqlite else "connectivity",
+        "hint": None if sqlite else "Use pg_dump/pg_restore or managed snapshots for server databases.",
+    }
+
+
+def _unsupported(operation: str, **extra: Any) -> Dict[str, Any]:
+    """Result for SQLite-only operations requested under another backend."""
+    logger.warning("%s skipped: not supported for %s", operation, DB_ENGINE)
+    return {
+        "success": False,
+        "skipped": True,
+        "error": f"{operation} is only supported for SQLite (engine: {DB_ENGINE})",
+        **extra,
+    }
+
+
+def _check_server_database() -> Dict[str, Any]:
+    """Connectivity check used instead of PRAGMA checks on server databases."""
+    from django.db import connections
+    try:
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        ok = True
+    except Exception as exc:
+        logger.error("Database connectivity check failed: %s", exc)
+        ok = False
+    return {
+        "ok": ok,
+        "integrity": [f"skipped: {connections['default'].vendor}"],
+        "foreign_keys": [],
+    }
+
+
 def _ensure_backup_dir() -> Path:
     """Create the backup directory if it doesn't exist."""
     path = Path(BACKUP_DIR)
@@ -41,9 +123,18 @@ def _ensure_backup_dir() -> Path:
     return path
 
 
-def _run_integrity_check(db_path: str | Path) -> Dict[str, Any]:
+def _backup_files(backup_dir: Path) -> List[Path]:
+    """Finished backups in *backup_dir*, compressed or not."""
+    return [
+        f for f in backup_dir.glob("lifeos_backup_*.sqlite3*")
+        if _compression_of(f) != "none" or f.suffix == ".sqlite3"
+    ]
+
+
+def _run_integrity_check(db_path: str | Path, quick: bool = False) -> Dict[str, Any]:
     """
-    Run ``PRAGMA integrity_check`` and ``PRAGMA foreign_key_check``
+    Run ``PRAGMA integrity_check`` (or the cheaper ``quick_check``, which
+    skips index/content cross-checks) and ``PRAGMA foreign_key_check``
     against the given SQLite database.
 
     Returns:
@@ -55,7 +146,7 @@ def _run_integrity_check(db_path: str | Path) -> Dict[str, Any]:
     """
     conn = sqlite3.connect(str(db_path))
     try:
-        cursor = conn.execute("PRAGMA integrity_check;")
+        cursor = conn.execute("PRAGMA quick_check;" if quick else "PRAGMA integrity_check;")
         integrity_rows = [row[0] for row in cursor.fetchall()]
         integrity_ok = integrity_rows == ["ok"]
 
@@ -71,151 +162,473 @@ def _run_integrity_check(db_path: str | Path) -> Dict[str, Any]:
         conn.close()
 
 
+def checkpoint_wal(db_path: Optional[str | Path] = None, mode: str = "TRUNCATE") -> Optional[tuple]:
+    """
+    Fold the WAL back into the main DB file.
+
+    Returns SQLite's ``(busy, log_frames, checkpointed_frames)`` tuple, or
+    None when the database is not in WAL mode.
+    """
+    if db_path is None and not is_sqlite_backend():
+        return None
+    conn = sqlite3.connect(str(db_path or DB_PATH))
+    try:
+        journal_mode = conn.execute("PRAGMA journal_mode;").fetchone()[0]
+        if journal_mode.lower() != "wal":
+            return None
+        return conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+    finally:
+        conn.close()
+
+
+def _compression_of(path: str | Path) -> str:
+    """Infer the compression of a backup file from its suffix."""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and str(path).endswith(suffix):
+            return compression
+    return "none"
+
+
+def _resolve_compression(compression: Optional[str]) -> str:
+    compression = (compression or BACKUP_COMPRESSION or "none").lower()
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown backup compression {compression!r}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the 'zstandard' package (pip install zstandard)")
+    return compression
+
+
+@contextmanager
+def _open_stream(path: str | Path, mode: str, compression: str):
+    """Binary file object for *path* that (de)compresses on the fly."""
+    with open(path, mode) as raw:
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=6) as stream:
+                yield stream
+        elif compression == "zstd":
+            if mode.startswith("w"):
+                stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+            else:
+                stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+            with stream:
+                yield stream
+        else:
+            yield raw
+
+
+def _report(progress: Optional[ProgressCallback], phase: str, started: float, **fields: Any) -> None:
+    if progress is None:
+        return
+    elapsed = time.monotonic() - started
+    bytes_done = fields.get("bytes_done", 0)
+    progress({
+        "phase": phase,
+        "elapsed_s": round(elapsed, 3),
+        "mb_per_s": round(bytes_done / elapsed / 1e6, 2) if elapsed else None,
+        **fields,
+    })
+
+
+class _TooManyRestarts(Exception):
+    """Raised from the progress hook to abandon a stepped copy that keeps restarting."""
+
+
+def _stepped_copy(
+    source: sqlite3.Connection,
+    dest: sqlite3.Connection,
+    *,
+    pages_per_step: int,
+    step_sleep: float,
+    progress: Optional[ProgressCallback] = None,
+    phase: str = "copy",
+    max_restarts: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Online-backup *source* into *dest*, ``pages_per_step`` pages at a time.
+
+    Between steps the source lock is released for ``step_sleep`` seconds so
+    writers can interleave; SQLite restarts the copy if another connection
+    modifies the source mid-way.  After ``max_restarts`` restarts the copy
+    is redone in one step, holding the read lock until it completes.
+    """
+    max_restarts = BACKUP_MAX_RESTARTS if max_restarts is None else max_restarts
+    page_size = source.execute("PRAGMA page_size;").fetchone()[0]
+    started = time.monotonic()
+    pages_total = 0
+    pages_done = 0
+    restarts = 0
+
+    def on_step(status, remaining, total):
+        nonlocal pages_total, pages_done, restarts
+        done = total - remaining
+        # Without a restart every step copies more pages than the last
+        if done <= pages_done and remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts
+        pages_total, pages_done = total, done
+        _report(
+            progress, phase, started,
+            pages_done=done, pages_total=total,
+            bytes_done=done * page_size, bytes_total=total * page_size,
+            restarts=restarts,
+        )
+
+    try:
+        source.backup(dest, pages=max(int(pages_per_step), 1), progress=on_step, sleep=step_sleep)
+    except _TooManyRestarts:
+        logger.warning("Stepped copy restarted %d times; copying in one step", max_restarts)
+        pages_done = 0
+        source.backup(dest, pages=-1, progress=on_step)
+    elapsed = time.monotonic() - started
+    return {
+        "pages": pages_total,
+        "page_size": page_size,
+        "restarts": restarts,
+        "elapsed_s": round(elapsed, 3),
+        "mb_per_s": round(pages_total * page_size / elapsed / 1e6, 2) if elapsed else None,
+    }
+
+
+def _stream_copy(
+    src,
+    dst,
+    *,
+    bytes_total: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+    phase: str,
+) -> int:
+    """Copy file object *src* to *dst* in fixed-size chunks, reporting progress."""
+    started = time.monotonic()
+    copied = 0
+    while True:
+        chunk = src.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+        copied += len(chunk)
+        _report(progress, phase, started, bytes_done=copied, bytes_total=bytes_total)
+    return copied
+
+
+def decompress_backup(
+    backup_path: str | Path,
+    dest_path: str | Path,
+    progress: Optional[ProgressCallback] = None,
+) -> int:
+    """Stream-decompress *backup_path* into a plain SQLite file. Returns bytes written."""
+    with _open_stream(backup_path, "rb", _compression_of(backup_path)) as src, open(dest_path, "wb") as dst:
+        return _stream_copy(src, dst, progress=progress, phase="decompress")
+
+
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
 
-def check_integrity(db_path: Optional[str | Path] = None) -> Dict[str, Any]:
-    """Run integrity checks on the live database (or a given path)."""
+def check_integrity(db_path: Optional[str | Path] = None, quick: bool = False) -> Dict[str, Any]:
+    """
+    Run integrity checks on the live database (or a given SQLite file).
+
+    Under a non-SQLite backend the live check degrades to a connectivity
+    probe; PRAGMA checks still run for explicit file paths.
+    """
+    if db_path is None and not is_sqlite_backend():
+        return _check_server_database()
     target = str(db_path or DB_PATH)
-    result = _run_integrity_check(target)
+    result = _run_integrity_check(target, quick=quick)
     level = logging.INFO if result["ok"] else logging.ERROR
     logger.log(level, "Integrity check on %s: %s", target, result)
     return result
 
 
-def create_backup(*, tag: str = "") -> Dict[str, Any]:
+def create_backup(
+    *,
+    tag: str = "",
+    compression: Optional[str] = None,
+    pages_per_step: Optional[int] = None,
+    step_sleep: Optional[float] = None,
+    check: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
     """
     Create a timestamped backup of the live SQLite DB.
 
     Steps:
-    1. Run integrity check on live DB.
-    2. Use ``sqlite3.Connection.backup()`` for a safe online copy.
-    3. Run integrity check on the backup.
+    1. Run integrity check on live DB (``check``: "full", "quick" or "none").
+    2. Stepped ``sqlite3.Connection.backup()`` into a scratch file.
+    3. Run integrity check on the copy.
+    4. Stream-compress the copy into the final backup file.
 
     Args:
         tag: Optional string appended to the filename for labelling.
+        compression: "gzip", "zstd" or "none" (default: BACKUP_COMPRESSION).
+        pages_per_step / step_sleep: Copy granularity and pause between steps.
+        progress: Called with a dict per step: ``phase`` ("copy"/"compress"),
+            ``pages_done``/``pages_total`` or ``bytes_done``, ``elapsed_s``, ``mb_per_s``.
 
     Returns:
         {
             "success": bool,
             "backup_path": str | None,
-            "pre_check": dict,
+            "pre_check": dict | None,
             "post_check": dict | None,
             "timestamp": str,
+            "compression": str,
+            "size_bytes": int,
+            "stats": dict,
         }
     """
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    if not is_sqlite_backend():
+        return _unsupported(
+            "create_backup",
+            backup_path=None, pre_check=None, post_check=None, timestamp=timestamp,
+        )
+    compression = _resolve_compression(compression)
+    check = check or BACKUP_CHECK
     suffix = f"_{tag}" if tag else ""
     backup_dir = _ensure_backup_dir()
-    backup_filename = f"lifeos_backup_{timestamp}{suffix}.sqlite3"
+    backup_filename = f"lifeos_backup_{timestamp}{suffix}.sqlite3{COMPRESSION_SUFFIXES[compression]}"
     backup_path = backup_dir / backup_filename
+    # Not matched by list_backups() / cleanup_old_backups() while in flight
+    scratch_path = backup_dir / f".partial_{backup_filename}.sqlite3"
+
+    result = {
+        "success": False,
+        "backup_path": None,
+        "pre_check": None,
+        "post_check": None,
+        "timestamp": timestamp,
+        "compression": compression,
+    }
 
     # Step 1: pre-check
-    pre_check = check_integrity()
-    if not pre_check["ok"]:
-        logger.error("Pre-backup integrity check FAILED — backup aborted")
-        return {
-            "success": False,
-            "backup_path": None,
-            "pre_check": pre_check,
-            "post_check": None,
-            "timestamp": timestamp,
-        }
+    if check != "none":
+        result["pre_check"] = check_integrity(quick=check == "quick")
+        if not result["pre_check"]["ok"]:
+            logger.error("Pre-backup integrity check FAILED — backup aborted")
+            return result
 
-    # Step 2: online backup
     try:
+        # Step 2: stepped online backup
         source = sqlite3.connect(str(DB_PATH))
-        dest = sqlite3.connect(str(backup_path))
-        source.backup(dest)
-        dest.close()
-        source.close()
-        logger.info("Backup created: %s", backup_path)
+        dest = sqlite3.connect(str(scratch_path))
+        try:
+            stats = _stepped_copy(
+                source, dest,
+                pages_per_step=pages_per_step or BACKUP_PAGES_PER_STEP,
+                step_sleep=BACKUP_STEP_SLEEP if step_sleep is None else step_sleep,
+                progress=progress,
+            )
+            # The copy inherits WAL mode from the source header; make the
+            # archive a single self-contained file.
+            dest.execute("PRAGMA journal_mode=DELETE;")
+        finally:
+            dest.close()
+            source.close()
+
+        # Step 3: post-check, on the plain copy before compressing it
+        result["post_check"] = check_integrity(scratch_path, quick=check == "quick")
+        if not result["post_check"]["ok"]:
+            logger.error("Post-backup integrity check FAILED — backup may be corrupt")
+            return result
+
+        # Step 4: compress (or just move into place)
+        if compression == "none":
+            os.replace(scratch_path, backup_path)
+        else:
+            started = time.monotonic()
+            with open(scratch_path, "rb") as src, _open_stream(backup_path, "wb", compression) as dst:
+                _stream_copy(
+                    src, dst,
+                    bytes_total=scratch_path.stat().st_size, progress=progress, phase="compress",
+                )
+            stats["compress_s"] = round(time.monotonic() - started, 3)
     except Exception as exc:
         logger.error("Backup copy failed: %s", exc)
-        return {
-            "success": False,
-            "backup_path": None,
-            "pre_check": pre_check,
-            "post_check": None,
-            "timestamp": timestamp,
-        }
-
-    # Step 3: post-check
-    post_check = check_integrity(backup_path)
-    if not post_check["ok"]:
-        logger.error("Post-backup integrity check FAILED — backup may be corrupt")
         backup_path.unlink(missing_ok=True)
-        return {
-            "success": False,
-            "backup_path": None,
-            "pre_check": pre_check,
-            "post_check": post_check,
-            "timestamp": timestamp,
-        }
-
-    return {
-        "success": True,
-        "backup_path": str(backup_path),
-        "pre_check": pre_check,
-        "post_check": post_check,
-        "timestamp": timestamp,
-    }
+        return result
+    finally:
+        scratch_path.unlink(missing_ok=True)
+
+    result.update(
+        success=True,
+        backup_path=str(backup_path),
+        size_bytes=backup_path.stat().st_size,
+        stats=stats,
+    )
+    logger.info(
+        "Backup created: %s (%d pages in %.2fs, %s MB/s)",
+        backup_path, stats["pages"], stats["elapsed_s"], stats["mb_per_s"],
+    )
+    return result
 
 
 def list_backups() -> List[Dict[str, Any]]:
     """Return metadata for all existing backups, newest first."""
     backup_dir = _ensure_backup_dir()
-    files = sorted(backup_dir.glob("lifeos_backup_*.sqlite3"), reverse=True)
+    files = sorted(_backup_files(backup_dir), key=lambda f: f.name, reverse=True)
     results = []
     for f in files:
         stat = f.stat()
         results.append({
             "path": str(f),
             "filename": f.name,
+            "compression": _compression_of(f),
             "size_bytes": stat.st_size,
             "created_at": datetime.utcfromtimestamp(stat.st_ctime).isoformat(),
         })
     return results
 
 
-def restore_from_backup(backup_path: str | Path) -> Dict[str, Any]:
+def _copy_into_live(
+    plain_path: Path,
+    *,
+    pages_per_step: int,
+    step_sleep: float,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
     """
-    Restore the live DB from a backup file.
+    Online-backup *plain_path* into the live database.
+
+    The pages are written through the live file's own pager and journal
+    (its WAL, in WAL mode), so readers on other connections keep a
+    consistent view of the old contents until the copy commits and then
+    see the restored data; no sidecar file is ever swapped underneath them.
+    """
+    source = sqlite3.connect(str(plain_path))
+    live = sqlite3.connect(str(DB_PATH), timeout=30)
+    try:
+        source_page_size = source.execute("PRAGMA page_size;").fetchone()[0]
+        live_page_size = live.execute("PRAGMA page_size;").fetchone()[0]
+        live_journal = live.execute("PRAGMA journal_mode;").fetchone()[0].lower()
+        if live_journal == "wal" and source_page_size != live_page_size:
+            # A WAL database cannot change page size in place
+            raise ValueError(
+                f"Backup page size {source_page_size} differs from live WAL database {live_page_size}"
+            )
+        return _stepped_copy(
+            source, live,
+            pages_per_step=pages_per_step, step_sleep=step_sleep,
+            progress=progress, phase="restore",
+        )
+    finally:
+        live.close()
+        source.close()
+
+
+def _roll_back(snapshot_path: Path, options: Dict[str, Any]) -> bool:
+    """Copy a safety snapshot back into the live DB. Returns success."""
+    scratch = _ensure_backup_dir() / f".partial_rollback_{snapshot_path.name}.sqlite3"
+    try:
+        decompress_backup(snapshot_path, scratch)
+        _copy_into_live(scratch, **options)
+        return True
+    except Exception as exc:
+        logger.error("Rollback from %s failed: %s", snapshot_path, exc)
+        return False
+    finally:
+        scratch.unlink(missing_ok=True)
+
+
+def restore_from_backup(
+    backup_path: str | Path,
+    *,
+    pages_per_step: Optional[int] = None,
+    step_sleep: Optional[float] = None,
+    quick_check: bool = False,
+    progress: Optional[ProgressCallback] = None,
+) -> Dict[str, Any]:
+    """
+    Restore the live DB from a backup file, in place.
 
     Steps:
-    1. Validate the backup exists and passes integrity check.
-    2. Create a safety snapshot of the current live DB.
-    3. Replace the live DB with the backup.
+    1. Stream-decompress the backup to a scratch file (compressed backups).
+    2. Validate the scratch copy passes integrity check.
+    3. Create a safety snapshot of the current live DB.
+    4. Online-backup the copy into the live DB, ``pages_per_step`` at a time.
+    5. Integrity-check the live DB; on failure, put the snapshot back.
 
     Returns:
-        {"success": bool, "safety_snapshot": str | None, ...}
+        {"success": bool, "safety_snapshot": str | None, "stats": dict, ...}
     """
+    if not is_sqlite_backend():
+        return _unsupported("restore_from_backup")
+
     backup_path = Path(backup_path)
     if not backup_path.exists():
         return {"success": False, "error": "Backup file not found"}
 
+    options = {
+        "pages_per_step": pages_per_step or BACKUP_PAGES_PER_STEP,
+        "step_sleep": BACKUP_STEP_SLEEP if step_sleep is None else step_sleep,
+        "progress": progress,
+    }
+
+    plain_path = backup_path
+    if _compression_of(backup_path) != "none":
+        plain_path = _ensure_backup_dir() / f".partial_restore_{backup_path.name}.sqlite3"
+        try:
+            decompress_backup(backup_path, plain_path, progress=progress)
+        except Exception as exc:
+            plain_path.unlink(missing_ok=True)
+            return {"success": False, "error": f"Could not decompress backup: {exc}"}
+
+    try:
+        return _restore_plain(backup_path, plain_path, quick_check=quick_check, **options)
+    finally:
+        if plain_path != backup_path:
+            plain_path.unlink(missing_ok=True)
+
+
+def _restore_plain(backup_path: Path, plain_path: Path, *, quick_check: bool, **options: Any) -> Dict[str, Any]:
     # Validate backup integrity
-    check = check_integrity(backup_path)
+    check = check_integrity(plain_path, quick=quick_check)
     if not check["ok"]:
         return {"success": False, "error": "Backup failed integrity check", "details": check}
 
     # Safety snapshot
     safety = create_backup(tag="pre_restore_safety")
+    if not safety["success"]:
+        return {"success": False, "error": "Could not snapshot live DB — restore aborted", "details": safety}
+
+    # Django's own connections may sit on a stale schema cache; reopen lazily
+    from django.db import connections
+    connections.close_all()
 
-    # Replace live DB
     try:
-        shutil.copy2(str(backup_path), str(DB_PATH))
-        logger.info("Restored DB from %s", backup_path)
-        return {
-            "success": True,
-            "restored_from": str(backup_path),
-            "safety_snapshot": safety.get("backup_path"),
-        }
+        stats = _copy_into_live(plain_path, **options)
     except Exception as exc:
+        # The copy commits in one transaction at the end: a failed copy
+        # leaves the live DB as it was.
         logger.error("Restore failed: %s", exc)
-        return {"success": False, "error": str(exc)}
+        return {"success": False, "error": str(exc), "safety_snapshot": safety["backup_path"]}
+
+    post_check = check_integrity(quick=quick_check)
+    if not post_check["ok"]:
+        logger.error("Post-restore integrity check FAILED — rolling back to %s", safety["backup_path"])
+        return {
+            "success": False,
+            "error": "Restored database failed integrity check",
+            "post_check": post_check,
+            "rolled_back": _roll_back(Path(safety["backup_path"]), options),
+            "safety_snapshot": safety["backup_path"],
+        }
+
+    # Keep the WAL from holding a second copy of the database; PASSIVE so
+    # a long-running reader doesn't stall the restore.
+    checkpoint_wal(DB_PATH, mode="PASSIVE")
+    logger.info(
+        "Restored DB from %s (%d pages in %.2fs)", backup_path, stats["pages"], stats["elapsed_s"]
+    )
+    return {
+        "success": True,
+        "restored_from": str(backup_path),
+        "safety_snapshot": safety["backup_path"],
+        "post_check": post_check,
+        "stats": stats,
+    }
 
 
 def cleanup_old_backups(retention_days: int = RETENTION_DAYS) -> int:
@@ -223,7 +636,7 @@ def cleanup_old_backups(retention_days: int = RETENTION_DAYS) -> int:
     cutoff = datetime.utcnow() - timedelta(days=retention_days)
     backup_dir = _ensure_backup_dir()
     deleted = 0
-    for f in backup_dir.glob("lifeos_backup_*.sqlite3"):
+    for f in _backup_files(backup_dir):
         modified = datetime.utcfromtimestamp(f.stat().st_mtime)
         if modified < cutoff:
             f.unlink()
@@ -0,0 +1,239 @@
+"""
+Concurrent execution of several agents for one message.
+
+When intent classification flags a message as multi-agent ("plan my exam
+week and the meals for it"), the orchestrator runs the primary and the
+secondary agents at the same time instead of the primary alone.  Every
+agent gets its own timeout, a slow or failing secondary never sinks the
+turn, and wall-clock time is that of the slowest agent rather than the sum.
+
+- :func:`run_fan_out` awaits every agent and returns per-agent results.
+- :func:`stream_fan_out` streams in sections: the first agent to produce
+  output streams live while the others buffer; when it finishes, the next
+  agent's buffer is flushed as a new section and it continues live.  The
+  ``chunk`` contents concatenate to exactly the text that gets recorded.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from django.conf import settings
+
+from .llm_admission import LLMSaturated
+
+logger = logging.getLogger(__name__)
+
+FAN_OUT_ENABLED = getattr(settings, 'AGENT_FAN_OUT_ENABLED', True)
+MAX_FAN_OUT_AGENTS = int(getattr(settings, 'AGENT_FAN_OUT_MAX_AGENTS', 3))
+AGENT_TIMEOUT_SECONDS = float(getattr(settings, 'AGENT_TIMEOUT_SECONDS', 45))
+# Per-agent overrides of AGENT_TIMEOUT_SECONDS
+AGENT_TIMEOUTS: Dict[str, float] = getattr(settings, 'AGENT_TIMEOUTS', {})
+
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+
+def agent_timeout(agent: str) -> float:
+    return float(AGENT_TIMEOUTS.get(agent, AGENT_TIMEOUT_SECONDS))
+
+
+def agent_label(agent: str) -> str:
+    """'meal_planner_agent' -> 'meal planner'."""
+    return agent.removesuffix('_agent').replace('_', ' ')
+
+
+def select_agents(
+    intent_result: Dict[str, Any],
+    available,
+    forced: bool = False,
+) -> List[str]:
+    """
+    Agents to run for a classified message, primary first.
+
+    Only multi-agent classifications fan out, and never a forced agent.
+    Secondary agents that aren't registered are dropped.
+    """
+    primary = intent_result['primary_agent']
+    if forced or not FAN_OUT_ENABLED or not intent_result.get('is_multi_agent'):
+        return [primary]
+    agents = [primary]
+    for agent in intent_result.get('secondary_agents') or []:
+        if agent in available and agent not in agents:
+            agents.append(agent)
+    return agents[:MAX_FAN_OUT_AGENTS]
+
+
+def merge_responses(results: List[Dict[str, Any]]) -> str:
+    """One reply from per-agent results: each non-empty response is a section."""
+    return SECTION_SEPARATOR.join(r['response'] for r in results if r['response'])
+
+
+def summarize_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-agent outcome without the response text, for API payloads and audit logs."""
+    return [{k: v for k, v in r.items() if k != 'response'} for r in results]
+
+
+def _result(agent: str, started: float, response: str = '', error: Optional[str] = None,
+            timed_out: bool = False) -> Dict[str, Any]:
+    return {
+        'agent': agent,
+        'success': error is None,
+        'response': response,
+        'error': error,
+        'timed_out': timed_out,
+        'elapsed_ms': round((time.monotonic() - started) * 1000),
+    }
+
+
+def _timeout_error(agent: str) -> str:
+    return f"{agent_label(agent).capitalize()} agent timed out after {agent_timeout(agent):g}s"
+
+
+async def _run_one(agent, runner, message, session_id, user_context) -> Dict[str, Any]:
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            runner.run_agent(message, session_id=session_id, user_context=user_context),
+            timeout=agent_timeout(agent),
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Fan-out: {agent} timed out")
+        return _result(agent, started, error=_timeout_error(agent), timed_out=True)
+    except LLMSaturated as e:
+        result = _result(agent, started, error=str(e))
+        result['retry_after'] = e.retry_after
+        return result
+    except Exception as e:
+        logger.warning(f"Fan-out: {agent} failed: {e}")
+        return _result(agent, started, error=str(e))
+    return _result(agent, started, response=str(response or ''))
+
+
+async def run_fan_out(
+    agents: List[str],
+    runners: Dict[str, Any],
+    message: str,
+    session_id: str,
+    contexts: Dict[str, Optional[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """
+    Run *agents* concurrently.  Returns one result per agent, in *agents*
+    order: ``{agent, success, response, error, timed_out, elapsed_ms}``.
+    """
+    return list(await asyncio.gather(*(
+        _run_one(agent, runners[agent], message, session_id, contexts.get(agent))
+        for agent in agents
+    )))
+
+
+async def stream_fan_out(
+    agents: List[str],
+    runners: Dict[str, Any],
+    message: str,
+    session_id: str,
+    contexts: Dict[str, Optional[Dict[str, Any]]],
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Stream *agents* concurrently as sections.
+
+    Yields ``section_start`` / ``chunk`` (both carrying ``agent``) and
+    ``agent_error`` events, then a final ``fan_out_complete`` event whose
+    ``results`` are in section order (agents with no output last).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    started = time.monotonic()
+
+    async def pump(agent):
+        async for chunk in runners[agent].run_agent_stream(
+            message, session_id=session_id, user_context=contexts.get(agent)
+        ):
+            if chunk:
+                await queue.put((agent, 'chunk', chunk))
+
+    async def produce(agent):
+        outcome = {'error': None, 'timed_out': False}
+        try:
+            await asyncio.wait_for(pump(agent), timeout=agent_timeout(agent))
+        except asyncio.TimeoutError:
+            logger.warning(f"Fan-out stream: {agent} timed out")
+            outcome = {'error': _timeout_error(agent), 'timed_out': True}
+        except LLMSaturated as e:
+            outcome = {'error': str(e), 'timed_out': False, 'retry_after': e.retry_after}
+        except Exception as e:
+            logger.warning(f"Fan-out stream: {agent} failed: {e}")
+            outcome = {'error': str(e), 'timed_out': False}
+        outcome['elapsed_ms'] = round((time.monotonic() - started) * 1000)
+        await queue.put((agent, 'done', outcome))
+
+    buffers: Dict[str, List[str]] = {agent: [] for agent in agents}
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    sections: List[str] = []
+
+    def open_section(agent):
+        sections.append(agent)
+        text = ''.join(buffers[agent])
+        if len(sections) > 1:
+            # Same joint merge_responses() puts between sections
+            text = SECTION_SEPARATOR + text
+        yield {'type': 'section_start', 'agent': agent}
+        yield {'type': 'chunk', 'agent': agent, 'content': text}
+
+    tasks = [asyncio.create_task(produce(agent)) for agent in agents]
+    live = None
+    try:
+        while len(outcomes) < len(agents):
+            agent, kind, payload = await queue.get()
+            if kind == 'chunk':
+                buffers[agent].append(payload)
+                if agent == live:
+                    yield {'type': 'chunk', 'agent': agent, 'content': payload}
+                elif live is None:
+                    live = agent
+                    for event in open_section(agent):
+                        yield event
+                continue
+
+            outcomes[agent] = payload
+            if payload['error']:
+                yield {
+                    'type': 'agent_error',
+                    'agent': agent,
+                    'error': payload['error'],
+                    'timed_out': payload['timed_out'],
+                }
+            if agent != live:
+                continue
+            # The live section ended: flush sections that already finished
+            # while buffering, then go live with the first still running
+            live = None
+            for candidate in agents:
+                if candidate in sections or not buffers[candidate]:
+                    continue
+                for event in open_section(candidate):
+                    yield event
+                if candidate not in outcomes:
+                    live = candidate
+                    break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    ordered = sections + [agent for agent in agents if agent not in sections]
+    yield {
+        'type': 'fan_out_complete',
+        'results': [
+            {
+                'agent': agent,
+                'success': outcomes[agent]['error'] is None,
+                'response': ''.join(buffers[agent]),
+                'error': outcomes[agent]['error'],
+                'timed_out': outcomes[agent]['timed_out'],
+                'elapsed_ms': outcomes[agent]['elapsed_ms'],
+                **({'retry_after': outcomes[agent]['retry_after']} if 'retry_after' in outcomes[agent] else {}),
+            }
+            for agent in ordered
+        ],
+    }
@@ -11,6 +11,11 @@ from django.conf import settings
 from dotenv import load_dotenv
 from asgiref.sync import sync_to_async
 
+from . import llm_resilience
+from .llm_admission import LLMSaturated
+from .prompt_cache import prompt_prefixes
+from .token_budget import MAX_CONTINUATIONS, continuation_messages, estimate_tokens, token_budget
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -31,8 +36,20 @@ class GroqAgentRunner:
         'gemma2-9b': 'gemma2-9b-it',
     }
     
+    # Faster models to fail over to while a model is failing (llm_resilience)
+    FAILOVER_MODELS = {
+        'llama-3.3-70b': ['mixtral-8x7b', 'gemma2-9b'],
+        'llama-3.1-70b': ['mixtral-8x7b', 'gemma2-9b'],
+        'mixtral-8x7b': ['gemma2-9b'],
+        # Nothing is faster; a peer beats failing the turn
+        'gemma2-9b': ['mixtral-8x7b'],
+    }
+    
     # How many past messages to load from DB for context
     HISTORY_WINDOW = 20
+    # The window slides in steps of this many messages, so the history
+    # stays a stable (cacheable) prompt prefix in between
+    HISTORY_STEP = 10
     
     def __init__(
         self, 
@@ -63,10 +80,17 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
         # Get model name
         self.model = self.AVAILABLE_MODELS.get(model, self.AVAILABLE_MODELS['llama-3.3-70b'])
         
-        # Initialize Groq clients
+        # Initialize Groq clients.  Retries are llm_resilience's job (with
+        # backoff, breakers and failover), not the SDK's.
         api_key = self._get_api_key()
         self.client = Groq(api_key=api_key)
-        self.async_client = AsyncGroq(api_key=api_key)
+        self.async_client = AsyncGroq(api_key=api_key, max_retries=0)
+    
+    def _model_chain(self, model: str) -> List[str]:
+        """*model* followed by its failover models, as API model ids."""
+        alias = next((a for a, model_id in self.AVAILABLE_MODELS.items() if model_id == model), None)
+        fallbacks = [self.AVAILABLE_MODELS[a] for a in self.FAILOVER_MODELS.get(alias, [])]
+        return [model] + [m for m in fallbacks if m != model]
     
     def _get_api_key(self) -> str:
         """Get Groq API key from settings or environment"""
@@ -81,6 +105,10 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
         """
         Load conversation history from DB instead of in-memory dict.
         This means history survives server restarts.
+        
+        Loads HISTORY_WINDOW to HISTORY_WINDOW + HISTORY_STEP - 1 messages,
+        starting at a multiple of HISTORY_STEP: consecutive turns share the
+        same oldest message instead of dropping one every turn.
         """
         from agents.models import Message, AgentSession
         
@@ -92,14 +120,12 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
             if not session:
                 return []
             
-            messages = await sync_to_async(
-                lambda: list(
-                    session.messages.order_by('-created_at')[:self.HISTORY_WINDOW]
-                )
-            )()
+            def load():
+                total = session.messages.count()
+                start = max(0, total - self.HISTORY_WINDOW) // self.HISTORY_STEP * self.HISTORY_STEP
+                return list(session.messages.order_by('created_at', 'id')[start:])
             
-            # Reverse to chronological order
-            messages.reverse()
+            messages = await sync_to_async(load)()
             
             history = []
             for msg in messages:
@@ -187,21 +213,53 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
         
         return "\n".join(parts)
     
-    async def _build_messages(
-        self, 
-        user_input: str, 
-        session_id: str,
-        user_context: Optional[Dict[str, Any]] = None
-    ) -> List[Dict[str, str]]:
+    def _build_turn_context_message(self, user_context: Dict[str, Any]) -> str:
         """
-        Build the full message array for the Groq API call:
-        [system_prompt, user_context, ...history, current_message]
+        Context that changes from turn to turn.  Kept out of the profile
+        message so that one stays a byte-identical prompt prefix.
+        """
+        parts = []
+        
+        # Multi-agent fan-out: the other agents answering the same message
+        collaborators = user_context.get('collaborating_agents', [])
+        if collaborators:
+            parts.append(
+                f"The {', '.join(collaborators)} assistant(s) are answering other parts of this "
+                "message in the same reply: cover only your own area and don't repeat theirs."
+            )
+        
+        # Items saved earlier in this conversation (session_artifacts)
+        saved_items = user_context.get('saved_items', [])
+        if saved_items:
+            parts.append(
+                "Already saved in this conversation (don't re-create these):\n"
+                + "\n".join(f"- {item}" for item in saved_items)
+            )
+        
+        return "\n".join(parts)
+    
+    def _build_retrieved_notes_message(self, notes: List[Dict[str, Any]]) -> str:
+        """
+        Render knowledge-index hits as numbered sources the agent can cite.
+        """
+        lines = [
+            "RELEVANT NOTES from the user's saved items and past conversations "
+            "(cite as [1], [2], ...; say so if they don't answer the question):"
+        ]
+        for i, note in enumerate(notes, 1):
+            lines.append(f"[{i}] {note['label']}\n    {note['snippet']}")
+        return "\n".join(lines)
+    
+    def _build_prefix(self, user_context: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """
+        The messages every turn of a conversation starts with: the system
+        prompt and the user profile, byte-identical until the profile changes.
         """
         messages = [
             {"role": "system", "content": self.system_instruction}
         ]
         
-        # Inject user context as a second system message
+        # Inject the user profile as a second system message
         if user_context:
             context_text = self._build_user_context_message(user_context)
             if context_text:
@@ -209,21 +267,57 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
                     "role": "system",
                     "content": f"USER PROFILE (use this to personalize your responses):\n{context_text}"
                 })
+        return messages
+    
+    async def _build_messages(
+        self, 
+        user_input: str, 
+        session_id: str,
+        user_context: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the full message array for the Groq API call, most stable first
+        so consecutive calls share the longest possible prefix (prompt_cache):
+        [system_prompt, user_profile, ...history, turn_context, retrieved_notes, current_message]
+        """
+        messages = self._build_prefix(user_context)
+        prefix_length = len(messages)
         
-        # Load conversation history from DB
+        # Load conversation history from DB.  The orchestrator records the
+        # message being answered first; it is sent once, at the end.
         history = await self._load_history_from_db(session_id)
+        if history and history[-1] == {'role': 'user', 'content': user_input}:
+            history.pop()
         messages.extend(history)
         
+        # Per-turn context goes after the history
+        if user_context:
+            turn_text = self._build_turn_context_message(user_context)
+            if turn_text:
+                messages.append({"role": "system", "content": turn_text})
+        
+        # Retrieved notes (knowledge agent) as their own system message
+        retrieved = (user_context or {}).get('retrieved_notes')
+        if retrieved:
+            messages.append({
+                "role": "system",
+                "content": self._build_retrieved_notes_message(retrieved)
+            })
+        
         # Add current user message
         messages.append({"role": "user", "content": user_input})
         
+        prompt_prefixes.observe(self.agent_name, session_id, messages, prefix_length)
+        
         return messages
     
     async def run_agent(
         self, 
         user_input: str, 
         session_id: str = "default",
-        user_context: Optional[Dict[str, Any]] = None
+        user_context: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        budget: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Run agent and return complete response.
@@ -232,25 +326,52 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
             user_input: User's message
             session_id: Session ID for conversation tracking
             user_context: User profile context from UserProfile.get_agent_context()
+            model: API model id for this turn (model_router); defaults to self.model
+            budget: token_budget.plan() for this turn; planned here when omitted
             
         Returns:
             Complete agent response
         """
         try:
             messages = await self._build_messages(user_input, session_id, user_context)
+            budget = budget or token_budget.plan(self.agent_name, user_input, cap=self.max_tokens)
+            chain = self._model_chain(model or self.model)
+            max_tokens = budget['max_tokens']
             
-            response = await self.async_client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                frequency_penalty=0.2,
-                presence_penalty=0.2,
-            )
+            # Continue a reply cut off by max_tokens instead of returning it clipped;
+            # each continuation is the original prompt plus the whole reply so far
+            base, parts, tokens = messages, [], 0
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                response, model_used = await llm_resilience.complete(
+                    lambda model: self.async_client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=max_tokens,
+                        frequency_penalty=0.2,
+                        presence_penalty=0.2,
+                    ),
+                    chain,
+                )
+                choice = response.choices[0]
+                parts.append(choice.message.content or '')
+                usage = getattr(response, 'usage', None)
+                tokens += usage.completion_tokens if usage else estimate_tokens(parts[-1])
+                prompt_prefixes.record_usage(self.agent_name, usage)
+                if choice.finish_reason != 'length' or continuation == MAX_CONTINUATIONS:
+                    break
+                logger.info(f"{self.agent_name} reply hit max_tokens={max_tokens}; continuing")
+                messages = continuation_messages(base, ''.join(parts))
+                max_tokens = min(self.max_tokens, max_tokens * 2)
+                chain = self._model_chain(model_used)
             
-            assistant_message = response.choices[0].message.content
+            token_budget.record(budget, tokens, continuations=continuation)
+            assistant_message = ''.join(parts)
             return assistant_message
             
+        except LLMSaturated as e:
+            logger.warning(f"{self.agent_name} not admitted: {e}")
+            raise
         except Exception as e:
             logger.error(f"Groq API Error in {self.agent_name}: {e}")
             raise
@@ -259,7 +380,9 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
         self, 
         user_input: str, 
         session_id: str = "default",
-        user_context: Optional[Dict[str, Any]] = None
+        user_context: Optional[Dict[str, Any]] = None,
+        model: Optional[str] = None,
+        budget: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """
         Stream agent responses in real-time.
@@ -268,28 +391,63 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
             user_input: User's message
             session_id: Session ID for conversation tracking
             user_context: User profile context from UserProfile.get_agent_context()
+            model: API model id for this turn (model_router); defaults to self.model
+            budget: token_budget.plan() for this turn; planned here when omitted
             
         Yields:
             Response chunks as they're generated
         """
         try:
             messages = await self._build_messages(user_input, session_id, user_context)
+            budget = budget or token_budget.plan(self.agent_name, user_input, cap=self.max_tokens)
+            chain = self._model_chain(model or self.model)
+            max_tokens = budget['max_tokens']
             
-            stream = await self.async_client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                frequency_penalty=0.2,
-                presence_penalty=0.2,
-                stream=True,
-            )
+            # A truncated stream carries on seamlessly in a continuation request
+            base, streamed, tokens = messages, '', 0
+            served = []  # model that streamed each part
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                stream = llm_resilience.stream(
+                    lambda model: self.async_client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=max_tokens,
+                        frequency_penalty=0.2,
+                        presence_penalty=0.2,
+                        stream=True,
+                    ),
+                    chain,
+                    on_model=served.append,
+                )
+                
+                part, finish_reason, usage = '', None, None
+                async for chunk in stream:
+                    # Groq reports usage on the last chunk
+                    usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    if chunk.choices[0].delta.content:
+                        content = chunk.choices[0].delta.content
+                        part += content
+                        yield content
+                
+                streamed += part
+                tokens += usage.completion_tokens if usage else estimate_tokens(part)
+                prompt_prefixes.record_usage(self.agent_name, usage)
+                if finish_reason != 'length' or continuation == MAX_CONTINUATIONS:
+                    break
+                logger.info(f"{self.agent_name} stream hit max_tokens={max_tokens}; continuing")
+                messages = continuation_messages(base, streamed)
+                max_tokens = min(self.max_tokens, max_tokens * 2)
+                chain = self._model_chain(served[-1])
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    yield content
+            token_budget.record(budget, tokens, continuations=continuation)
             
+        except LLMSaturated as e:
+            logger.warning(f"{self.agent_name} stream not admitted: {e}")
+            raise
         except Exception as e:
             logger.error(f"Groq Streaming Error in {self.agent_name}: {e}")
             raise
@@ -297,9 +455,13 @@ VISUAL STYLING GUIDELINES (STRICT COMPLIANCE REQUIRED):
     def clear_conversation(self, session_id: str):
         """Clear conversation history for a session (deletes from DB)"""
         from agents.models import Message, AgentSession
+        from .message_store import reset_session_counters
+        from .knowledge_index import forget_session
         try:
             session = AgentSession.objects.filter(session_id=session_id).first()
             if session:
                 session.messages.all().delete()
+                forget_session(session)
+                reset_session_counters(session)
         except Exception as e:
             logger.warning(f"Failed to clear conversation {session_id}: {e}")
@@ -10,6 +10,8 @@ import json
 import logging
 import os
 
+from .llm_admission import llm_admission
+
 logger = logging.getLogger(__name__)
 
 
@@ -25,6 +27,10 @@ class IntentClassifier:
     
     # Default agent when LLM returns an unknown/hallucinated agent name
     DEFAULT_FALLBACK_AGENT = 'productivity_agent'
+    
+    # Fair-queuing weight for classifier calls: they are short and block the
+    # whole turn, so they go ahead of queued agent completions
+    ADMISSION_WEIGHT = 2.0
 
     AGENT_INTENTS = {
         'study_agent': [
@@ -61,7 +67,13 @@ class IntentClassifier:
             'morning routine', 'evening routine', 'bedtime routine',
             'new habit', 'stop habit', 'habit stack', 'atomic habits',
             'how many days', 'did i do', 'check in', 'log habit',
-        ]
+        ],
+        'knowledge_agent': [
+            'my notes', 'knowledge base', 'what did i learn', 'what have i learned',
+            'what do i know about', 'connect ideas', 'related ideas', 'find my notes',
+            'search my notes', 'in my notes', 'from my notes', 'organize my notes',
+            'synthesize',
+        ],
     }
     
     def __init__(self):
@@ -187,6 +199,7 @@ class IntentClassifier:
 - productivity_agent: Tasks, scheduling, goals, time management
 - wellness_agent: Exercise, meditation, sleep, mood, health
 - meal_planner_agent: Meals, recipes, nutrition, cooking
+- knowledge_agent: Recalling and connecting the user's own notes and past conversations
 
 Message: "{user_message}"
 {f"Recent context: {context}" if context else ""}
@@ -194,15 +207,17 @@ Message: "{user_message}"
 Respond ONLY with JSON:
 {{"primary_agent": "agent_name", "confidence": 0.95, "reasoning": "brief reason"}}"""
         
-        chat_completion = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are an intent classifier. Respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            model=self.model,
-            temperature=0.1,
-            max_tokens=200,  # Reduced from 500
-        )
+        # When saturated this raises, and classify_intent falls back to keywords
+        async with llm_admission.slot(weight=self.ADMISSION_WEIGHT):
+            chat_completion = self.client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": "You are an intent classifier. Respond with valid JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                model=self.model,
+                temperature=0.1,
+                max_tokens=200,  # Reduced from 500
+            )
         
         response_text = chat_completion.choices[0].message.content.strip()
         
@@ -0,0 +1,390 @@
+"""
+Retrieval index for the knowledge agent.
+
+Study-session notes, conversation messages and saved items (tasks, meal
+plans, wellness activities, habits) are tokenized into a per-user inverted
+index (``KnowledgeDocument`` + ``KnowledgePosting``) and ranked with Okapi
+BM25, so the knowledge agent is handed the few most relevant snippets
+instead of relying on the last ``HISTORY_WINDOW`` messages.
+
+Terms are stored as 31-bit hashes: postings stay integer-keyed and
+backend-agnostic, and the rare collision only costs a little precision.
+
+Incremental: the ``post_save``/``post_delete`` receivers in
+``agents.signals`` call :func:`index_instance` / :func:`remove_instance`,
+which rewrite a single document's postings.  Message documents hang off
+their session (CASCADE), so deleting a conversation drops them without a
+per-row delete signal on ``Message``; clearing one goes through
+:func:`forget_session`.  Rows written with ``bulk_create``/``update``
+bypass signals — run :func:`rebuild_index` (``manage.py
+rebuild_knowledge_index``) after such backfills.
+
+A search costs three queries: corpus stats, the postings of the query
+terms, and the text of the winning documents.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from agents.models import (
+    AgentSession,
+    Habit,
+    KnowledgeDocument,
+    KnowledgePosting,
+    MealPlan,
+    Message,
+    StudySession,
+    Task,
+    User,
+    WellnessActivity,
+)
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 5
+SNIPPET_CHARS = 320
+MAX_DOCUMENT_CHARS = 20000
+REBUILD_CHUNK_SIZE = 500
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Model -> source_type.  Order is the order rebuild_index() walks them in.
+SOURCE_TYPES = {
+    StudySession: 'study_session',
+    Message: 'message',
+    Task: 'task',
+    MealPlan: 'meal_plan',
+    WellnessActivity: 'wellness_activity',
+    Habit: 'habit',
+}
+
+# Fields that feed a document's label or text: saves limited to other
+# fields (streak counters, completed_at, ...) skip re-indexing.
+INDEXED_FIELDS = {
+    'study_session': {'subject', 'topic', 'notes', 'user'},
+    'message': {'content', 'role', 'session'},
+    'task': {'title', 'description', 'status', 'user'},
+    'meal_plan': {'meal_name', 'meal_type', 'date', 'ingredients', 'instructions', 'user'},
+    'wellness_activity': {'activity_type', 'notes', 'recorded_at', 'user'},
+    'habit': {'name', 'description', 'user'},
+}
+
+# System messages are internal bookkeeping, not user knowledge
+INDEXED_ROLES = ('user', 'agent')
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing down
+during each few for from further had has have having he her here hers him
+his how i if in into is it its just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than
+that the their theirs them then there these they this those through to too
+under until up very was we were what when where which while who whom why
+will with would you your yours
+""".split())
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+# ---------------------------------------------------------------------------
+# Tokenizing
+# ---------------------------------------------------------------------------
+
+
+def _normalize(token: str) -> Optional[str]:
+    """Lowercase, drop stopwords, and fold simple plurals ("notes" -> "note")."""
+    term = token.lower()
+    if term in STOPWORDS or (len(term) < 2 and not term.isdigit()):
+        return None
+    if len(term) > 4 and term.endswith('ies'):
+        return term[:-3] + 'y'
+    if len(term) > 3 and term.endswith('s') and not term.endswith(('ss', 'us', 'is')):
+        return term[:-1]
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of *text*, in order."""
+    terms = []
+    for token in _TOKEN_RE.findall(text or ''):
+        term = _normalize(token)
+        if term:
+            terms.append(term)
+    return terms
+
+
+def _term_id(term: str) -> int:
+    return zlib.crc32(term.encode('utf-8')) & 0x7FFFFFFF
+
+
+# ---------------------------------------------------------------------------
+# Documents
+# ---------------------------------------------------------------------------
+
+
+def _flatten(value: Any) -> Iterable[str]:
+    """Strings inside a JSON value (ingredient lists may be strings or dicts)."""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _flatten(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _flatten(item)
+    elif value is not None:
+        yield str(value)
+
+
+def _describe(source_type: str, obj) -> Tuple[str, str]:
+    """(label, text) for one source row.  The label is what citations show."""
+    if source_type == 'message':
+        who = "You" if obj.role == 'user' else "Assistant"
+        return f"{who} in chat ({obj.created_at:%Y-%m-%d})", obj.content
+    if source_type == 'study_session':
+        topic = f" — {obj.topic}" if obj.topic else ""
+        parts = [obj.subject, obj.topic, obj.notes]
+        return f"Study session: {obj.subject}{topic} ({obj.created_at:%Y-%m-%d})", "\n".join(filter(None, parts))
+    if source_type == 'task':
+        return f"Task: {obj.title} ({obj.status})", "\n".join(filter(None, [obj.title, obj.description]))
+    if source_type == 'meal_plan':
+        parts = [obj.meal_name, *_flatten(obj.ingredients), obj.instructions]
+        return f"Meal plan: {obj.meal_name} ({obj.meal_type}, {obj.date})", "\n".join(filter(None, parts))
+    if source_type == 'wellness_activity':
+        parts = [obj.activity_type, obj.notes]
+        return (
+            f"Wellness activity: {obj.activity_type} ({obj.recorded_at:%Y-%m-%d})",
+            "\n".join(filter(None, parts)),
+        )
+    if source_type == 'habit':
+        return f"Habit: {obj.name}", "\n".join(filter(None, [obj.name, obj.description]))
+    return str(obj), str(obj)
+
+
+def _owner(source_type: str, obj) -> Tuple[Optional[int], Optional[int]]:
+    """(user_id, session_id) of the document; session only for messages."""
+    if source_type == 'message':
+        if obj.role not in INDEXED_ROLES:
+            return None, None
+        return obj.session.user_id, obj.session_id
+    return obj.user_id, None
+
+
+def index_instance(instance, *, created: bool = False, update_fields=None) -> Optional[KnowledgeDocument]:
+    """
+    (Re)index one source row.  Returns the document, or None when the row
+    is not indexable (unknown model, no owner, no terms) — in which case
+    any stale document for it is removed.
+    """
+    source_type = SOURCE_TYPES.get(type(instance))
+    if source_type is None:
+        return None
+    if update_fields is not None and not set(update_fields) & INDEXED_FIELDS[source_type]:
+        return None
+
+    user_id, session_id = _owner(source_type, instance)
+    label, text = _describe(source_type, instance)
+    text = text[:MAX_DOCUMENT_CHARS]
+    terms = tokenize(text)
+    if not user_id or not terms:
+        if not created:
+            remove_instance(instance)
+        return None
+
+    fields = {
+        'user_id': user_id,
+        'session_id': session_id,
+        'label': label[:255],
+        'text': text,
+        'length': len(terms),
+    }
+    with transaction.atomic():
+        if created:
+            document = KnowledgeDocument.objects.create(
+                source_type=source_type, source_id=instance.pk, **fields
+            )
+        else:
+            document, is_new = KnowledgeDocument.objects.update_or_create(
+                source_type=source_type, source_id=instance.pk, defaults=fields
+            )
+            if not is_new:
+                document.postings.all().delete()
+        KnowledgePosting.objects.bulk_create([
+            KnowledgePosting(document=document, user_id=user_id, term=term, tf=tf)
+            for term, tf in Counter(_term_id(t) for t in terms).items()
+        ])
+    return document
+
+
+def remove_instance(instance) -> int:
+    """Drop the document for one source row.  Returns the number removed."""
+    source_type = SOURCE_TYPES.get(type(instance))
+    if source_type is None:
+        return 0
+    deleted, _ = KnowledgeDocument.objects.filter(
+        source_type=source_type, source_id=instance.pk
+    ).delete()
+    return deleted
+
+
+def forget_session(session: AgentSession) -> int:
+    """Drop the message documents of a conversation whose messages were cleared."""
+    deleted, _ = KnowledgeDocument.objects.filter(session=session).delete()
+    return deleted
+
+
+def _source_queryset(model, user: Optional[User]):
+    if model is Message:
+        queryset = Message.objects.filter(role__in=INDEXED_ROLES, session__user__isnull=False)
+        queryset = queryset.select_related('session')
+        return queryset.filter(session__user=user) if user else queryset
+    queryset = model.objects.filter(user__isnull=False)
+    return queryset.filter(user=user) if user else queryset
+
+
+def rebuild_index(user: Optional[User] = None, chunk_size: int = REBUILD_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Re-index every source row of *user* (or of everyone) from scratch.
+
+    Returns the number of documents indexed per source type.
+    """
+    documents = KnowledgeDocument.objects.all()
+    if user is not None:
+        documents = documents.filter(user=user)
+    documents.delete()
+
+    counts: Dict[str, int] = {}
+    for model, source_type in SOURCE_TYPES.items():
+        indexed = 0
+        for obj in _source_queryset(model, user).order_by('pk').iterator(chunk_size=chunk_size):
+            if index_instance(obj, created=True) is not None:
+                indexed += 1
+        counts[source_type] = indexed
+        logger.info("Knowledge index: %d %s document(s)", indexed, source_type)
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Search
+# ---------------------------------------------------------------------------
+
+
+def _snippet(text: str, terms: Set[str], size: int = SNIPPET_CHARS) -> str:
+    """The *size*-character window of *text* holding the most query-term hits."""
+    text = ' '.join(text.split())
+    if len(text) <= size:
+        return text
+    hits = [m.start() for m in _TOKEN_RE.finditer(text) if _normalize(m.group()) in terms]
+    best_start, best_count = 0, 0
+    right = 0
+    for left, position in enumerate(hits):
+        while right < len(hits) and hits[right] < position + size:
+            right += 1
+        if right - left > best_count:
+            best_start, best_count = position, right - left
+    # Open a little before the first hit so it reads in context
+    start = max(0, min(best_start - size // 8, len(text) - size))
+    snippet = text[start:start + size]
+    if start > 0:
+        snippet = "…" + snippet.split(' ', 1)[-1]
+    if start + size < len(text):
+        snippet = snippet.rsplit(' ', 1)[0] + "…"
+    return snippet
+
+
+def search(
+    user: User,
+    query: str,
+    *,
+    k: int = TOP_K,
+    exclude: Iterable[Tuple[str, int]] = (),
+) -> List[Dict[str, Any]]:
+    """
+    BM25 top-*k* documents of *user* for *query*.
+
+    *exclude* is a collection of ``(source_type, source_id)`` pairs to leave
+    out (e.g. messages already in the prompt's history window).
+
+    Each result has ``source_type``, ``source_id``, ``label``, ``snippet``
+    and ``score``; best first.
+    """
+    terms = set(tokenize(query))
+    term_ids = sorted({_term_id(t) for t in terms})
+    if not term_ids or not user or not user.pk:
+        return []
+
+    stats = KnowledgeDocument.objects.filter(user=user).aggregate(n=Count('id'), avgdl=Avg('length'))
+    total = stats['n']
+    if not total:
+        return []
+    avgdl = stats['avgdl'] or 1.0
+
+    postings = list(
+        KnowledgePosting.objects.filter(user=user, term__in=term_ids).values_list(
+            'document_id', 'term', 'tf', 'document__length',
+            'document__source_type', 'document__source_id',
+        )
+    )
+    df = Counter(term for _, term, _, _, _, _ in postings)
+    idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+
+    excluded = set(exclude)
+    scores: Dict[int, float] = {}
+    for document_id, term, tf, length, source_type, source_id in postings:
+        if (source_type, source_id) in excluded:
+            continue
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+        scores[document_id] = scores.get(document_id, 0.0) + idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+
+    top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+    documents = KnowledgeDocument.objects.in_bulk([document_id for document_id, _ in top])
+    return [
+        {
+            'source_type': documents[document_id].source_type,
+            'source_id': documents[document_id].source_id,
+            'label': documents[document_id].label,
+            'snippet': _snippet(documents[document_id].text, terms),
+            'score': round(score, 4),
+        }
+        for document_id, score in top
+        if document_id in documents
+    ]
+
+
+def retrieve_for_prompt(
+    user: User,
+    query: str,
+    session: Optional[AgentSession] = None,
+    *,
+    k: int = TOP_K,
+    history_window: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Top-*k* snippets for the knowledge agent's prompt.
+
+    The last *history_window* messages of *session* are sent as chat history
+    anyway, so they are excluded rather than spending the budget twice.
+    Never raises: retrieval failing must not fail the chat turn.
+    """
+    try:
+        exclude = []
+        if session is not None:
+            recent = (
+                Message.objects.filter(session=session)
+                .order_by('-created_at', '-id')
+                .values_list('id', flat=True)[:history_window + 1]  # + the message being answered
+            )
+            exclude = [('message', message_id) for message_id in recent]
+        return search(user, query, k=k, exclude=exclude)
+    except Exception as e:
+        logger.warning(f"Knowledge retrieval failed for user {getattr(user, 'pk', None)}: {e}")
+        return []
@@ -0,0 +1,313 @@
+"""
+Admission control for LLM (Groq) calls.
+
+Every agent completion, stream and LLM intent classification passes
+through :data:`llm_admission` before it reaches the provider:
+
+- a **global concurrency cap** (``LLM_MAX_CONCURRENCY`` calls in flight);
+- a **per-user token bucket** (``LLM_USER_RATE_PER_MINUTE`` sustained,
+  ``LLM_USER_BURST`` burst), so one user can't spend the deployment's
+  provider quota;
+- **weighted fair queuing** when every slot is busy: each waiter gets a
+  virtual finish tag ``max(V, user's last tag) + cost / weight`` and the
+  smallest tag is served next, so a user with ten queued calls waits
+  behind another user's single call instead of in front of it;
+- **fail-fast**: a full queue (``LLM_MAX_QUEUE`` overall,
+  ``LLM_MAX_QUEUE_PER_USER`` per user) or a wait longer than
+  ``LLM_MAX_QUEUE_WAIT`` raises :class:`LLMSaturated`, which the API
+  turns into ``429`` with ``Retry-After``.
+
+Views run each request on its own event loop (and streams on a worker
+thread), so the controller is one process-wide object guarded by a
+``threading.Lock``; a queued waiter is woken on its own loop with
+``call_soon_threadsafe``.
+
+The caller's identity comes from :func:`bind_user`, set by the orchestrator
+for the whole turn (``contextvars`` carry it into fan-out tasks).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(getattr(settings, 'LLM_MAX_CONCURRENCY', 8))
+MAX_QUEUE = int(getattr(settings, 'LLM_MAX_QUEUE', 32))
+MAX_QUEUE_PER_USER = int(getattr(settings, 'LLM_MAX_QUEUE_PER_USER', 4))
+MAX_QUEUE_WAIT = float(getattr(settings, 'LLM_MAX_QUEUE_WAIT', 10.0))
+USER_RATE_PER_MINUTE = float(getattr(settings, 'LLM_USER_RATE_PER_MINUTE', 30))
+USER_BURST = float(getattr(settings, 'LLM_USER_BURST', 10))
+
+# Recent waits kept for percentiles
+WAIT_SAMPLES = 1024
+# Idle, full buckets are dropped once this many users are tracked
+MAX_TRACKED_USERS = 10000
+
+ANONYMOUS = 'anonymous'
+
+_current_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('llm_user', default=None)
+
+
+def bind_user(user) -> None:
+    """Charge LLM calls made from the current context (and tasks it spawns) to *user*."""
+    pk = getattr(user, 'pk', None) if user is not None else None
+    _current_user.set(str(pk) if pk is not None else ANONYMOUS)
+
+
+class LLMSaturated(Exception):
+    """No capacity for this LLM call; retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"LLM capacity exhausted ({reason}); retry after {self.retry_after}s")
+
+
+class _Waiter:
+    __slots__ = ('user', 'loop', 'future', 'state', 'start_tag')
+
+    def __init__(self, user, loop, start_tag):
+        self.user = user
+        self.loop = loop
+        self.future = loop.create_future()
+        self.state = 'waiting'  # -> 'granted' | 'abandoned'
+        self.start_tag = start_tag
+
+
+def _wake(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_queue: int = MAX_QUEUE,
+        max_queue_per_user: int = MAX_QUEUE_PER_USER,
+        max_queue_wait: float = MAX_QUEUE_WAIT,
+        user_rate_per_minute: float = USER_RATE_PER_MINUTE,
+        user_burst: float = USER_BURST,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.max_queue_wait = max_queue_wait
+        self.user_rate = user_rate_per_minute / 60.0
+        self.user_burst = user_burst
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._heap = []  # (finish_tag, seq, waiter)
+        self._seq = itertools.count()
+        self._queued = 0
+        self._queued_per_user: Counter = Counter()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._buckets: Dict[str, tuple] = {}  # user -> (tokens, updated_at)
+
+        self._admitted = 0
+        self._rejected: Counter = Counter()
+        self._max_queue_depth = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._hold_ewma = 1.0  # seconds a slot is typically held
+
+    # -- token buckets ----------------------------------------------------
+
+    def _refill(self, user: str, now: float) -> float:
+        tokens, updated_at = self._buckets.get(user, (self.user_burst, now))
+        return min(self.user_burst, tokens + (now - updated_at) * self.user_rate)
+
+    def _take_token(self, user: str, cost: float, now: float) -> None:
+        tokens = self._refill(user, now)
+        if tokens < cost:
+            self._rejected['user_rate'] += 1
+            retry_after = (cost - tokens) / self.user_rate if self.user_rate else 60
+            raise LLMSaturated('user_rate', retry_after)
+        self._buckets[user] = (tokens - cost, now)
+        if len(self._buckets) > MAX_TRACKED_USERS:
+            self._buckets = {
+                u: b for u, b in self._buckets.items() if self._refill(u, now) < self.user_burst
+            }
+
+    # -- queue ------------------------------------------------------------
+
+    def _queue_retry_after(self) -> float:
+        # Time for the queue ahead to drain through every slot
+        return self._hold_ewma * (self._queued + 1) / max(1, self.max_concurrency)
+
+    def _check_queue(self, user: str) -> None:
+        if self._queued >= self.max_queue or self._queued_per_user[user] >= self.max_queue_per_user:
+            self._rejected['queue_full'] += 1
+            raise LLMSaturated('queue_full', self._queue_retry_after())
+
+    def _enqueue(self, user: str, loop, weight: float, cost: float) -> _Waiter:
+        start = max(self._virtual_time, self._last_finish.get(user, 0.0))
+        finish = start + cost / max(weight, 1e-6)
+        self._last_finish[user] = finish
+        waiter = _Waiter(user, loop, start)
+        heapq.heappush(self._heap, (finish, next(self._seq), waiter))
+        self._queued += 1
+        self._queued_per_user[user] += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._queued)
+        return waiter
+
+    def _dequeued(self, waiter: _Waiter) -> None:
+        self._queued -= 1
+        self._queued_per_user[waiter.user] -= 1
+        if not self._queued_per_user[waiter.user]:
+            del self._queued_per_user[waiter.user]
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the waiters with the smallest finish tags."""
+        while self._in_flight < self.max_concurrency and self._heap:
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.state != 'waiting':
+                continue  # abandoned: already uncounted
+            self._dequeued(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            try:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            except RuntimeError:
+                # Its event loop is gone; the slot goes to the next waiter
+                waiter.state = 'abandoned'
+                continue
+            waiter.state = 'granted'
+            self._in_flight += 1
+        if not self._heap:
+            # Idle: restart virtual time so tags don't grow forever
+            self._virtual_time = 0.0
+            self._last_finish.clear()
+
+    # -- public API -------------------------------------------------------
+
+    def precheck(self, user=None) -> None:
+        """
+        Raise :class:`LLMSaturated` if a call for *user* would be rejected
+        right now, without consuming anything.  Lets views fail before
+        doing any work.
+        """
+        key = str(user.pk) if getattr(user, 'pk', None) is not None else ANONYMOUS
+        with self._lock:
+            tokens = self._refill(key, time.monotonic())
+            if tokens < 1:
+                self._rejected['user_rate'] += 1
+                raise LLMSaturated('user_rate', (1 - tokens) / self.user_rate if self.user_rate else 60)
+            if self._in_flight >= self.max_concurrency:
+                self._check_queue(key)
+
+    async def acquire(self, weight: float = 1.0, cost: float = 1.0) -> float:
+        """
+        Wait for a slot for the bound user.  Returns seconds waited.
+        Every successful acquire must be paired with :meth:`release`.
+        """
+        user = _current_user.get() or ANONYMOUS
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        with self._lock:
+            immediate = self._in_flight < self.max_concurrency and not self._queued
+            if not immediate:
+                self._check_queue(user)  # before charging: rejections are free
+            self._take_token(user, cost, started)
+            if immediate:
+                self._in_flight += 1
+                self._admitted += 1
+                self._waits.append(0.0)
+                return 0.0
+            waiter = self._enqueue(user, loop, weight, cost)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            with self._lock:
+                if waiter.state == 'waiting':
+                    waiter.state = 'abandoned'
+                    self._dequeued(waiter)
+                    if isinstance(exc, asyncio.TimeoutError):
+                        self._rejected['queue_timeout'] += 1
+                        raise LLMSaturated('queue_timeout', self._queue_retry_after()) from None
+                    raise
+            # Granted just as we gave up
+            if isinstance(exc, asyncio.CancelledError):
+                self.release()
+                raise
+
+        waited = time.monotonic() - started
+        with self._lock:
+            self._admitted += 1
+            self._waits.append(waited)
+        return waited
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot only if one is free right now, without queuing or
+        charging a user.  For optional extra calls (hedged requests) that
+        must never displace real ones.
+        """
+        with self._lock:
+            if self._in_flight < self.max_concurrency and not self._queued:
+                self._in_flight += 1
+                return True
+            return False
+
+    def release(self, held: Optional[float] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if held is not None:
+                self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * held
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, weight: float = 1.0, cost: float = 1.0):
+        """``async with llm_admission.slot(): ...`` around one provider call or stream."""
+        await self.acquire(weight=weight, cost=cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(held=time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth, wait times and rejection counters."""
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'queue_depth': self._queued,
+                'max_queue_depth': self._max_queue_depth,
+                'queued_users': len(self._queued_per_user),
+                'admitted': self._admitted,
+                'rejected': dict(self._rejected),
+                'wait_ms': {
+                    'samples': len(waits),
+                    'mean': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    'p50': round(_percentile(waits, 0.50) * 1000, 1),
+                    'p95': round(_percentile(waits, 0.95) * 1000, 1),
+                    'max': round(waits[-1] * 1000, 1) if waits else 0.0,
+                },
+                'slot_hold_ms_ewma': round(self._hold_ewma * 1000, 1),
+            }
+
+
+def _percentile(ordered, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Singleton instance
+llm_admission = AdmissionController()
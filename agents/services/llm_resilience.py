@@ -0,0 +1,411 @@
+"""
+Resilience for LLM (Groq) calls: retries, hedging, circuit breakers and
+model failover.
+
+:func:`complete` and :func:`stream` take a factory ``call(model)`` and a
+model chain (the runner's model first, then faster fallbacks) and:
+
+1. skip models whose **circuit breaker** is open (``LLM_BREAKER_FAILURES``
+   consecutive transient failures open it for ``LLM_BREAKER_COOLDOWN``
+   seconds; one probe call is let through afterwards);
+2. **retry** transient errors (connection errors, timeouts, 408/409/429/5xx)
+   up to ``LLM_RETRY_ATTEMPTS`` times with full-jitter exponential backoff,
+   honouring a provider ``Retry-After`` that fits in the backoff cap;
+3. optionally **hedge** completions (``LLM_HEDGE_ENABLED``): if an attempt
+   is still running after the model's p95 latency, a duplicate request is
+   sent and the first answer wins.  Hedges only use an admission slot
+   that is free right now, so they never displace real traffic;
+4. **fail over** to the next model in the chain once a model's retries
+   are exhausted or its circuit is open.
+
+Each attempt takes its own ``llm_admission`` slot, so backoff sleeps don't
+hold capacity and only the first attempt is charged to the user's bucket.
+Streams are retried only until the first token arrives: after that a
+failure is surfaced rather than duplicating output.
+
+Per-model health (breaker state, latency samples, counters) is process-wide
+and reported by :func:`snapshot`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import groq
+from django.conf import settings
+
+from .llm_admission import LLMSaturated, llm_admission
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(getattr(settings, 'LLM_RETRY_ATTEMPTS', 3))
+RETRY_BASE_DELAY = float(getattr(settings, 'LLM_RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(getattr(settings, 'LLM_RETRY_MAX_DELAY', 8.0))
+ATTEMPT_TIMEOUT = float(getattr(settings, 'LLM_ATTEMPT_TIMEOUT', 60.0))
+HEDGE_ENABLED = getattr(settings, 'LLM_HEDGE_ENABLED', False)
+BREAKER_FAILURES = int(getattr(settings, 'LLM_BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN = float(getattr(settings, 'LLM_BREAKER_COOLDOWN', 30.0))
+
+# Hedge only once the model has this many latency samples, and never
+# sooner than HEDGE_MIN_DELAY seconds
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 1.0
+LATENCY_SAMPLES = 512
+# Recent outcomes kept for the error rate (model_router)
+OUTCOME_SAMPLES = 100
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpen(LLMSaturated):
+    """Every model in the chain has an open circuit."""
+
+    def __init__(self, retry_after: float):
+        super().__init__('circuit_open', retry_after)
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, groq.APIConnectionError)):
+        return True  # includes APITimeoutError
+    if isinstance(exc, groq.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS or exc.status_code >= 500
+    return False
+
+
+def _provider_retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, exc: Optional[BaseException] = None) -> Optional[float]:
+    """
+    Seconds to wait before retry number *attempt* (0-based), or None when
+    the provider asks for longer than we are willing to wait here.
+    """
+    requested = _provider_retry_after(exc) if exc is not None else None
+    if requested is not None:
+        return requested if requested <= RETRY_MAX_DELAY else None
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _bucket(latency: float) -> int:
+    ms = latency * 1000
+    return next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))
+
+
+def _histogram(counts: List[int]) -> List[Dict[str, Any]]:
+    bounds = list(LATENCY_BUCKETS_MS) + [None]
+    return [{'le_ms': bound, 'count': count} for bound, count in zip(bounds, counts)]
+
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelHealth:
+    """Circuit breaker plus latency/outcome statistics for one model."""
+
+    def __init__(self, model: str, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = 'closed'  # 'open' | 'half_open'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # full completions
+        self.first_token = deque(maxlen=LATENCY_SAMPLES)  # streams
+        self.outcomes = deque(maxlen=OUTCOME_SAMPLES)  # True = success
+        self.histograms = {
+            'latency': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            'first_token': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        }
+        self.counters = {'calls': 0, 'failures': 0, 'retries': 0, 'hedged': 0, 'hedge_wins': 0, 'rejected': 0}
+
+    def allow(self) -> bool:
+        """May a call go to this model now?  Open circuits let one probe through after the cooldown."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown:
+                self.counters['rejected'] += 1
+                return False
+            if self._probe_in_flight:
+                self.counters['rejected'] += 1
+                return False
+            self.state = 'half_open'
+            self._probe_in_flight = True
+            return True
+
+    def retry_after(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self, latency: Optional[float] = None, *, first_token: bool = False) -> None:
+        with self._lock:
+            self.counters['calls'] += 1
+            self.consecutive_failures = 0
+            self.state = 'closed'
+            self._probe_in_flight = False
+            self.outcomes.append(True)
+            if latency is not None:
+                (self.first_token if first_token else self.latencies).append(latency)
+                self.histograms['first_token' if first_token else 'latency'][_bucket(latency)] += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['failures'] += 1
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            self.outcomes.append(False)
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Circuit opened for {self.model} after {self.consecutive_failures} failure(s)")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """The call ended without telling us anything about the model (e.g. not admitted)."""
+        with self._lock:
+            self._probe_in_flight = False
+            if self.state == 'half_open':
+                self.state = 'open'
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def is_open(self) -> bool:
+        """Open and still cooling down (no probe would be let through)."""
+        with self._lock:
+            return self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown
+    
+    def error_rate(self, min_samples: int = 1) -> Optional[float]:
+        """Share of recent calls that failed, or None with fewer than *min_samples*."""
+        with self._lock:
+            if len(self.outcomes) < max(1, min_samples):
+                return None
+            return self.outcomes.count(False) / len(self.outcomes)
+    
+    def p95(self, *, first_token: bool = False) -> Optional[float]:
+        with self._lock:
+            return _percentile(self.first_token if first_token else self.latencies, 0.95)
+    
+    def sample_count(self, *, first_token: bool = False) -> int:
+        with self._lock:
+            return len(self.first_token if first_token else self.latencies)
+    
+    def hedge_delay(self) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            p95 = _percentile(self.latencies, 0.95)
+        return min(max(p95, HEDGE_MIN_DELAY), ATTEMPT_TIMEOUT)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies, first_token = list(self.latencies), list(self.first_token)
+            outcomes = list(self.outcomes)
+            histograms = {name: list(counts) for name, counts in self.histograms.items()}
+            data = {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                **self.counters,
+            }
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        data['latency_ms'] = {'p50': ms(_percentile(latencies, 0.5)), 'p95': ms(_percentile(latencies, 0.95))}
+        data['first_token_ms'] = {'p50': ms(_percentile(first_token, 0.5)), 'p95': ms(_percentile(first_token, 0.95))}
+        data['error_rate'] = round(outcomes.count(False) / len(outcomes), 3) if outcomes else None
+        data['latency_histogram'] = _histogram(histograms['latency'])
+        data['first_token_histogram'] = _histogram(histograms['first_token'])
+        return data
+
+
+_registry_lock = threading.Lock()
+_health: Dict[str, ModelHealth] = {}
+
+
+def model_health(model: str) -> ModelHealth:
+    with _registry_lock:
+        if model not in _health:
+            _health[model] = ModelHealth(model)
+        return _health[model]
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Per-model circuit state, counters and latency percentiles."""
+    with _registry_lock:
+        models = list(_health.values())
+    return {health.model: health.snapshot() for health in models}
+
+
+def _settle(health: ModelHealth, exc: BaseException) -> None:
+    """Book a non-transient error: the provider answered, or we never reached it."""
+    if isinstance(exc, groq.APIStatusError):
+        health.record_success()
+    else:
+        health.release_probe()
+
+
+def _all_open(models: List[str]) -> CircuitOpen:
+    return CircuitOpen(min(model_health(model).retry_after() for model in models))
+
+
+async def _hedged(call: Callable[[str], Awaitable[Any]], model: str, health: ModelHealth) -> Any:
+    """One attempt; a duplicate is raced against it once it outlives the model's p95."""
+    delay = health.hedge_delay() if HEDGE_ENABLED else None
+    primary = asyncio.ensure_future(call(model))
+    hedge = None
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and llm_admission.try_acquire():
+                health.count('hedged')
+                hedge = asyncio.ensure_future(call(model))
+        if hedge is None:
+            return await primary
+
+        done, pending = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            # First one failed: the other may still succeed
+            winner = pending.pop()
+            await asyncio.wait({winner})
+        if winner is hedge and hedge.exception() is None:
+            health.count('hedge_wins')
+        return winner.result()
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+        if hedge is not None:
+            llm_admission.release()
+
+
+async def complete(call: Callable[[str], Awaitable[Any]], models: List[str]) -> Tuple[Any, str]:
+    """
+    Run ``call(model)`` resiliently across *models*.
+
+    Returns ``(result, model_used)``.  Raises the last transient error when
+    every model failed, ``CircuitOpen`` when none could be tried, and any
+    non-transient error (bad request, auth, ``LLMSaturated``) immediately.
+    """
+    last_error: Optional[BaseException] = None
+    charged = False
+    for model in models:
+        health = model_health(model)
+        for attempt in range(RETRY_ATTEMPTS):
+            if not health.allow():
+                break
+            try:
+                async with llm_admission.slot(cost=0 if charged else 1):
+                    charged = True
+                    started = time.monotonic()
+                    result = await asyncio.wait_for(_hedged(call, model, health), timeout=ATTEMPT_TIMEOUT)
+            except asyncio.CancelledError:
+                health.release_probe()
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    _settle(health, e)
+                    raise
+                health.record_failure()
+                last_error = e
+                logger.warning(f"LLM call to {model} failed (attempt {attempt + 1}/{RETRY_ATTEMPTS}): {e!r}")
+                delay = backoff_delay(attempt, e)
+                if attempt + 1 >= RETRY_ATTEMPTS or delay is None:
+                    break
+                health.count('retries')
+                await asyncio.sleep(delay)
+                continue
+            health.record_success(time.monotonic() - started)
+            if model != models[0]:
+                logger.info(f"LLM call failed over from {models[0]} to {model}")
+            return result, model
+    if last_error is None:
+        raise _all_open(models)
+    raise last_error
+
+
+async def stream(
+    call: Callable[[str], Awaitable[AsyncIterator[Any]]],
+    models: List[str],
+    on_model: Optional[Callable[[str], None]] = None,
+) -> AsyncIterator[Any]:
+    """
+    Resilient streaming: like :func:`complete`, but retries and failover
+    only happen before the first chunk; the admission slot is held until
+    the stream ends.  *on_model* is called with the model that serves it.
+    """
+    last_error: Optional[BaseException] = None
+    charged = False
+    for model in models:
+        health = model_health(model)
+        for attempt in range(RETRY_ATTEMPTS):
+            if not health.allow():
+                break
+            retry_delay = None
+            async with llm_admission.slot(cost=0 if charged else 1):
+                charged = True
+                started = time.monotonic()
+                try:
+                    response = await asyncio.wait_for(call(model), timeout=ATTEMPT_TIMEOUT)
+                    chunks = response.__aiter__()
+                    first = await asyncio.wait_for(chunks.__anext__(), timeout=ATTEMPT_TIMEOUT)
+                except StopAsyncIteration:
+                    health.record_success(time.monotonic() - started, first_token=True)
+                    if on_model is not None:
+                        on_model(model)
+                    return
+                except asyncio.CancelledError:
+                    health.release_probe()
+                    raise
+                except Exception as e:
+                    if not is_transient(e):
+                        _settle(health, e)
+                        raise
+                    health.record_failure()
+                    last_error = e
+                    logger.warning(f"LLM stream from {model} failed (attempt {attempt + 1}/{RETRY_ATTEMPTS}): {e!r}")
+                    retry_delay = backoff_delay(attempt, e)
+                else:
+                    health.record_success(time.monotonic() - started, first_token=True)
+                    if model != models[0]:
+                        logger.info(f"LLM stream failed over from {models[0]} to {model}")
+                    if on_model is not None:
+                        on_model(model)
+                    yield first
+                    try:
+                        async for chunk in chunks:
+                            yield chunk
+                    except Exception as e:
+                        if is_transient(e):
+                            health.record_failure()
+                        raise
+                    return
+            # Outside the slot: don't hold capacity while backing off
+            if attempt + 1 >= RETRY_ATTEMPTS or retry_delay is None:
+                break
+            health.count('retries')
+            await asyncio.sleep(retry_delay)
+    if last_error is None:
+        raise _all_open(models)
+    raise last_error
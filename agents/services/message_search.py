@@ -0,0 +1,216 @@
+"""
+Full-text search over a user's conversation history.
+
+Backed by the index from migration ``0010_message_search``:
+
+- SQLite: FTS5 ``MATCH`` restricted to the user's ``owner`` token, ranked
+  by ``bm25()`` with ``snippet()`` highlights.
+- PostgreSQL: ``to_tsvector``/``websearch_to_tsquery`` over the GIN
+  expression index, ranked by ``ts_rank`` with ``ts_headline`` snippets.
+- Anything else (or SQLite without FTS5): ``icontains`` newest-first, so
+  the endpoint degrades instead of failing.
+"""
+from __future__ import annotations
+
+import html
+import logging
+import re
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from agents.models import Message, User
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+ELLIPSIS = "…"
+# Private-use characters the database wraps matches in; the snippet is
+# HTML-escaped and only then are these turned into <mark> tags
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+FTS5_SQL = f"""
+    SELECT m.id, s.session_id, m.role, m.created_at,
+           snippet(agents_message_fts, 0, %s, %s, %s, {SNIPPET_TOKENS}) AS snippet,
+           bm25(agents_message_fts, 1.0, 0.0) AS rank
+    FROM agents_message_fts
+    JOIN agents_message m ON m.id = agents_message_fts.rowid
+    JOIN agents_agentsession s ON s.id = m.session_id
+    WHERE agents_message_fts MATCH %s AND s.user_id = %s {{session_filter}}
+    ORDER BY rank
+    LIMIT %s OFFSET %s
+"""
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    """Escape message text for HTML, keeping only the match highlights as markup."""
+    return html.escape(snippet or '').replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+def _fts5_query(text: str, user_id: int) -> Optional[str]:
+    """
+    Build a MATCH expression from free text: every word must appear (the
+    last one as a prefix, for search-as-you-type), scoped to the owner.
+    Words are quoted, so FTS5 operators in user input are inert.
+    """
+    terms = _TERM_RE.findall(text)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'owner:u{user_id} AND content:({" ".join(quoted)})'
+
+
+def _as_aware(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def _search_fts5(user, text, session_id, limit, offset) -> List[Dict[str, Any]]:
+    match = _fts5_query(text, user.pk)
+    if match is None:
+        return []
+    params: List[Any] = [MATCH_START, MATCH_END, ELLIPSIS, match, user.pk]
+    session_filter = ""
+    if session_id:
+        session_filter = "AND s.session_id = %s"
+        params.append(session_id)
+    params += [limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(FTS5_SQL.format(session_filter=session_filter), params)
+        rows = cursor.fetchall()
+
+    results = []
+    for message_id, sid, role, created_at, snippet, rank in rows:
+        results.append({
+            'message_id': message_id,
+            'session_id': sid,
+            'role': role,
+            # Raw SQL: SQLite hands back the stored UTC text
+            'created_at': _as_aware(created_at),
+            'snippet': _highlight(snippet),
+            # bm25() is lower-is-better; flip so callers can sort descending
+            'rank': -rank,
+        })
+    return results
+
+
+def _search_postgres(user, text, session_id, limit, offset) -> List[Dict[str, Any]]:
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+    query = SearchQuery(text, config='english', search_type='websearch')
+    vector = SearchVector('content', config='english')
+    queryset = (
+        Message.objects.filter(session__user=user)
+        .annotate(search=vector)
+        .filter(search=query)
+        .annotate(
+            rank=SearchRank(vector, query),
+            snippet=SearchHeadline(
+                'content', query, config='english',
+                start_sel=MATCH_START, stop_sel=MATCH_END,
+                max_words=SNIPPET_TOKENS, min_words=SNIPPET_TOKENS // 2,
+                fragment_delimiter=ELLIPSIS,
+            ),
+        )
+    )
+    if session_id:
+        queryset = queryset.filter(session__session_id=session_id)
+    rows = queryset.order_by('-rank', '-created_at').values(
+        'id', 'session__session_id', 'role', 'created_at', 'snippet', 'rank'
+    )[offset:offset + limit]
+    return [
+        {
+            'message_id': row['id'],
+            'session_id': row['session__session_id'],
+            'role': row['role'],
+            'created_at': row['created_at'],
+            'snippet': _highlight(row['snippet']),
+            'rank': row['rank'],
+        }
+        for row in rows
+    ]
+
+
+def _search_like(user, text, session_id, limit, offset) -> List[Dict[str, Any]]:
+    terms = _TERM_RE.findall(text)
+    queryset = Message.objects.filter(session__user=user)
+    for term in terms:
+        queryset = queryset.filter(content__icontains=term)
+    matches = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+    def snippet(content):
+        return _highlight(matches.sub(lambda m: f"{MATCH_START}{m.group(0)}{MATCH_END}", content[:200]))
+
+    if session_id:
+        queryset = queryset.filter(session__session_id=session_id)
+    rows = queryset.order_by('-created_at', '-id').values(
+        'id', 'session__session_id', 'role', 'created_at', 'content'
+    )[offset:offset + limit]
+    return [
+        {
+            'message_id': row['id'],
+            'session_id': row['session__session_id'],
+            'role': row['role'],
+            'created_at': row['created_at'],
+            'snippet': snippet(row['content']),
+            'rank': None,
+        }
+        for row in rows
+    ]
+
+
+def search_messages(
+    user: User,
+    text: str,
+    *,
+    limit: int = 20,
+    offset: int = 0,
+    session_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Search *user*'s messages for *text*, best matches first.
+
+    Fetches ``limit + 1`` rows to report ``has_more`` without a COUNT.
+
+    Returns ``{"results": [...], "has_more": bool, "backend": str}`` where each
+    result has ``message_id``, ``session_id``, ``role``, ``created_at``,
+    ``snippet`` (HTML-escaped text, matches wrapped in ``<mark>``) and ``rank``.
+    """
+    text = (text or '').strip()
+    if not _TERM_RE.search(text):
+        return {'results': [], 'has_more': False, 'backend': None}
+
+    args = (user, text, session_id, limit + 1, offset)
+    backend = connection.vendor
+    results = None
+    if backend == 'sqlite':
+        try:
+            results = _search_fts5(*args)
+            backend = 'fts5'
+        except DatabaseError as exc:
+            # No FTS5 table (SQLite built without it): degrade to LIKE
+            logger.warning(f"FTS5 search unavailable, falling back to LIKE: {exc}")
+    elif backend == 'postgresql':
+        results = _search_postgres(*args)
+    if results is None:
+        results = _search_like(*args)
+        backend = 'like'
+
+    return {
+        'results': results[:limit],
+        'has_more': len(results) > limit,
+        'backend': backend,
+    }
@@ -0,0 +1,98 @@
+"""
+Single write path for conversation messages.
+
+``AgentSession`` carries denormalized ``message_count``, ``last_message_at``
+and ``last_agent_type`` so the session sidebar never has to aggregate over
+``Message``.  Every message the system writes should go through
+:func:`record_message`, which inserts the row and bumps the counters in the
+same transaction using F-expressions (no read-modify-write race between
+concurrent chats on the same session).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Optional
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
+
+from agents.models import AgentSession, Message
+
+logger = logging.getLogger(__name__)
+
+
+def record_message(
+    session: AgentSession,
+    role: str,
+    content: str,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> Message:
+    """Create a Message and atomically update the session's activity counters."""
+    with transaction.atomic():
+        message = Message.objects.create(
+            session=session,
+            role=role,
+            content=content,
+            metadata=metadata,
+        )
+
+        updates = {
+            'message_count': F('message_count') + 1,
+            'last_message_at': message.created_at,
+            # .update() bypasses auto_now, so bump the sidebar ordering key here
+            'updated_at': message.created_at,
+        }
+        agent_type = (metadata or {}).get('agent_type')
+        if role == 'agent' and agent_type:
+            updates['last_agent_type'] = agent_type
+
+        AgentSession.objects.filter(pk=session.pk).update(**updates)
+
+    return message
+
+
+def reset_session_counters(session: AgentSession) -> None:
+    """Zero the counters after a session's messages have been cleared."""
+    AgentSession.objects.filter(pk=session.pk).update(
+        message_count=0, last_message_at=None, last_agent_type=''
+    )
+
+
+def backfill_session_counters(queryset=None, batch_size: int = 500) -> int:
+    """
+    Recompute counters from ``Message`` for every session in *queryset*.
+
+    Runs one ``UPDATE ... SET col = (subquery)`` per batch of session ids so
+    a large table is never locked for the whole pass.  Returns the number
+    of sessions updated.
+    """
+    queryset = queryset if queryset is not None else AgentSession.objects.all()
+    messages = Message.objects.filter(session=OuterRef('pk')).order_by()
+
+    count_sq = Subquery(
+        messages.values('session').annotate(n=Count('id')).values('n')[:1]
+    )
+    last_at_sq = Subquery(
+        messages.values('session').annotate(last=Max('created_at')).values('last')[:1]
+    )
+    last_agent_sq = Subquery(
+        messages.filter(role='agent', metadata__has_key='agent_type')
+        .order_by('-created_at', '-id')
+        .annotate(agent_type=KT('metadata__agent_type'))
+        .values('agent_type')[:1]
+    )
+
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    updated = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        updated += AgentSession.objects.filter(pk__in=batch).update(
+            message_count=Coalesce(count_sq, 0),
+            last_message_at=last_at_sq,
+            last_agent_type=Coalesce(last_agent_sq, Value('')),
+        )
+        logger.info("Backfilled session counters for %d/%d sessions", updated, len(ids))
+
+    return updated
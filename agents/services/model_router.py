@@ -0,0 +1,189 @@
+"""
+Per-request model routing across ``GroqAgentRunner.AVAILABLE_MODELS``.
+
+Agents default to the 70B model, which is wasted on "thanks!" and slow for
+simple questions.  :func:`ModelRouter.route` picks a model for each turn:
+
+1. **Tier from the message.**  Small talk goes to the small tier; otherwise
+   a complexity score (length, planning vocabulary, several questions or
+   list items, action requests) picks small / medium / large.  Multi-agent
+   messages and low intent confidence (the classifier wasn't sure what the
+   user wants) always get the large tier.
+2. **Live health.**  Starting at that tier and only ever moving *up*, the
+   first model whose circuit is closed, whose recent error rate is below
+   ``LLM_ROUTER_MAX_ERROR_RATE`` and whose p95 latency (first token for
+   streams) is within ``LLM_ROUTER_LATENCY_SLO`` wins; if every candidate
+   is over the SLO, the fastest healthy one does.  With no healthy
+   candidate the tier's model is used and llm_resilience fails over.
+
+Decisions are counted and the most recent kept for ``/api/llm/status/``;
+latency histograms per model come from llm_resilience.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from . import llm_resilience
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = getattr(settings, 'LLM_ROUTER_ENABLED', True)
+LATENCY_SLO = float(getattr(settings, 'LLM_ROUTER_LATENCY_SLO', 8.0))
+MAX_ERROR_RATE = float(getattr(settings, 'LLM_ROUTER_MAX_ERROR_RATE', 0.5))
+
+# Model alias per tier, cheapest first
+TIERS = [
+    ('small', 'gemma2-9b'),
+    ('medium', 'mixtral-8x7b'),
+    ('large', 'llama-3.3-70b'),
+]
+
+# Complexity score cut-offs between tiers
+MEDIUM_COMPLEXITY = 0.2
+LARGE_COMPLEXITY = 0.55
+# Below this intent confidence the message goes to the large tier
+MIN_CONFIDENCE = 0.5
+# Live stats only count with this many samples
+MIN_SAMPLES = 10
+RECENT_DECISIONS = 50
+
+SMALL_TALK = re.compile(
+    r"^(hi|hii+|hey|hello|yo|sup|thanks?( you)?( so much)?|thx|ty|ok(ay)?|cool|nice|great|awesome|"
+    r"good (morning|afternoon|evening|night)|bye|goodbye|see you|how are you|how's it going|"
+    r"what's up|lol|haha|yes|no|sure|got it|sounds good|perfect)\b[\s!.?,:)]*\w{0,12}[\s!.?:)]*$",
+    re.IGNORECASE,
+)
+PLANNING_TERMS = re.compile(
+    r"\b(?:plan|schedule|week|weekly|month|routine|strategy|roadmap|step[- ]by[- ]step|breakdown|"
+    r"break down|compare|analy[sz]e|detailed|in depth|explain why|curriculum|program|budget|"
+    r"prepare for|exam|deadline|prioriti[sz]e)\b",
+    re.IGNORECASE,
+)
+ACTION_TERMS = re.compile(
+    r"\b(add|create|log|remind|save|track|set up|update|delete|mark)\b",
+    re.IGNORECASE,
+)
+
+
+def is_small_talk(message: str) -> bool:
+    text = message.strip()
+    return len(text) <= 40 and bool(SMALL_TALK.match(text))
+
+
+def score_complexity(message: str) -> float:
+    """0 (trivial) .. 1 (long, multi-part planning request)."""
+    text = message.strip()
+    words = len(text.split())
+    score = min(words / 80, 1.0) * 0.4
+    planning = {match.lower() for match in PLANNING_TERMS.findall(text)}
+    score += min(len(planning) * 0.3, 0.6)
+    if ACTION_TERMS.search(text):
+        score += 0.2  # action JSON needs at least the medium tier
+    parts = text.count('?') + len([line for line in text.splitlines() if line.strip()]) - 1
+    score += min(max(parts - 1, 0) * 0.1, 0.2)
+    return round(min(score, 1.0), 3)
+
+
+def _model_id(alias: str) -> str:
+    from .groq_agent_base import GroqAgentRunner
+    return GroqAgentRunner.AVAILABLE_MODELS[alias]
+
+
+class ModelRouter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model: Counter = Counter()
+        self._by_reason: Counter = Counter()
+        self._recent = deque(maxlen=RECENT_DECISIONS)
+
+    def _tier(self, message: str, intent_result: Dict[str, Any]) -> tuple:
+        """(tier index, complexity, reason)"""
+        complexity = score_complexity(message)
+        if is_small_talk(message):
+            return 0, complexity, 'small_talk'
+        if intent_result.get('is_multi_agent'):
+            return len(TIERS) - 1, complexity, 'multi_agent'
+        if intent_result.get('confidence', 0) < MIN_CONFIDENCE:
+            return len(TIERS) - 1, complexity, 'low_confidence'
+        if complexity >= LARGE_COMPLEXITY:
+            return len(TIERS) - 1, complexity, 'complex'
+        if complexity >= MEDIUM_COMPLEXITY:
+            return 1, complexity, 'moderate'
+        return 0, complexity, 'simple'
+
+    def _pick(self, tier: int, stream: bool) -> tuple:
+        """(alias, health note) for the first healthy model at or above *tier*."""
+        healthy: List[tuple] = []
+        for _, alias in TIERS[tier:]:
+            health = llm_resilience.model_health(_model_id(alias))
+            if health.is_open():
+                continue
+            error_rate = health.error_rate(min_samples=MIN_SAMPLES)
+            if error_rate is not None and error_rate > MAX_ERROR_RATE:
+                continue
+            p95 = health.p95(first_token=stream) if health.sample_count(first_token=stream) >= MIN_SAMPLES else None
+            if p95 is None or p95 <= LATENCY_SLO:
+                return alias, None if alias == TIERS[tier][1] else 'upgraded_for_health'
+            healthy.append((p95, alias))
+        if healthy:
+            return min(healthy)[1], 'fastest_over_slo'
+        return TIERS[tier][1], 'no_healthy_model'
+
+    def route(
+        self,
+        agent: str,
+        message: str,
+        intent_result: Optional[Dict[str, Any]] = None,
+        *,
+        default: Optional[str] = None,
+        stream: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Choose the model for one agent turn.
+
+        Returns ``{model, alias, tier, complexity, confidence, reason}``
+        where ``model`` is the API model id for ``run_agent(model=...)``.
+        With routing disabled, *default* (the runner's own model) is used.
+        """
+        intent_result = intent_result or {}
+        if not ROUTER_ENABLED:
+            decision = {'model': default, 'alias': None, 'tier': None, 'complexity': None,
+                        'confidence': intent_result.get('confidence'), 'reason': 'disabled'}
+        else:
+            tier, complexity, reason = self._tier(message, intent_result)
+            alias, health_note = self._pick(tier, stream)
+            decision = {
+                'model': _model_id(alias),
+                'alias': alias,
+                'tier': next(name for name, a in TIERS if a == alias),
+                'complexity': complexity,
+                'confidence': intent_result.get('confidence'),
+                'reason': f"{reason}+{health_note}" if health_note else reason,
+            }
+        with self._lock:
+            self._by_model[decision['model']] += 1
+            self._by_reason[decision['reason']] += 1
+            self._recent.append({'agent': agent, 'stream': stream, **decision})
+        logger.debug(f"Routed {agent} to {decision['model']} ({decision['reason']})")
+        return decision
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Decision counts by model and reason, plus the most recent decisions."""
+        with self._lock:
+            return {
+                'enabled': ROUTER_ENABLED,
+                'by_model': dict(self._by_model),
+                'by_reason': dict(self._by_reason),
+                'recent': list(self._recent),
+            }
+
+
+# Singleton instance
+model_router = ModelRouter()
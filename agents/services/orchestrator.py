@@ -6,7 +6,7 @@ Sprint 2: Integrated ActionApplier for structured action execution
 with durable contracts and idempotency.
 """
 from typing import Dict, Any, Optional, List
-from agents.models import AgentSession, Message, User, UserProfile
+from agents.models import AgentSession, User, UserProfile
 
 # Import Groq-based agents
 from .study_agent import study_agent_runner
@@ -14,12 +14,30 @@ from .productivity_agent import productivity_agent_runner
 from .wellness_agent import wellness_agent_runner
 from .meal_planner_agent import meal_planner_agent_runner
 from .habit_coach_agent import habit_coach_runner
+from .knowledge_agent import knowledge_agent_runner
 
 from .event_bus import event_bus, audit_logger
 from .intent_classifier import intent_classifier
 from .context_manager import ContextManager
 from .action_applier import action_applier
+from .user_time import DEFAULT_TIMEZONE
+from .message_store import record_message
+from .llm_admission import LLMSaturated, bind_user
+from .session_artifacts import summarize_session_artifacts
+from .knowledge_index import retrieve_for_prompt
+from .model_router import model_router
+from .token_budget import token_budget
+from .single_flight import flight_key, single_flight
+from .fan_out import (
+    agent_label,
+    merge_responses,
+    run_fan_out,
+    select_agents,
+    stream_fan_out,
+    summarize_results,
+)
 from asgiref.sync import sync_to_async
+import asyncio
 import logging
 import uuid
 
@@ -41,12 +59,23 @@ class EnhancedOrchestrator:
             'wellness_agent': wellness_agent_runner,
             'meal_planner_agent': meal_planner_agent_runner,
             'habit_coach_agent': habit_coach_runner,
+            'knowledge_agent': knowledge_agent_runner,
         }
     
-    async def _get_user_context(self, user: User, agent_type: str = None) -> Dict[str, Any]:
+    async def _get_user_context(
+        self,
+        user: User,
+        agent_type: str = None,
+        session: Optional[AgentSession] = None,
+        query: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Load user profile and build agent-specific context.
         This is what makes agents actually personal.
+        
+        When a session is given, items already saved from it are included
+        so agents can answer "what did we save earlier?".  The knowledge
+        agent also gets the notes retrieved for *query* (knowledge_index).
         """
         try:
             profile = await sync_to_async(
@@ -54,31 +83,114 @@ class EnhancedOrchestrator:
             )()
             
             if profile:
-                return await sync_to_async(
+                context = await sync_to_async(
                     lambda: profile.get_agent_context(agent_type)
                 )()
+            else:
+                # No profile yet — return minimal context
+                context = {
+                    'name': await sync_to_async(user.get_full_name)(),
+                    'timezone': DEFAULT_TIMEZONE,
+                }
             
-            # No profile yet — return minimal context
-            return {
-                'name': await sync_to_async(user.get_full_name)(),
-                'timezone': 'Asia/Kolkata',
-            }
+            if session:
+                saved_items = await sync_to_async(summarize_session_artifacts)(session)
+                if saved_items:
+                    context['saved_items'] = saved_items
+            
+            if agent_type == 'knowledge_agent' and query and user.is_authenticated:
+                retrieved = await sync_to_async(retrieve_for_prompt)(
+                    user, query, session,
+                    # Most messages the runner can send as history (block-aligned window)
+                    history_window=knowledge_agent_runner.HISTORY_WINDOW + knowledge_agent_runner.HISTORY_STEP - 1,
+                )
+                if retrieved:
+                    context['retrieved_notes'] = retrieved
+            
+            return context
         except Exception as e:
             logger.warning(f"Failed to load user context: {e}")
             return {}
     
+    async def _get_fan_out_contexts(
+        self,
+        user: User,
+        agents: List[str],
+        session: AgentSession,
+        query: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        User context for every agent of a fan-out, each told which other
+        agents are answering the rest of the message.
+        """
+        contexts = await asyncio.gather(*(
+            self._get_user_context(user, agent, session, query=query) for agent in agents
+        ))
+        result = {}
+        for agent, context in zip(agents, contexts):
+            context = dict(context or {})
+            context['collaborating_agents'] = [agent_label(a) for a in agents if a != agent]
+            result[agent] = context
+        return result
+    
+    async def _apply_fan_out_actions(
+        self,
+        results: List[Dict[str, Any]],
+        session: AgentSession,
+        user: User
+    ) -> List[Dict[str, Any]]:
+        """Apply each agent's actions from its own section, one agent at a time."""
+        applied = []
+        for result in results:
+            if result['response']:
+                applied.extend(await action_applier.apply_actions(
+                    response_text=result['response'],
+                    session=session,
+                    user=user if user.is_authenticated else None,
+                ))
+        return applied
+    
     async def process_message(
         self,
         message: str,
         user: User,
         session: Optional[AgentSession] = None,
         force_agent: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Process a user message; an identical message already being processed
+        for the same session is joined instead of run again (single_flight).
+        """
+        flight, leader = single_flight.begin(flight_key('complete', user, session, message, force_agent))
+        if not leader:
+            logger.info(f"Joining in-flight turn {flight.key}")
+            result = await flight.wait()
+            return {**result, 'coalesced': True}
+        try:
+            result = await self._process_message(message, user, session, force_agent)
+        except BaseException as e:
+            single_flight.end(flight, error=e)
+            raise
+        single_flight.end(flight, result=result)
+        return result
+    
+    async def _process_message(
+        self,
+        message: str,
+        user: User,
+        session: Optional[AgentSession] = None,
+        force_agent: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Process a user message with full orchestration:
         INTENT_RECEIVED → AGENT_SELECTED → CONTEXT_FETCHED → 
         AGENT_RESPONSE → ACTIONS_APPLIED → AUDIT_LOGGED
+        
+        Raises LLMSaturated when admission control turns the LLM call away
+        (the API answers 429 + Retry-After).
         """
+        # Charge this turn's LLM calls to the user (llm_admission)
+        bind_user(user)
         try:
             # Create or get session
             if not session:
@@ -101,7 +213,7 @@ class EnhancedOrchestrator:
             )
             
             # Save user message
-            await sync_to_async(Message.objects.create)(
+            await sync_to_async(record_message)(
                 session=session,
                 role='user',
                 content=message
@@ -125,10 +237,13 @@ class EnhancedOrchestrator:
                 )
                 selected_agent = intent_result['primary_agent']
             
+            fan_out_agents = select_agents(intent_result, self.agents, forced=bool(force_agent))
+            
             agent_selected_event = await event_bus.publish(
                 'AGENT_SELECTED',
                 payload={
                     'selected_agent': selected_agent,
+                    'fan_out_agents': fan_out_agents,
                     'intent_classification': intent_result
                 },
                 session=session,
@@ -141,7 +256,7 @@ class EnhancedOrchestrator:
             full_context = await context_manager.build_full_context()
             
             # Get user-specific context for the selected agent
-            user_context = await self._get_user_context(user, selected_agent)
+            user_context = await self._get_user_context(user, selected_agent, session, query=message)
             
             context_event = await event_bus.publish(
                 'CONTEXT_FETCHED',
@@ -178,19 +293,43 @@ class EnhancedOrchestrator:
                     'intent_classification': intent_result
                 }
             
-            # Execute agent WITH user context injected
-            agent_runner = self.agents[selected_agent]
-            agent_response = await agent_runner.run_agent(
-                message, 
-                session_id=session.session_id,
-                user_context=user_context
-            )
+            # Execute agent(s) WITH user context injected
+            agent_results = None
+            routing = None
+            if len(fan_out_agents) > 1:
+                # Multi-agent intent: run every agent concurrently, merge sections
+                contexts = await self._get_fan_out_contexts(user, fan_out_agents, session, message)
+                agent_results = await run_fan_out(
+                    fan_out_agents, self.agents, message, session.session_id, contexts
+                )
+                if not any(r['success'] for r in agent_results):
+                    if all('retry_after' in r for r in agent_results):
+                        raise LLMSaturated('fan_out', min(r['retry_after'] for r in agent_results))
+                    raise RuntimeError("; ".join(r['error'] for r in agent_results))
+                agent_response = merge_responses(agent_results)
+            else:
+                agent_runner = self.agents[selected_agent]
+                routing = model_router.route(
+                    selected_agent, message, intent_result, default=agent_runner.model
+                )
+                budget = token_budget.plan(
+                    selected_agent, message, intent_result, cap=agent_runner.max_tokens
+                )
+                agent_response = await agent_runner.run_agent(
+                    message, 
+                    session_id=session.session_id,
+                    user_context=user_context,
+                    model=routing['model'],
+                    budget=budget
+                )
             
             response_event = await event_bus.publish(
                 'AGENT_RESPONSE',
                 payload={
                     'agent': selected_agent,
-                    'response_received': True
+                    'response_received': True,
+                    **({'agents': summarize_results(agent_results)} if agent_results else {}),
+                    **({'routing': routing, 'budget': budget} if routing else {})
                 },
                 session=session,
                 user=user if user.is_authenticated else None,
@@ -198,19 +337,27 @@ class EnhancedOrchestrator:
             )
             
             # Save agent message with agent type in metadata
-            await sync_to_async(Message.objects.create)(
+            metadata = {'agent_type': selected_agent}
+            if agent_results:
+                metadata['agents'] = [r['agent'] for r in agent_results if r['response']]
+            if routing:
+                metadata['model'] = routing['model']
+            await sync_to_async(record_message)(
                 session=session,
                 role='agent',
                 content=str(agent_response),
-                metadata={'agent_type': selected_agent}
+                metadata=metadata
             )
             
             # Step 5: ACTIONS_APPLIED — validate, dedup, execute
-            actions_applied = await action_applier.apply_actions(
-                response_text=str(agent_response),
-                session=session,
-                user=user if user.is_authenticated else None,
-            )
+            if agent_results:
+                actions_applied = await self._apply_fan_out_actions(agent_results, session, user)
+            else:
+                actions_applied = await action_applier.apply_actions(
+                    response_text=str(agent_response),
+                    session=session,
+                    user=user if user.is_authenticated else None,
+                )
             await event_bus.publish(
                 'ACTIONS_APPLIED',
                 payload={
@@ -230,7 +377,9 @@ class EnhancedOrchestrator:
                     'message_length': len(message),
                     'intent_confidence': intent_result.get('confidence', 0),
                     'has_user_context': bool(user_context),
-                    'actions_count': len(actions_applied)
+                    'actions_count': len(actions_applied),
+                    **({'agents': summarize_results(agent_results)} if agent_results else {}),
+                    **({'routing': routing, 'budget': budget} if routing else {})
                 },
                 user=user if user.is_authenticated else None,
                 event=response_event,
@@ -255,8 +404,12 @@ class EnhancedOrchestrator:
                 'session_id': session.session_id,
                 'context': full_context,
                 'actions_applied': actions_applied,
+                **({'agents': summarize_results(agent_results)} if agent_results else {}),
+                **({'model': routing['model']} if routing else {}),
             }
             
+        except LLMSaturated:
+            raise
         except Exception as e:
             logger.error(f"Orchestration error: {e}", exc_info=True)
             
@@ -284,11 +437,42 @@ class EnhancedOrchestrator:
         user: User,
         session: Optional[AgentSession] = None,
         force_agent: Optional[str] = None
+    ):
+        """
+        Stream agent responses in real-time.  A duplicate of a stream still
+        in flight (same session and message) replays the events so far and
+        then follows it live instead of starting a second generation.
+        
+        Events carry an ``id`` (``<stream_id>:<seq>``) a dropped client can
+        resume from (single_flight.lookup + Flight.follow).
+        """
+        flight, leader = single_flight.begin(
+            flight_key('stream', user, session, message, force_agent),
+            owner=user.pk, resumable=True
+        )
+        if not leader:
+            logger.info(f"Joining in-flight stream {flight.key}")
+            async for event in flight.follow():
+                yield event
+            return
+        try:
+            async for event in self._process_message_stream(message, user, session, force_agent):
+                yield flight.publish(event)
+        finally:
+            single_flight.end(flight)
+    
+    async def _process_message_stream(
+        self,
+        message: str,
+        user: User,
+        session: Optional[AgentSession] = None,
+        force_agent: Optional[str] = None
     ):
         """
         Stream agent responses in real-time.
         Now with user context injection.
         """
+        bind_user(user)
         try:
             # Create or get session
             if not session:
@@ -315,16 +499,27 @@ class EnhancedOrchestrator:
                 )
                 selected_agent = intent_result['primary_agent']
             
+            fan_out_agents = select_agents(intent_result, self.agents, forced=bool(force_agent))
+            
+            routing = None
+            if len(fan_out_agents) == 1 and selected_agent in self.agents:
+                routing = model_router.route(
+                    selected_agent, message, intent_result,
+                    default=self.agents[selected_agent].model, stream=True
+                )
+            
             # Yield agent info
             yield {
                 'type': 'agent_selected',
                 'agent': selected_agent,
                 'session_id': session.session_id,
-                'intent': intent_result
+                'intent': intent_result,
+                **({'agents': fan_out_agents} if len(fan_out_agents) > 1 else {}),
+                **({'model': routing['model']} if routing else {})
             }
             
             # Save user message
-            await sync_to_async(Message.objects.create)(
+            await sync_to_async(record_message)(
                 session=session,
                 role='user',
                 content=message
@@ -338,43 +533,77 @@ class EnhancedOrchestrator:
                 }
                 return
             
-            # Get user context for personalization
-            user_context = await self._get_user_context(user, selected_agent)
-            
-            # Stream agent response WITH user context
-            agent_runner = self.agents[selected_agent]
-            full_response = ""
-            
-            chunk_count = 0
-            async for chunk in agent_runner.run_agent_stream(
-                message, 
-                session_id=session.session_id,
-                user_context=user_context
-            ):
-                if chunk:
-                    chunk_count += 1
-                    full_response += chunk
+            agent_results = None
+            if len(fan_out_agents) > 1:
+                # Multi-agent intent: stream every agent concurrently, one section each
+                user_context = await self._get_fan_out_contexts(user, fan_out_agents, session, message)
+                async for event in stream_fan_out(
+                    fan_out_agents, self.agents, message, session.session_id, user_context
+                ):
+                    if event['type'] == 'fan_out_complete':
+                        agent_results = event['results']
+                    else:
+                        yield event
+                if not any(r['response'] for r in agent_results):
+                    if all('retry_after' in r for r in agent_results):
+                        raise LLMSaturated('fan_out', min(r['retry_after'] for r in agent_results))
                     yield {
-                        'type': 'chunk',
-                        'content': chunk
+                        'type': 'error',
+                        'error': "; ".join(r['error'] for r in agent_results if r['error'])
                     }
-            
-            logger.debug(f"Stream complete: agent={selected_agent} chunks={chunk_count} len={len(full_response)}")
+                    return
+                full_response = merge_responses(agent_results)
+            else:
+                # Get user context for personalization
+                user_context = await self._get_user_context(user, selected_agent, session, query=message)
+                
+                # Stream agent response WITH user context
+                agent_runner = self.agents[selected_agent]
+                budget = token_budget.plan(
+                    selected_agent, message, intent_result, cap=agent_runner.max_tokens
+                )
+                full_response = ""
+                
+                chunk_count = 0
+                async for chunk in agent_runner.run_agent_stream(
+                    message, 
+                    session_id=session.session_id,
+                    user_context=user_context,
+                    model=routing['model'],
+                    budget=budget
+                ):
+                    if chunk:
+                        chunk_count += 1
+                        full_response += chunk
+                        yield {
+                            'type': 'chunk',
+                            'content': chunk
+                        }
+                
+                logger.debug(f"Stream complete: agent={selected_agent} chunks={chunk_count} len={len(full_response)}")
             
             # Save agent message with agent type in metadata
-            await sync_to_async(Message.objects.create)(
+            metadata = {'agent_type': selected_agent}
+            if agent_results:
+                metadata['agents'] = [r['agent'] for r in agent_results if r['response']]
+            if routing:
+                metadata['model'] = routing['model']
+            await sync_to_async(record_message)(
                 session=session,
                 role='agent',
                 content=full_response,
-                metadata={'agent_type': selected_agent}
+                metadata=metadata
             )
             
             # Apply structured actions from the full response
-            actions_applied = await action_applier.apply_actions(
-                response_text=full_response,
-                session=session,
-                user=user if user.is_authenticated else None,
-            )
+            if agent_results:
+                actions_applied = await self._apply_fan_out_actions(agent_results, session, user)
+            else:
+                actions_applied = await action_applier.apply_actions(
+                    response_text=full_response,
+                    session=session,
+                    user=user if user.is_authenticated else None,
+                )
             if actions_applied:
                 yield {
                     'type': 'actions_applied',
@@ -390,11 +619,21 @@ class EnhancedOrchestrator:
                     'message_length': len(message),
                     'has_user_context': bool(user_context),
                     'actions_count': len(actions_applied),
+                    **({'agents': summarize_results(agent_results)} if agent_results else {}),
+                    **({'routing': routing, 'budget': budget} if routing else {}),
                 },
                 user=user if user.is_authenticated else None,
                 success=True
             )
             
+        except LLMSaturated as e:
+            logger.warning(f"Stream not admitted: {e}")
+            yield {
+                'type': 'error',
+                'error': str(e),
+                'code': 'saturated',
+                'retry_after': e.retry_after
+            }
         except Exception as e:
             logger.error(f"Streaming error: {e}", exc_info=True)
             yield {
@@ -442,7 +681,7 @@ class EnhancedOrchestrator:
     
     def get_all_agent_types(self) -> List[str]:
         """Return list of all planned agent types"""
-        return ['study_agent', 'productivity_agent', 'wellness_agent', 'meal_planner_agent', 'habit_coach_agent']
+        return ['study_agent', 'productivity_agent', 'wellness_agent', 'meal_planner_agent', 'habit_coach_agent', 'knowledge_agent']
 
 
 # Singleton instance
@@ -0,0 +1,117 @@
+"""
+Measurement of the cacheable prompt prefix per agent.
+
+Provider-side prompt caching (and any KV reuse on a local model) only pays
+off when consecutive requests start with byte-identical messages.
+``GroqAgentRunner._build_messages`` orders them from most to least stable:
+
+1. the agent's system instruction (identical for every user and turn);
+2. the user's profile (changes only when they edit it);
+3. conversation history, block-aligned so it only grows for
+   ``HISTORY_STEP`` turns before the window slides;
+4. per-turn context (saved items, collaborating agents, retrieved notes)
+   and the new message, last.
+
+:data:`prompt_prefixes` records, for every call, how much of the prompt is
+identical to the previous call in the same session (whole messages,
+compared by hash) and, when the provider reports it, how many prompt
+tokens were actually served from its cache.  ``/api/llm/status/`` and
+``manage.py prompt_prefixes`` report the numbers.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List
+
+# Sessions whose last prompt is remembered for comparison
+MAX_TRACKED_SESSIONS = 2000
+# Rough characters per token for reporting
+CHARS_PER_TOKEN = 4
+
+
+def _fingerprint(message: Dict[str, str]) -> tuple:
+    content = message.get('content') or ''
+    digest = hashlib.blake2b(f"{message['role']}\0{content}".encode(), digest_size=16).digest()
+    return digest, len(content)
+
+
+def shared_prefix_chars(previous: List[tuple], current: List[tuple]) -> int:
+    """Characters in the leading messages *previous* and *current* have in common."""
+    shared = 0
+    for (old, _), (new, length) in zip(previous, current):
+        if old != new:
+            break
+        shared += length
+    return shared
+
+
+class PrefixStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: OrderedDict = OrderedDict()  # (agent, session) -> fingerprints
+        self._agents: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            'calls': 0,
+            'prompt_chars': 0,
+            'shared_chars': 0,
+            'system_chars': 0,
+            'provider_prompt_tokens': 0,
+            'provider_cached_tokens': 0,
+        })
+
+    def observe(self, agent: str, session_id: str, messages: List[Dict[str, str]], prefix_length: int = 1) -> int:
+        """
+        Record one prompt whose first *prefix_length* messages are the static
+        prefix; returns characters shared with the session's previous prompt.
+        """
+        fingerprints = [_fingerprint(m) for m in messages]
+        system_chars = sum(length for _, length in fingerprints[:prefix_length])
+        key = (agent, session_id)
+        with self._lock:
+            previous = self._last.pop(key, None)
+            self._last[key] = fingerprints
+            if len(self._last) > MAX_TRACKED_SESSIONS:
+                self._last.popitem(last=False)
+            shared = shared_prefix_chars(previous, fingerprints) if previous else 0
+            stats = self._agents[agent]
+            stats['calls'] += 1
+            stats['prompt_chars'] += sum(length for _, length in fingerprints)
+            stats['shared_chars'] += shared
+            stats['system_chars'] = system_chars
+        return shared
+
+    def record_usage(self, agent: str, usage: Any) -> None:
+        """Provider-reported prompt tokens and, if available, cached prompt tokens."""
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', None) if details is not None else None
+        with self._lock:
+            stats = self._agents[agent]
+            stats['provider_prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+            stats['provider_cached_tokens'] += cached or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per agent: static prefix size, mean prompt size and share reusable from the previous turn."""
+        with self._lock:
+            agents = {agent: dict(stats) for agent, stats in self._agents.items()}
+        report = {}
+        for agent, stats in sorted(agents.items()):
+            calls = stats['calls'] or 1
+            report[agent] = {
+                'calls': stats['calls'],
+                'system_prefix_tokens': stats['system_chars'] // CHARS_PER_TOKEN,
+                'mean_prompt_tokens': stats['prompt_chars'] // calls // CHARS_PER_TOKEN,
+                'mean_shared_prefix_tokens': stats['shared_chars'] // calls // CHARS_PER_TOKEN,
+                'shared_prefix_ratio': round(stats['shared_chars'] / stats['prompt_chars'], 3)
+                if stats['prompt_chars'] else None,
+                'provider_cached_ratio': round(stats['provider_cached_tokens'] / stats['provider_prompt_tokens'], 3)
+                if stats['provider_prompt_tokens'] else None,
+            }
+        return report
+
+
+# Singleton instance
+prompt_prefixes = PrefixStats()
@@ -0,0 +1,209 @@
+"""
+Retention for the append-only ``Event`` and ``AuditLog`` tables.
+
+Every chat turn writes several event and audit rows, and failed turns keep
+full error payloads in ``AuditLog.details``.  :func:`run_retention` moves
+rows older than the configured age into gzip-compressed JSONL archives,
+deletes them from the live table in small chunks (short write transactions,
+so chat requests are never blocked for long), then gives the freed pages
+back with an incremental vacuum or ``VACUUM``.
+
+Archives are one JSON object per line with the row's column values
+(``session_id``, ``user_id``… rather than nested objects), written to
+``settings.ARCHIVE_DIR``.  A chunk is deleted only after it has been flushed
+to the archive, so an interrupted run may repeat rows in the next archive
+but never loses any.
+
+Scheduler-friendly: idempotent, bounded per chunk, and returns a plain
+dict summary.  Run it from cron via ``manage.py prune_event_logs``.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+
+from agents.models import AuditLog, Event
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = getattr(settings, "ARCHIVE_DIR", settings.BASE_DIR / "archives")
+EVENT_RETENTION_DAYS = int(getattr(settings, "EVENT_RETENTION_DAYS", 90))
+AUDIT_LOG_RETENTION_DAYS = int(getattr(settings, "AUDIT_LOG_RETENTION_DAYS", 180))
+CHUNK_SIZE = 1000
+
+# In "auto" mode a full VACUUM only runs when at least this share of the
+# file is free pages; it rewrites the whole database.
+VACUUM_MIN_FREE_RATIO = 0.2
+INCREMENTAL_VACUUM_PAGES = 2000
+
+VACUUM_MODES = ("auto", "incremental", "full", "none")
+
+
+def _archive_path(model, cutoff, archive_dir: Path) -> Path:
+    stamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+    return archive_dir / f"{model._meta.db_table}_before_{cutoff:%Y%m%d}_{stamp}.jsonl.gz"
+
+
+def archive_and_delete(
+    model,
+    cutoff,
+    *,
+    chunk_size: int = CHUNK_SIZE,
+    archive_dir: Optional[Path] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Archive and delete rows of *model* whose ``timestamp`` is before *cutoff*.
+
+    Walks the matching rows in primary-key order, ``chunk_size`` at a time.
+    Returns ``{"model", "cutoff", "matched", "archived", "deleted", "archive_path"}``.
+    """
+    expired = model.objects.filter(timestamp__lt=cutoff).order_by("pk")
+    result = {
+        "model": model.__name__,
+        "cutoff": cutoff.isoformat(),
+        "matched": expired.count(),
+        "archived": 0,
+        "deleted": 0,
+        "archive_path": None,
+    }
+    if dry_run or not result["matched"]:
+        return result
+
+    archive_dir = Path(archive_dir or ARCHIVE_DIR)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    final_path = _archive_path(model, cutoff, archive_dir)
+    partial_path = final_path.with_name(final_path.name + ".partial")
+    columns = [field.attname for field in model._meta.concrete_fields]
+
+    last_pk = 0
+    with open(partial_path, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as archive:
+        while True:
+            rows = list(expired.filter(pk__gt=last_pk).values(*columns)[:chunk_size])
+            if not rows:
+                break
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+                archive.write("\n")
+            archive.flush()
+            os.fsync(raw.fileno())
+            result["archived"] += len(rows)
+
+            ids = [row["id"] for row in rows]
+            with transaction.atomic():
+                _, per_model = model.objects.filter(pk__in=ids).delete()
+            result["deleted"] += per_model.get(model._meta.label, 0)
+            last_pk = ids[-1]
+            logger.info(
+                "Retention: %s archived %d/%d rows", model.__name__, result["archived"], result["matched"]
+            )
+
+    partial_path.rename(final_path)
+    result["archive_path"] = str(final_path)
+    return result
+
+
+def _compact_sqlite(cursor, mode: str = "auto") -> Dict[str, Any]:
+    """Reclaim free pages on a SQLite cursor (Django or raw ``sqlite3``)."""
+    def pragma(name):
+        cursor.execute(f"PRAGMA {name};")
+        return cursor.fetchone()[0]
+
+    before = {"page_count": pragma("page_count"), "freelist_count": pragma("freelist_count")}
+    auto_vacuum = pragma("auto_vacuum")  # 0 none, 1 full, 2 incremental
+
+    action = "none"
+    if mode == "full":
+        action = "vacuum"
+    elif mode in ("auto", "incremental") and auto_vacuum == 2:
+        action = "incremental_vacuum"
+    elif mode == "auto" and before["page_count"]:
+        if before["freelist_count"] / before["page_count"] >= VACUUM_MIN_FREE_RATIO:
+            action = "vacuum"
+
+    if action == "vacuum":
+        cursor.execute("VACUUM;")
+    elif action == "incremental_vacuum":
+        # sqlite3's execute() steps the statement once, freeing a single
+        # page; executescript() runs it to completion.
+        cursor.executescript(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES});")
+    cursor.execute("PRAGMA optimize;")
+
+    return {
+        "action": action,
+        "before": before,
+        "after": {"page_count": pragma("page_count"), "freelist_count": pragma("freelist_count")},
+    }
+
+
+def compact_database(mode: str = "auto", using: str = "default") -> Dict[str, Any]:
+    """
+    Give space freed by retention back to the OS / planner.
+
+    SQLite: ``incremental_vacuum`` when the file uses ``auto_vacuum=INCREMENTAL``,
+    otherwise ``VACUUM`` ("full", or "auto" once enough pages are free).
+    PostgreSQL: ``VACUUM (ANALYZE)`` on the pruned tables.
+    """
+    if mode not in VACUUM_MODES:
+        raise ValueError(f"Unknown vacuum mode {mode!r}; expected one of {VACUUM_MODES}")
+    connection = connections[using]
+    if mode == "none":
+        return {"action": "none"}
+    if connection.in_atomic_block:
+        # VACUUM cannot run inside a transaction on either backend
+        return {"action": "skipped", "reason": "inside a transaction"}
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            return _compact_sqlite(cursor, mode)
+        if connection.vendor == "postgresql":
+            tables = [Event._meta.db_table, AuditLog._meta.db_table]
+            for table in tables:
+                cursor.execute(f"VACUUM (ANALYZE) {connection.ops.quote_name(table)};")
+            return {"action": "vacuum_analyze", "tables": tables}
+    return {"action": "skipped", "reason": f"unsupported backend {connection.vendor}"}
+
+
+def run_retention(
+    *,
+    event_days: Optional[int] = None,
+    audit_days: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    vacuum: str = "auto",
+    archive_dir: Optional[Path] = None,
+    dry_run: bool = False,
+    now=None,
+) -> Dict[str, Any]:
+    """
+    Archive and prune old audit logs and events, then compact.
+
+    Audit logs go first: they reference events, and deleting an event
+    would otherwise rewrite ``AuditLog.event_id`` on rows about to go too.
+    """
+    now = now or timezone.now()
+    event_days = EVENT_RETENTION_DAYS if event_days is None else event_days
+    audit_days = AUDIT_LOG_RETENTION_DAYS if audit_days is None else audit_days
+    options = {"chunk_size": chunk_size, "archive_dir": archive_dir, "dry_run": dry_run}
+
+    summary = {
+        "audit_logs": archive_and_delete(AuditLog, now - timedelta(days=audit_days), **options),
+        "events": archive_and_delete(Event, now - timedelta(days=event_days), **options),
+        "dry_run": dry_run,
+    }
+    deleted = summary["audit_logs"]["deleted"] + summary["events"]["deleted"]
+    # An explicit "full" always runs; otherwise only after something was freed
+    if not dry_run and (deleted or vacuum == "full"):
+        summary["compaction"] = compact_database(vacuum)
+    else:
+        summary["compaction"] = {"action": "none"}
+    return summary
@@ -0,0 +1,195 @@
+"""
+Everything that was saved from one agent session: meal plans, tasks,
+study sessions, wellness activities and habits.
+
+Used by the saved-items endpoint and by the orchestrator to remind agents
+what was already saved earlier in the conversation.
+
+Query budget: one query per artifact type for the rows.  Totals are taken
+from the evaluated rows whenever the page proves them (unpaginated, or the
+last page); only when some type has more rows than the page do we issue a
+single extra query that counts every truncated type at once.
+
+The agent-prompt summary runs on every chat turn, so it is cached per
+session (Django's cache, ``SESSION_ARTIFACTS_CACHE_TTL`` seconds) and
+dropped by ``agents.signals`` whenever one of the session's items is saved
+or deleted.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from agents.models import (
+    AgentSession,
+    Habit,
+    HabitLog,
+    MealPlan,
+    StudySession,
+    Task,
+    WellnessActivity,
+)
+from .user_time import user_local_today
+
+logger = logging.getLogger(__name__)
+
+# Response key -> model.  Order is the order types are reported in.
+ARTIFACT_MODELS = {
+    'meal_plans': MealPlan,
+    'tasks': Task,
+    'study_sessions': StudySession,
+    'wellness_activities': WellnessActivity,
+    'habits': Habit,
+}
+
+SUMMARY_CACHE_TTL = int(getattr(settings, 'SESSION_ARTIFACTS_CACHE_TTL', 300))
+
+
+def _base_queryset(artifact_type: str, session: AgentSession, with_habit_status: bool):
+    model = ARTIFACT_MODELS[artifact_type]
+    queryset = model.objects.filter(session=session)
+    if artifact_type == 'habits' and with_habit_status and session.user_id:
+        # HabitSerializer.completed_today reads this instead of querying per row
+        queryset = queryset.annotate(
+            completed_today_flag=Exists(
+                HabitLog.objects.filter(
+                    habit=OuterRef('pk'),
+                    date=user_local_today(session.user),
+                    completed=True,
+                )
+            )
+        )
+    return queryset.order_by('-created_at', '-id')
+
+
+def _count_types(session: AgentSession, artifact_types: Iterable[str]) -> Dict[str, int]:
+    """Count several artifact types for *session* in a single query."""
+    annotations = {}
+    for artifact_type in artifact_types:
+        model = ARTIFACT_MODELS[artifact_type]
+        annotations[artifact_type] = Coalesce(
+            Subquery(
+                model.objects.filter(session=OuterRef('pk'))
+                .order_by()
+                .values('session')
+                .annotate(n=Count('id'))
+                .values('n')[:1],
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+    if not annotations:
+        return {}
+    return AgentSession.objects.filter(pk=session.pk).values(**annotations).get()
+
+
+def get_session_artifacts(
+    session: AgentSession,
+    *,
+    types: Optional[Iterable[str]] = None,
+    limit: Optional[int] = None,
+    offsets: Optional[Dict[str, int]] = None,
+    with_habit_status: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch saved items for *session*, newest first.
+
+    Args:
+        types: Subset of ``ARTIFACT_MODELS`` keys (default: all).
+        limit: Page size per type; ``None`` returns everything.
+        offsets: Per-type offset, e.g. ``{'tasks': 20}``.
+        with_habit_status: Annotate habits with today's completion (for
+            HabitSerializer); needs ``session.user`` and its profile.
+
+    Returns:
+        ``{type: {"items": [model, ...], "total": int, "offset": int, "has_more": bool}}``
+    """
+    types = [t for t in (types or ARTIFACT_MODELS) if t in ARTIFACT_MODELS]
+    offsets = offsets or {}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    needs_count: List[str] = []
+
+    for artifact_type in types:
+        offset = max(int(offsets.get(artifact_type, 0)), 0)
+        queryset = _base_queryset(artifact_type, session, with_habit_status)
+
+        if limit is None:
+            items = list(queryset[offset:])
+            has_more = False
+        else:
+            items = list(queryset[offset:offset + limit + 1])
+            has_more = len(items) > limit
+            items = items[:limit]
+
+        page = {'items': items, 'offset': offset, 'has_more': has_more}
+        if has_more or (offset and not items):
+            # Total not provable from this page
+            needs_count.append(artifact_type)
+        else:
+            page['total'] = offset + len(items)
+        results[artifact_type] = page
+
+    for artifact_type, total in _count_types(session, needs_count).items():
+        results[artifact_type]['total'] = total
+
+    return results
+
+
+def _describe(artifact_type: str, obj) -> str:
+    if artifact_type == 'meal_plans':
+        return f"Meal plan: {obj.meal_name} ({obj.meal_type}, {obj.date})"
+    if artifact_type == 'tasks':
+        return f"Task: {obj.title} ({obj.priority}, {obj.status})"
+    if artifact_type == 'study_sessions':
+        topic = f" — {obj.topic}" if obj.topic else ""
+        return f"Study session: {obj.subject}{topic} ({obj.duration} min)"
+    if artifact_type == 'wellness_activities':
+        duration = f", {obj.duration} min" if obj.duration else ""
+        return f"Wellness activity: {obj.activity_type}{duration}"
+    if artifact_type == 'habits':
+        return f"Habit: {obj.name} ({obj.frequency})"
+    return str(obj)
+
+
+def _summary_key(session: AgentSession) -> str:
+    # session_id rather than pk: SQLite reuses the pk of a deleted last row
+    return f"session_artifacts:summary:{session.session_id}"
+
+
+def invalidate_artifact_summary(session: Optional[AgentSession]) -> None:
+    """Drop the cached summary of a session whose saved items changed."""
+    if session is not None:
+        cache.delete(_summary_key(session))
+
+
+def summarize_session_artifacts(session: AgentSession, per_type: int = 5) -> List[str]:
+    """
+    One line per recently saved item, for agent prompts ("what did we save
+    earlier?").  Bounded to *per_type* rows per type; cached until the
+    session's items change.
+    """
+    key = _summary_key(session)
+    cached = cache.get(key) or {}
+    if per_type in cached:
+        return list(cached[per_type])
+
+    try:
+        artifacts = get_session_artifacts(session, limit=per_type)
+    except Exception as e:
+        logger.warning(f"Failed to load saved items for {session.session_id}: {e}")
+        return []
+
+    lines = []
+    for artifact_type, page in artifacts.items():
+        lines.extend(_describe(artifact_type, obj) for obj in page['items'])
+        hidden = page['total'] - len(page['items'])
+        if hidden > 0:
+            lines.append(f"(+{hidden} more {artifact_type.replace('_', ' ')})")
+    cache.set(key, {**cached, per_type: lines}, SUMMARY_CACHE_TTL)
+    return lines
@@ -0,0 +1,241 @@
+"""
+Single-flight coalescing of identical chat turns, and resumable streams.
+
+Double-clicks, client retries and reconnecting SSE clients often send the
+same message to the same session while the first turn is still running.
+Each duplicate used to cost a full LLM call (and a second user/agent
+message pair in the history); ``ActionApplier`` only deduplicated the
+writes afterwards.
+
+The orchestrator now opens a :class:`Flight` per turn, keyed on (kind,
+session, message hash).  The first request leads and runs the turn; an
+identical request arriving while it is in flight joins it instead:
+
+- a completion joiner awaits the leader's result;
+- a stream joiner replays the events published so far and then follows
+  the leader live.
+
+Completions and streams are coalesced separately (a stream can't be
+rebuilt from a finished completion).
+
+**Resumable streams.**  Every stream event gets an id ``<stream_id>:<seq>``
+(the SSE ``id:`` field) and is kept in a per-stream ring buffer of
+``LLM_STREAM_BUFFER_EVENTS`` events.  Streams stay resumable while live
+and for ``LLM_STREAM_REPLAY_TTL`` seconds after they finish:
+:meth:`SingleFlight.lookup` finds one by id and :meth:`Flight.follow`
+replays everything after a ``Last-Event-ID`` and continues live.  When the
+events a client missed have already left the ring, it gets a ``resync``
+event carrying all text streamed before the ring's first event, which
+replaces what the client has.
+
+Flights are process-wide and thread safe: leaders, joiners and resumers
+run on different event loops (one per view call, streams on worker
+threads), so followers are woken with ``call_soon_threadsafe``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STREAM_BUFFER_EVENTS = int(getattr(settings, 'LLM_STREAM_BUFFER_EVENTS', 4096))
+STREAM_REPLAY_TTL = float(getattr(settings, 'LLM_STREAM_REPLAY_TTL', 300))
+# Finished streams kept for replay; the oldest go first
+MAX_RETAINED_STREAMS = 500
+
+
+def flight_key(kind: str, user, session, message: str, force_agent: Optional[str] = None) -> str:
+    """Turns of the same kind, for the same conversation and identical text, share a key."""
+    if session is not None:
+        conversation = f"session:{session.session_id}"
+    else:
+        # First message of a new conversation: the session is created by the leader
+        conversation = f"user:{getattr(user, 'pk', None)}"
+    digest = hashlib.sha256(f"{force_agent or ''}\0{message}".encode()).hexdigest()[:32]
+    return f"{kind}:{conversation}:{digest}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """``'<stream_id>:<seq>'`` -> ``(stream_id, seq)``, or None if malformed."""
+    stream_id, _, seq = (value or '').strip().rpartition(':')
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+def _wake(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Flight:
+    """One in-flight turn: its published events and, once finished, its outcome."""
+
+    def __init__(self, key: str, owner: Any = None, buffer_size: int = STREAM_BUFFER_EVENTS):
+        self.key = key
+        self.owner = owner
+        self.stream_id = uuid.uuid4().hex
+        self.events = deque(maxlen=max(1, buffer_size))  # (seq, event)
+        self.next_seq = 0
+        self.header: Optional[Dict[str, Any]] = None  # first event, kept after it leaves the ring
+        self.evicted_text = ''  # chunk text that has left the ring
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.joined = 0
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _notify(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # that follower's loop is gone
+
+    def publish(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Buffer *event* under the next sequence number; returns it with its ``id``."""
+        with self._lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            event = {**event, 'id': f"{self.stream_id}:{seq}"}
+            if len(self.events) == self.events.maxlen:
+                _, oldest = self.events[0]
+                if oldest.get('type') == 'chunk':
+                    self.evicted_text += oldest.get('content') or ''
+            self.events.append((seq, event))
+            if self.header is None:
+                self.header = event
+            self._notify()
+        return event
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self.result, self.error = result, error
+            self._notify()
+
+    def _since(self, after: int) -> List[Dict[str, Any]]:
+        """Events after sequence number *after* (lock held)."""
+        if not self.events or after + 1 >= self.events[0][0]:
+            return [event for seq, event in self.events if seq > after]
+        # Some of what the client missed has left the ring
+        first_seq = self.events[0][0]
+        replay = [self.header] if after < 0 and self.header is not None else []
+        replay.append({
+            'type': 'resync',
+            'content': self.evicted_text,
+            'id': f"{self.stream_id}:{first_seq - 1}",
+        })
+        replay.extend(event for _, event in self.events)
+        return replay
+
+    async def _changed(self, last: int) -> None:
+        """Return once an event after *last* exists or the flight is done."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.done or self.next_seq - 1 > last:
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        await future
+
+    async def wait(self) -> Any:
+        """The leader's result (or its exception)."""
+        while not self.done:
+            await self._changed(self.next_seq - 1)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def follow(self, after: int = -1) -> AsyncIterator[Dict[str, Any]]:
+        """Every event after sequence number *after* (all by default), then live until it finishes."""
+        last = after
+        while True:
+            with self._lock:
+                pending, done = self._since(last), self.done
+                if pending:
+                    last = self.next_seq - 1
+            for event in pending:
+                yield event
+            if done and not pending:
+                return
+            await self._changed(last)
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Flight] = {}
+        self._streams: Dict[str, Flight] = {}  # stream_id -> live or recently finished stream
+        self._stats: Counter = Counter()
+
+    def _prune(self, now: float) -> None:
+        finished = [f for f in self._streams.values() if f.done]
+        for flight in finished:
+            if now - flight.finished_at > STREAM_REPLAY_TTL:
+                del self._streams[flight.stream_id]
+        finished = sorted((f for f in finished if f.stream_id in self._streams), key=lambda f: f.finished_at)
+        for flight in finished[:max(0, len(finished) - MAX_RETAINED_STREAMS)]:
+            del self._streams[flight.stream_id]
+
+    def begin(self, key: str, owner: Any = None, resumable: bool = False) -> Tuple[Flight, bool]:
+        """``(flight, True)`` for the leader, ``(flight, False)`` for a joiner."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.done:
+                flight.joined += 1
+                self._stats['joined'] += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key, owner)
+            self._stats['led'] += 1
+            if resumable:
+                self._prune(time.monotonic())
+                self._streams[flight.stream_id] = flight
+            return flight, True
+
+    def end(self, flight: Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Finish *flight* and stop offering it to new duplicates (it stays resumable)."""
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(result, error)
+        if flight.joined:
+            logger.info(f"Coalesced {flight.joined} duplicate request(s) into {flight.key}")
+
+    def lookup(self, stream_id: str, owner: Any = None) -> Optional[Flight]:
+        """The live or recently finished stream *stream_id*, if it belongs to *owner*."""
+        with self._lock:
+            self._prune(time.monotonic())
+            flight = self._streams.get(stream_id)
+            if flight is None or flight.owner != owner:
+                return None
+            self._stats['resumed'] += 1
+            return flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'resumable_streams': len(self._streams),
+                'led': self._stats['led'],
+                'joined': self._stats['joined'],
+                'resumed': self._stats['resumed'],
+            }
+
+
+# Singleton instance
+single_flight = SingleFlight()
@@ -0,0 +1,81 @@
+"""
+Connection-init PRAGMAs for the SQLite backend.
+
+Every chat turn writes several rows (Message, Event, AuditLog, actions).
+With SQLite's defaults — rollback journal, ``synchronous=FULL`` and no busy
+timeout — readers block writers and concurrent requests fail with
+"database is locked".  ``settings.SQLITE_PRAGMAS`` (chosen per
+``DB_PROFILE``) is applied to each new connection via the
+``connection_created`` signal wired up in ``agents.signals``.
+
+``journal_mode`` is persistent in the database file; the others are
+per-connection and must be re-applied on every connect.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# busy_timeout first so the journal_mode switch can wait out a concurrent
+# writer; journal_mode before synchronous since NORMAL is only safe in WAL.
+PRAGMA_ORDER = (
+    'busy_timeout',
+    'journal_mode',
+    'synchronous',
+    'cache_size',
+    'temp_store',
+    'mmap_size',
+    'foreign_keys',
+    'wal_autocheckpoint',
+    'auto_vacuum',
+)
+
+
+def get_sqlite_pragmas() -> Dict[str, Any]:
+    return dict(getattr(settings, 'SQLITE_PRAGMAS', {}) or {})
+
+
+def _is_memory_database(connection) -> bool:
+    name = str(connection.settings_dict.get('NAME') or '')
+    return name == ':memory:' or 'mode=memory' in name
+
+
+def apply_sqlite_pragmas(cursor, pragmas: Mapping[str, Any], *, in_memory: bool = False) -> Dict[str, Any]:
+    """
+    Execute ``PRAGMA key=value`` for each entry of *pragmas* on *cursor*.
+
+    Works on a Django cursor or a raw ``sqlite3`` cursor.  Returns the value
+    SQLite reports back for each pragma (useful for logging/benchmarks).
+    """
+    applied = {}
+    ordered = sorted(
+        pragmas.items(),
+        key=lambda kv: PRAGMA_ORDER.index(kv[0]) if kv[0] in PRAGMA_ORDER else len(PRAGMA_ORDER),
+    )
+    for key, value in ordered:
+        if not key.isidentifier():
+            raise ValueError(f"Invalid PRAGMA name: {key!r}")
+        if key == 'journal_mode' and in_memory:
+            # In-memory databases only support MEMORY/OFF journals
+            continue
+        cursor.execute(f"PRAGMA {key}={value};")
+        row = cursor.fetchone()
+        applied[key] = row[0] if row else value
+    return applied
+
+
+def configure_sqlite_connection(sender, connection, **kwargs) -> Optional[Dict[str, Any]]:
+    """``connection_created`` receiver: apply SQLITE_PRAGMAS to new SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return None
+    pragmas = get_sqlite_pragmas()
+    if not pragmas:
+        return None
+    with connection.cursor() as cursor:
+        applied = apply_sqlite_pragmas(cursor, pragmas, in_memory=_is_memory_database(connection))
+    logger.debug("SQLite pragmas applied on %s: %s", connection.alias, applied)
+    return applied
@@ -0,0 +1,148 @@
+"""
+``max_tokens`` budgeting for agent calls.
+
+Runners used to ask for 8000 tokens on every call, so the provider reserved
+(and rate-limited us for) long generations even for "you're welcome!".
+:func:`TokenBudgeter.plan` sizes each call instead:
+
+- the **expected output type** comes from the message and intent: ``brief``
+  for small talk, ``structured`` when the reply will likely carry a plan or
+  action JSON block (planning/action vocabulary, multi-agent messages), and
+  ``chat`` otherwise;
+- each type has a base budget, used until ``MIN_SAMPLES`` replies of that
+  (agent, type) have been observed; after that the budget is the observed
+  p95 output length plus ``HEADROOM``, never below the type's floor nor
+  above the runner's own ``max_tokens``.
+
+A reply that still hits the limit (``finish_reason == 'length'``) is
+continued by the runner (up to ``LLM_MAX_CONTINUATIONS`` extra requests,
+each with double the budget), so a budget that is too tight costs latency,
+never a clipped action block.  Truncations are recorded with the full
+length, which raises the next budget.
+"""
+from __future__ import annotations
+
+import math
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .model_router import ACTION_TERMS, PLANNING_TERMS, is_small_talk
+
+BUDGET_ENABLED = getattr(settings, 'LLM_TOKEN_BUDGET_ENABLED', True)
+MAX_CONTINUATIONS = int(getattr(settings, 'LLM_MAX_CONTINUATIONS', 2))
+
+# Budget per output type until enough replies have been observed
+BASE_BUDGETS = {'brief': 256, 'chat': 1024, 'structured': 4096}
+# Observed budgets never go below these: a weekly plan must fit
+FLOORS = {'brief': 128, 'chat': 512, 'structured': 2048}
+HEADROOM = 1.25
+MIN_SAMPLES = 20
+LENGTH_SAMPLES = 200
+# Rough characters per token, for streams without a usage report
+CHARS_PER_TOKEN = 4
+
+CONTINUE_PROMPT = (
+    "Your previous reply was cut off by the length limit. Continue exactly where it "
+    "stopped: no repetition, no introduction."
+)
+CONTINUE_JSON_PROMPT = CONTINUE_PROMPT + (
+    " You stopped inside a ```json block: continue the JSON from the exact character "
+    "and close the block."
+)
+
+
+def expected_output(message: str, intent_result: Optional[Dict[str, Any]] = None) -> str:
+    """'brief' | 'chat' | 'structured'"""
+    if is_small_talk(message):
+        return 'brief'
+    if (intent_result or {}).get('is_multi_agent') or PLANNING_TERMS.search(message) or ACTION_TERMS.search(message):
+        return 'structured'
+    return 'chat'
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def continuation_messages(messages, partial: str):
+    """*messages* plus the truncated reply and a request to carry on."""
+    # An odd number of fences, the last one opening a json block
+    inside_json = partial.count('```') % 2 == 1 and partial.rfind('```') == partial.rfind('```json')
+    prompt = CONTINUE_JSON_PROMPT if inside_json else CONTINUE_PROMPT
+    return list(messages) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _percentile(ordered, q: float) -> int:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenBudgeter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lengths: Dict[tuple, deque] = {}
+        self._truncations: Counter = Counter()
+        self._continuations: Counter = Counter()
+
+    def plan(
+        self,
+        agent: str,
+        message: str,
+        intent_result: Optional[Dict[str, Any]] = None,
+        *,
+        cap: int = 8000,
+    ) -> Dict[str, Any]:
+        """
+        Budget for one call: ``{agent, output_type, max_tokens, source}``,
+        where source is 'base', 'observed' or 'disabled'.
+        """
+        output_type = expected_output(message, intent_result)
+        if not BUDGET_ENABLED:
+            return {'agent': agent, 'output_type': output_type, 'max_tokens': cap, 'source': 'disabled'}
+        budget, source = self._budget(agent, output_type, cap)
+        return {'agent': agent, 'output_type': output_type, 'max_tokens': budget, 'source': source}
+
+    def _budget(self, agent: str, output_type: str, cap: int) -> tuple:
+        with self._lock:
+            lengths = sorted(self._lengths.get((agent, output_type), ()))
+        if len(lengths) < MIN_SAMPLES:
+            return min(BASE_BUDGETS[output_type], cap), 'base'
+        # p95 plus headroom, rounded up to a multiple of 64
+        observed = math.ceil(_percentile(lengths, 0.95) * HEADROOM / 64) * 64
+        return min(cap, max(FLOORS[output_type], observed)), 'observed'
+
+    def record(self, budget: Dict[str, Any], tokens: int, *, continuations: int = 0) -> None:
+        """Observed reply length (all continuations included) for a planned call."""
+        key = (budget['agent'], budget['output_type'])
+        with self._lock:
+            self._lengths.setdefault(key, deque(maxlen=LENGTH_SAMPLES)).append(tokens)
+            if continuations:
+                self._truncations[key] += 1
+                self._continuations[key] += continuations
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per agent and output type: observed lengths, current budget, truncations."""
+        with self._lock:
+            items = {key: sorted(lengths) for key, lengths in self._lengths.items()}
+            truncations, continuations = dict(self._truncations), dict(self._continuations)
+        report: Dict[str, Any] = {'enabled': BUDGET_ENABLED, 'agents': {}}
+        for (agent, output_type), lengths in sorted(items.items()):
+            report['agents'].setdefault(agent, {})[output_type] = {
+                'samples': len(lengths),
+                'p50_tokens': _percentile(lengths, 0.5),
+                'p95_tokens': _percentile(lengths, 0.95),
+                'budget': self._budget(agent, output_type, 8000)[0],
+                'truncations': truncations.get((agent, output_type), 0),
+                'continuations': continuations.get((agent, output_type), 0),
+            }
+        return report
+
+
+# Singleton instance
+token_budget = TokenBudgeter()
@@ -0,0 +1,295 @@
+"""
+Per-user data export and import as (gzip-compressed) JSONL.
+
+Used for GDPR data requests and for moving one user between nodes, where
+whole-file backups (``db_backup``) are the wrong granularity.
+
+File layout, one JSON object per line:
+
+    {"type": "header", "format": "lifeos-user-export", "version": 1, "user": {...}, ...}
+    {"type": "sessions", "id": 12, "data": {"session_id": "...", "message_count": 4, ...}}
+    {"type": "messages", "id": 90, "data": {"session_id": 12, "role": "user", ...}}
+    ...
+
+Record types appear in ``EXPORT_MODELS`` order, so parents always precede
+their children.  ``data`` holds column values keyed by attname; foreign
+keys keep the exporting node's ids and are remapped on import.
+
+The exporter streams each queryset with ``.values().iterator(chunk_size=…)``
+(server-side cursors on PostgreSQL), so memory stays flat regardless of
+history size.  The importer buffers at most ``chunk_size`` rows per
+``bulk_create``.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from agents.models import (
+    AgentSession,
+    Habit,
+    HabitLog,
+    MealPlan,
+    Message,
+    StudySession,
+    Task,
+    User,
+    UserProfile,
+    WellnessActivity,
+)
+from .knowledge_index import rebuild_index
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "lifeos-user-export"
+EXPORT_VERSION = 1
+CHUNK_SIZE = 2000
+
+# Record type -> (model, lookup from the model to its owning user).
+# Parents before children: the importer relies on this order.
+EXPORT_MODELS = {
+    'profile': (UserProfile, 'user'),
+    'sessions': (AgentSession, 'user'),
+    'messages': (Message, 'session__user'),
+    'meal_plans': (MealPlan, 'user'),
+    'tasks': (Task, 'user'),
+    'study_sessions': (StudySession, 'user'),
+    'wellness_activities': (WellnessActivity, 'user'),
+    'habits': (Habit, 'user'),
+    'habit_logs': (HabitLog, 'habit__user'),
+}
+
+# Foreign keys to these models are remapped through the id map of their type
+REMAPPED_MODELS = {
+    AgentSession: 'sessions',
+    Habit: 'habits',
+}
+
+USER_FIELDS = ('email', 'first_name', 'last_name', 'date_joined')
+
+
+class _ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder truncates datetimes to milliseconds; keep them exact."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class ExportFormatError(ValueError):
+    """The file is not a LifeOS user export this version can read."""
+
+
+def _columns(model) -> List[str]:
+    return [f.attname for f in model._meta.concrete_fields if not f.primary_key]
+
+
+def _remapped_fields(model) -> Dict[str, str]:
+    """FK attname -> record type, for the foreign keys of *model* that need remapping."""
+    return {
+        f.attname: REMAPPED_MODELS[f.related_model]
+        for f in model._meta.concrete_fields
+        if f.is_relation and f.related_model in REMAPPED_MODELS
+    }
+
+
+def _open(path: str | Path, mode: str):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+
+def iter_user_records(user: User, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the header and then every record belonging to *user*."""
+    yield {
+        "type": "header",
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "exported_at": timezone.now().isoformat(),
+        "user": {name: getattr(user, name) for name in USER_FIELDS},
+    }
+    for record_type, (model, owner) in EXPORT_MODELS.items():
+        columns = _columns(model)
+        rows = (
+            model.objects.filter(**{owner: user})
+            .order_by('pk')
+            .values('pk', *columns)
+            .iterator(chunk_size=chunk_size)
+        )
+        for row in rows:
+            pk = row.pop('pk')
+            row.pop('user_id', None)  # reassigned on import
+            yield {"type": record_type, "id": pk, "data": row}
+
+
+def export_user_data(user: User, path: str | Path, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Write *user*'s data to *path* (gzip-compressed when it ends in ``.gz``).
+
+    Returns a count of records per type.
+    """
+    counts: Dict[str, int] = {}
+    with _open(path, "w") as out:
+        for record in iter_user_records(user, chunk_size=chunk_size):
+            out.write(json.dumps(record, cls=_ExportEncoder, ensure_ascii=False))
+            out.write("\n")
+            if record["type"] != "header":
+                counts[record["type"]] = counts.get(record["type"], 0) + 1
+    logger.info("Exported user %s to %s: %s", user.pk, path, counts)
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+
+def _timestamp_fields(model) -> List[str]:
+    """``auto_now`` / ``auto_now_add`` fields, which ``bulk_create`` stamps with "now"."""
+    return [
+        f.attname for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+
+
+class _Importer:
+
+    def __init__(self, user: User, chunk_size: int):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.id_maps: Dict[str, Dict[int, int]] = {record_type: {} for record_type in EXPORT_MODELS}
+        self.counts: Dict[str, int] = {}
+        self.buffer: List[Dict[str, Any]] = []
+        self.buffer_type: Optional[str] = None
+
+    def add(self, record: Dict[str, Any]) -> None:
+        record_type = record.get("type")
+        if record_type not in EXPORT_MODELS:
+            raise ExportFormatError(f"Unknown record type {record_type!r}")
+        if record_type != self.buffer_type or len(self.buffer) >= self.chunk_size:
+            self.flush()
+            self.buffer_type = record_type
+        self.buffer.append(record)
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        record_type, records = self.buffer_type, self.buffer
+        self.buffer = []
+        if record_type == 'profile':
+            self._import_profile(records[-1]["data"])
+        else:
+            self._bulk_create(record_type, records)
+        self.counts[record_type] = self.counts.get(record_type, 0) + len(records)
+
+    def _build(self, model, data: Dict[str, Any]):
+        columns = set(_columns(model))
+        values = {k: v for k, v in data.items() if k in columns}
+        for attname, record_type in _remapped_fields(model).items():
+            if values.get(attname) is not None:
+                # Dangling references (e.g. a deleted session) become NULL
+                values[attname] = self.id_maps[record_type].get(values[attname])
+        if 'user_id' in columns:
+            values['user_id'] = self.user.pk
+        return model(**values)
+
+    def _bulk_create(self, record_type: str, records: List[Dict[str, Any]]) -> None:
+        model = EXPORT_MODELS[record_type][0]
+        objs = [self._build(model, record["data"]) for record in records]
+        if record_type == 'sessions':
+            self._dedupe_session_ids(objs)
+        # bulk_create stamps auto_now(_add) fields with "now"; put the exported
+        # values back afterwards rather than touching the shared field flags
+        stamps = _timestamp_fields(model)
+        exported = [[getattr(obj, name) for name in stamps] for obj in objs]
+        created = model.objects.bulk_create(objs, batch_size=self.chunk_size)
+        if stamps:
+            for obj, values in zip(created, exported):
+                for name, value in zip(stamps, values):
+                    if value is not None:
+                        setattr(obj, name, value)
+            model.objects.bulk_update(created, stamps, batch_size=self.chunk_size)
+        id_map = self.id_maps[record_type]
+        for record, obj in zip(records, created):
+            id_map[record["id"]] = obj.pk
+
+    @staticmethod
+    def _dedupe_session_ids(sessions: List[AgentSession]) -> None:
+        """session_id is globally unique: re-key sessions that already exist here."""
+        taken = set(
+            AgentSession.objects.filter(session_id__in=[s.session_id for s in sessions])
+            .values_list('session_id', flat=True)
+        )
+        for session in sessions:
+            if session.session_id in taken:
+                session.session_id = str(uuid.uuid4())
+
+    def _import_profile(self, data: Dict[str, Any]) -> None:
+        columns = set(_columns(UserProfile)) - {'user_id', 'created_at', 'updated_at'}
+        UserProfile.objects.update_or_create(
+            user=self.user, defaults={k: v for k, v in data.items() if k in columns}
+        )
+
+
+def _read_header(line: str) -> Dict[str, Any]:
+    try:
+        header = json.loads(line)
+    except (TypeError, ValueError):
+        header = None
+    if not isinstance(header, dict) or header.get("format") != EXPORT_FORMAT:
+        raise ExportFormatError("Not a LifeOS user export")
+    if header.get("version") != EXPORT_VERSION:
+        raise ExportFormatError(f"Unsupported export version {header.get('version')!r}")
+    return header
+
+
+def import_user_data(
+    path: str | Path,
+    user: Optional[User] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Load an export into *user*, or into a new user created from the header.
+
+    Runs in one transaction: a bad file leaves nothing half-imported.  New
+    users get an unusable password (exports never carry credentials).
+
+    Returns ``{"user_id": int, "counts": {type: int}}``.
+    """
+    with _open(path, "r") as src, transaction.atomic():
+        header = _read_header(src.readline())
+        if user is None:
+            info = header["user"]
+            if User.objects.filter(email__iexact=info["email"]).exists():
+                raise ExportFormatError(f"User {info['email']} already exists; pass a target user")
+            user = User.objects.create_user(
+                email=info["email"], first_name=info.get("first_name", ""), last_name=info.get("last_name", ""),
+            )
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+
+        importer = _Importer(user, chunk_size)
+        for line in src:
+            if line.strip():
+                importer.add(json.loads(line))
+        importer.flush()
+        # bulk_create skips the signals that keep the retrieval index current
+        rebuild_index(user)
+
+    logger.info("Imported %s into user %s: %s", path, user.pk, importer.counts)
+    return {"user_id": user.pk, "counts": importer.counts}
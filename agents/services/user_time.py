@@ -0,0 +1,57 @@
+"""
+Per-user "local today" helpers.
+
+``TIME_ZONE`` is UTC on the server while ``UserProfile.timezone`` defaults
+to Asia/Kolkata, so ``date.today()`` puts late-evening (or early-morning)
+check-ins on the wrong calendar day.  Everything that reasons about a
+user's day — habit toggles, the daily digest, streaks — should resolve the
+date through this module instead.
+
+ZoneInfo objects are cached per name so repeated lookups are free.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Mirrors the UserProfile.timezone model default.
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+
+
+@lru_cache(maxsize=128)
+def get_zoneinfo(name: Optional[str]) -> ZoneInfo:
+    """Return a cached ZoneInfo for *name*, falling back to DEFAULT_TIMEZONE."""
+    if name:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning("Unknown timezone '%s' — falling back to %s", name, DEFAULT_TIMEZONE)
+    return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def get_user_timezone_name(user) -> str:
+    """Timezone name from the user's profile (DEFAULT_TIMEZONE if none)."""
+    profile = getattr(user, 'profile', None) if user is not None else None
+    return getattr(profile, 'timezone', None) or DEFAULT_TIMEZONE
+
+
+def get_user_zoneinfo(user) -> ZoneInfo:
+    """Cached ZoneInfo for the user's profile timezone."""
+    return get_zoneinfo(get_user_timezone_name(user))
+
+
+def user_local_now(user, now: Optional[datetime] = None) -> datetime:
+    """Current aware datetime expressed in the user's timezone."""
+    return (now or timezone.now()).astimezone(get_user_zoneinfo(user))
+
+
+def user_local_today(user, now: Optional[datetime] = None) -> date:
+    """The calendar date it currently is for *user*."""
+    return user_local_now(user, now).date()
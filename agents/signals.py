@@ -1,9 +1,19 @@
 """
-Signals for auto-creating related models on user creation.
+Signals for auto-creating related models on user creation,
+keeping the knowledge index and saved-items summaries in sync, and
+per-connection SQLite tuning.
 """
-from django.db.models.signals import post_save
+import logging
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import User, UserProfile
+from .models import Message, User, UserProfile
+from .services import knowledge_index
+from .services.session_artifacts import ARTIFACT_MODELS, invalidate_artifact_summary
+from .services.sqlite_tuning import configure_sqlite_connection
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=User)
@@ -18,3 +28,54 @@ def save_user_profile(sender, instance, **kwargs):
     """Ensure profile is saved when user is saved."""
     if hasattr(instance, 'profile'):
         instance.profile.save()
+
+
+def index_knowledge_source(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """Re-index a note, message or saved item; never fails the write itself."""
+    if raw:  # loaddata
+        return
+    try:
+        knowledge_index.index_instance(instance, created=created, update_fields=update_fields)
+    except Exception:
+        logger.exception(f"Knowledge indexing failed for {sender.__name__} {instance.pk}")
+
+
+def unindex_knowledge_source(sender, instance, **kwargs):
+    try:
+        knowledge_index.remove_instance(instance)
+    except Exception:
+        logger.exception(f"Knowledge unindexing failed for {sender.__name__} {instance.pk}")
+
+
+for _model in knowledge_index.SOURCE_TYPES:
+    post_save.connect(index_knowledge_source, sender=_model, dispatch_uid=f'agents.knowledge_index.{_model.__name__}')
+    # Message documents cascade with their session, and MessageViewSet
+    # unindexes single deletes; a delete receiver would turn every bulk
+    # message delete into a row-by-row one.
+    if _model is not Message:
+        post_delete.connect(
+            unindex_knowledge_source, sender=_model, dispatch_uid=f'agents.knowledge_unindex.{_model.__name__}'
+        )
+
+
+def forget_artifact_summary(sender, instance, raw=False, **kwargs):
+    """A saved item changed: its session's cached prompt summary is stale."""
+    if raw or instance.session_id is None:
+        return
+    try:
+        invalidate_artifact_summary(instance.session)
+    except Exception:
+        logger.exception(f"Saved-items summary invalidation failed for {sender.__name__} {instance.pk}")
+
+
+for _model in ARTIFACT_MODELS.values():
+    post_save.connect(
+        forget_artifact_summary, sender=_model, dispatch_uid=f'agents.session_artifacts.{_model.__name__}'
+    )
+    post_delete.connect(
+        forget_artifact_summary, sender=_model, dispatch_uid=f'agents.session_artifacts_delete.{_model.__name__}'
+    )
+
+
+# Apply SQLITE_PRAGMAS (WAL, busy_timeout, ...) to every new SQLite connection
+connection_created.connect(configure_sqlite_connection, dispatch_uid='agents.sqlite_pragmas')
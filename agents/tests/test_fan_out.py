@@ -0,0 +1,187 @@
+"""
+Multi-agent fan-out: concurrent execution, per-agent timeouts, sectioned
+streams, and the orchestrator recording one merged reply.
+"""
+import asyncio
+import time
+import uuid
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase
+
+from agents.models import AgentSession, Message, User
+from agents.services import fan_out
+from agents.services.fan_out import (
+    SECTION_SEPARATOR,
+    merge_responses,
+    run_fan_out,
+    select_agents,
+    stream_fan_out,
+)
+from agents.services.llm_admission import LLMSaturated
+from agents.services.orchestrator import orchestrator
+
+
+class FakeRunner:
+    """Stands in for GroqAgentRunner: answers after *delay* seconds, in *parts*."""
+
+    model = 'llama-3.3-70b-versatile'
+    max_tokens = 8000
+
+    def __init__(self, text, delay=0.0, parts=1, error=None):
+        self.text, self.delay, self.parts, self.error = text, delay, parts, error
+        self.contexts = []
+        self.models = []
+
+    async def run_agent(self, user_input, session_id="default", user_context=None, model=None, budget=None):
+        self.contexts.append(user_context)
+        self.models.append(model)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.text
+
+    async def run_agent_stream(self, user_input, session_id="default", user_context=None, model=None, budget=None):
+        self.contexts.append(user_context)
+        self.models.append(model)
+        size = max(1, len(self.text) // self.parts)
+        for start in range(0, len(self.text), size):
+            await asyncio.sleep(self.delay / self.parts)
+            yield self.text[start:start + size]
+        if self.error:
+            raise RuntimeError(self.error)
+
+
+def _collect(agen):
+    async def run():
+        return [event async for event in agen]
+    return asyncio.run(run())
+
+
+class FanOutTests(SimpleTestCase):
+
+    def test_select_agents(self):
+        intent = {
+            'primary_agent': 'study_agent',
+            'secondary_agents': ['meal_planner_agent', 'made_up_agent'],
+            'is_multi_agent': True,
+        }
+        available = {'study_agent': 1, 'meal_planner_agent': 1}
+        self.assertEqual(select_agents(intent, available), ['study_agent', 'meal_planner_agent'])
+        self.assertEqual(select_agents(intent, available, forced=True), ['study_agent'])
+        self.assertEqual(select_agents({**intent, 'is_multi_agent': False}, available), ['study_agent'])
+
+    def test_agents_run_concurrently(self):
+        runners = {'a': FakeRunner("A", delay=0.3), 'b': FakeRunner("B", delay=0.3)}
+        started = time.monotonic()
+        results = asyncio.run(run_fan_out(['a', 'b'], runners, "hi", "s", {}))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(merge_responses(results), "A" + SECTION_SEPARATOR + "B")
+
+    def test_timeout_and_failure_are_per_agent(self):
+        runners = {
+            'a': FakeRunner("A"),
+            'slow': FakeRunner("S", delay=1.0),
+            'bad': FakeRunner("X", error="boom"),
+        }
+        with mock.patch.dict(fan_out.AGENT_TIMEOUTS, {'slow': 0.1}):
+            results = asyncio.run(run_fan_out(['a', 'slow', 'bad'], runners, "hi", "s", {}))
+        by_agent = {r['agent']: r for r in results}
+        self.assertTrue(by_agent['a']['success'])
+        self.assertTrue(by_agent['slow']['timed_out'])
+        self.assertLess(by_agent['slow']['elapsed_ms'], 500)
+        self.assertEqual(by_agent['bad']['error'], "boom")
+        self.assertEqual(merge_responses(results), "A")
+
+    def test_stream_is_sectioned_and_matches_recorded_text(self):
+        runners = {
+            'primary': FakeRunner("primary answer", delay=0.3, parts=3),
+            'fast': FakeRunner("fast answer", delay=0.05, parts=2),
+            'bad': FakeRunner("", error="boom"),
+        }
+        events = _collect(stream_fan_out(['primary', 'fast', 'bad'], runners, "hi", "s", {}))
+
+        sections = [e['agent'] for e in events if e['type'] == 'section_start']
+        self.assertEqual(sections, ['fast', 'primary'])
+        streamed = ''.join(e['content'] for e in events if e['type'] == 'chunk')
+        self.assertEqual(streamed, "fast answer" + SECTION_SEPARATOR + "primary answer")
+
+        errors = [e for e in events if e['type'] == 'agent_error']
+        self.assertEqual([e['agent'] for e in errors], ['bad'])
+
+        results = events[-1]['results']
+        self.assertEqual(events[-1]['type'], 'fan_out_complete')
+        self.assertEqual(merge_responses(results), streamed)
+
+
+class OrchestratorFanOutTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="fanout@test.com", password="testpass123")
+        self.session = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+        self.runners = {
+            'study_agent': FakeRunner("## Study plan", delay=0.05),
+            'meal_planner_agent': FakeRunner("## Meals", delay=0.05),
+        }
+        intent = {
+            'primary_agent': 'study_agent',
+            'confidence': 0.8,
+            'secondary_agents': ['meal_planner_agent'],
+            'is_multi_agent': True,
+        }
+        patches = [
+            mock.patch.dict(orchestrator.agents, self.runners),
+            mock.patch(
+                'agents.services.orchestrator.intent_classifier.classify_intent',
+                mock.AsyncMock(return_value=intent),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_process_message_merges_agents(self):
+        result = async_to_sync(orchestrator.process_message)(
+            "Plan my exam week and the meals for it", self.user, session=self.session
+        )
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['response'], "## Study plan" + SECTION_SEPARATOR + "## Meals")
+        self.assertEqual([a['agent'] for a in result['agents']], ['study_agent', 'meal_planner_agent'])
+        # Each agent knows who else is answering
+        self.assertEqual(self.runners['study_agent'].contexts[0]['collaborating_agents'], ['meal planner'])
+
+        reply = Message.objects.filter(session=self.session, role='agent').get()
+        self.assertEqual(reply.metadata['agents'], ['study_agent', 'meal_planner_agent'])
+        self.assertEqual(reply.content, result['response'])
+
+    def test_stream_records_what_was_streamed(self):
+        async def run():
+            return [e async for e in orchestrator.process_message_stream(
+                "Plan my exam week and the meals for it", self.user, session=self.session
+            )]
+        events = async_to_sync(run)()
+        self.assertEqual(events[0]['agents'], ['study_agent', 'meal_planner_agent'])
+        streamed = ''.join(e['content'] for e in events if e['type'] == 'chunk')
+        reply = Message.objects.filter(session=self.session, role='agent').get()
+        self.assertEqual(reply.content, streamed)
+
+    def test_stream_reports_saturation_when_every_agent_is_turned_away(self):
+        async def turned_away(runner, *args, **kwargs):
+            # A different wait per agent: the stream reports the shortest
+            raise LLMSaturated('user_rate', float(len(runner.text)))
+            yield
+
+        async def run():
+            return [e async for e in orchestrator.process_message_stream(
+                "Plan my exam week and the meals for it", self.user, session=self.session
+            )]
+
+        with mock.patch.object(FakeRunner, 'run_agent_stream', turned_away):
+            events = async_to_sync(run)()
+        self.assertEqual(events[-1]['type'], 'error')
+        self.assertEqual(events[-1]['code'], 'saturated')
+        self.assertEqual(events[-1]['retry_after'], float(len("## Meals")))
+        self.assertFalse(Message.objects.filter(session=self.session, role='agent').exists())
@@ -0,0 +1,81 @@
+"""
+Habit day boundaries follow UserProfile.timezone, not the server clock.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from agents.models import Habit, HabitLog, User
+from agents.services.user_time import (
+    DEFAULT_TIMEZONE,
+    get_zoneinfo,
+    user_local_today,
+)
+
+# 20:00 UTC on 2026-03-01 is already 01:30 on 2026-03-02 in Asia/Kolkata
+LATE_UTC = datetime(2026, 3, 1, 20, 0, tzinfo=dt_timezone.utc)
+
+
+class ZoneInfoCacheTests(SimpleTestCase):
+
+    def test_zoneinfo_is_cached(self):
+        self.assertIs(get_zoneinfo('Europe/Berlin'), get_zoneinfo('Europe/Berlin'))
+
+    def test_unknown_zone_falls_back_to_default(self):
+        self.assertEqual(str(get_zoneinfo('Mars/Olympus_Mons')), DEFAULT_TIMEZONE)
+        self.assertEqual(str(get_zoneinfo(None)), DEFAULT_TIMEZONE)
+
+
+class UserLocalTodayTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="tz@test.com", password="testpass123")
+
+    def test_default_profile_timezone_rolls_over_before_utc(self):
+        self.assertEqual(user_local_today(self.user, now=LATE_UTC), date(2026, 3, 2))
+
+    def test_profile_timezone_is_respected(self):
+        self.user.profile.timezone = 'America/New_York'
+        self.user.profile.save()
+        self.assertEqual(user_local_today(self.user, now=LATE_UTC), date(2026, 3, 1))
+
+
+class HabitLocalDayEndpointTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="habit-tz@test.com", password="testpass123")
+        self.habit = Habit.objects.create(user=self.user, name="Read")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_toggle_today_logs_users_local_date(self):
+        with patch('django.utils.timezone.now', return_value=LATE_UTC):
+            response = self.client.post(f'/api/habits/{self.habit.id}/toggle_today/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['date'], '2026-03-02')
+        self.assertTrue(HabitLog.objects.filter(habit=self.habit, date=date(2026, 3, 2)).exists())
+
+    def test_daily_digest_uses_local_date(self):
+        HabitLog.objects.create(habit=self.habit, date=date(2026, 3, 2), completed=True, count=1)
+        with patch('django.utils.timezone.now', return_value=LATE_UTC):
+            response = self.client.get('/api/habits/daily_digest/')
+        self.assertEqual(response.data['date'], '2026-03-02')
+        self.assertEqual(response.data['completed'], 1)
+
+    def test_daily_digest_query_count_is_constant(self):
+        for i in range(5):
+            Habit.objects.create(user=self.user, name=f"Habit {i}")
+        with self.assertNumQueries(2):  # habits + today's logs
+            self.client.get('/api/habits/daily_digest/')
+
+    def test_streak_counts_back_from_local_today(self):
+        for day in (28, 1, 2):
+            month = 2 if day == 28 else 3
+            HabitLog.objects.create(habit=self.habit, date=date(2026, month, day), completed=True)
+        self.assertEqual(self.habit.calculate_streak(today=date(2026, 3, 2)), 3)
+        # Today not yet done does not break the streak
+        self.assertEqual(self.habit.calculate_streak(today=date(2026, 3, 3)), 3)
+        self.assertEqual(self.habit.calculate_streak(today=date(2026, 3, 4)), 0)
+        self.assertEqual(self.habit.best_streak, 3)
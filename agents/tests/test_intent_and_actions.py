@@ -19,6 +19,12 @@ class IntentClassifierTests(SimpleTestCase):
         self.assertEqual(result['primary_agent'], 'habit_coach_agent')
         self.assertGreaterEqual(result['confidence'], 0.35)
 
+    def test_keyword_classifies_knowledge_recall(self):
+        result = self.classifier._keyword_classification(
+            "What did I learn about photosynthesis? Check my notes"
+        )
+        self.assertEqual(result['primary_agent'], 'knowledge_agent')
+
     def test_unknown_primary_agent_falls_back(self):
         normalized = self.classifier._normalize_result({
             'primary_agent': 'unknown_agent',
@@ -0,0 +1,113 @@
+"""
+Knowledge agent retrieval: the BM25 index follows writes and its top hits
+reach the agent's prompt.
+"""
+import uuid
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from agents.models import AgentSession, KnowledgeDocument, StudySession, Task, User
+from agents.services.knowledge_agent import knowledge_agent_runner
+from agents.services.knowledge_index import retrieve_for_prompt, search, tokenize
+from agents.services.message_store import record_message
+from agents.services.orchestrator import orchestrator
+
+
+class KnowledgeIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="kb@test.com", password="testpass123")
+        cls.other = User.objects.create_user(email="kb-other@test.com", password="testpass123")
+        cls.session = AgentSession.objects.create(
+            user=cls.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+
+    def _study(self, user, subject, notes):
+        return StudySession.objects.create(user=user, subject=subject, duration=30, notes=notes)
+
+    def test_tokenize_folds_plurals_and_stopwords(self):
+        self.assertEqual(tokenize("The Chloroplasts and their studies"), ['chloroplast', 'study'])
+
+    def test_ranked_and_scoped_to_user(self):
+        best = self._study(self.user, "Biology", "Chloroplasts run photosynthesis; chloroplasts hold chlorophyll.")
+        self._study(self.user, "Biology", "Mitochondria, and a passing mention of a chloroplast.")
+        self._study(self.user, "Calculus", "Derivatives and limits.")
+        self._study(self.other, "Biology", "Chloroplasts chloroplasts chloroplasts.")
+
+        results = search(self.user, "chloroplasts")
+        self.assertEqual(len(results), 2)
+        self.assertEqual((results[0]['source_type'], results[0]['source_id']), ('study_session', best.pk))
+        self.assertTrue(results[0]['label'].startswith("Study session: Biology"))
+        self.assertIn("Chloroplasts", results[0]['snippet'])
+
+    def test_index_follows_edits_and_deletes(self):
+        task = Task.objects.create(user=self.user, title="Renew passport")
+        self.assertEqual(search(self.user, "passport")[0]['source_id'], task.pk)
+
+        task.title = "Book dentist"
+        task.save()
+        self.assertEqual(search(self.user, "passport"), [])
+        self.assertEqual(search(self.user, "dentist")[0]['source_id'], task.pk)
+
+        # Saves that touch no indexed field leave the postings alone
+        with self.assertNumQueries(1):
+            task.save(update_fields=['completed_at'])
+
+        task.delete()
+        self.assertFalse(KnowledgeDocument.objects.filter(source_type='task').exists())
+
+    def test_messages_indexed_and_forgotten_with_the_conversation(self):
+        old = record_message(self.session, 'user', "My favourite sorting algorithm is mergesort")
+        for i in range(3):
+            record_message(self.session, 'agent', f"filler reply {i}")
+
+        self.assertEqual(search(self.user, "mergesort")[0]['source_id'], old.pk)
+        # Already inside the history window: not sent twice
+        self.assertEqual(retrieve_for_prompt(self.user, "mergesort", self.session, history_window=5), [])
+        self.assertEqual(len(retrieve_for_prompt(self.user, "mergesort", self.session, history_window=2)), 1)
+
+        knowledge_agent_runner.clear_conversation(self.session.session_id)
+        self.assertEqual(search(self.user, "mergesort"), [])
+
+    def test_deleted_message_is_no_longer_retrieved(self):
+        message = record_message(self.session, 'user', "My locker combination is 4-8-15")
+        self.assertEqual(len(retrieve_for_prompt(self.user, "locker combination", None)), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.delete(f'/api/messages/{message.pk}/').status_code, 204)
+        self.assertEqual(retrieve_for_prompt(self.user, "locker combination", None), [])
+        self.assertFalse(KnowledgeDocument.objects.filter(source_type='message', source_id=message.pk).exists())
+
+    def test_rebuild_after_bulk_writes(self):
+        StudySession.objects.bulk_create([
+            StudySession(user=self.user, subject="History", duration=20, notes="Treaty of Westphalia"),
+        ])
+        self.assertEqual(search(self.user, "westphalia"), [])
+        call_command('rebuild_knowledge_index', '--user-id', str(self.user.pk), stdout=StringIO())
+        self.assertEqual(len(search(self.user, "westphalia")), 1)
+
+    def test_retrieved_notes_reach_the_knowledge_prompt(self):
+        self._study(self.user, "Chemistry", "Le Chatelier's principle: equilibrium shifts to oppose change.")
+
+        context = async_to_sync(orchestrator._get_user_context)(
+            self.user, 'knowledge_agent', self.session, query="explain equilibrium shifts"
+        )
+        self.assertEqual(len(context['retrieved_notes']), 1)
+        # Other agents don't pay for retrieval
+        context_other = async_to_sync(orchestrator._get_user_context)(
+            self.user, 'study_agent', self.session, query="explain equilibrium shifts"
+        )
+        self.assertNotIn('retrieved_notes', context_other)
+
+        messages = async_to_sync(knowledge_agent_runner._build_messages)(
+            "explain equilibrium shifts", self.session.session_id, context
+        )
+        notes = [m['content'] for m in messages if m['content'].startswith("RELEVANT NOTES")]
+        self.assertEqual(len(notes), 1)
+        self.assertIn("[1] Study session: Chemistry", notes[0])
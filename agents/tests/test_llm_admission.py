@@ -0,0 +1,143 @@
+"""
+LLM admission control: concurrency cap, fair queuing, token buckets and
+the API's fail-fast 429.
+"""
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from agents.models import User
+from agents.services.llm_admission import AdmissionController, LLMSaturated, bind_user
+
+
+def _controller(**overrides):
+    options = dict(
+        max_concurrency=1, max_queue=8, max_queue_per_user=4, max_queue_wait=2.0,
+        user_rate_per_minute=600, user_burst=10,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+class _User:
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class AdmissionControllerTests(SimpleTestCase):
+
+    def test_weighted_fair_queue_interleaves_users(self):
+        controller = _controller()
+        served = []
+
+        async def call(user, label):
+            bind_user(_User(user))
+            async with controller.slot():
+                served.append(label)
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            bind_user(_User(0))
+            await controller.acquire()  # occupy the only slot
+            tasks = [asyncio.create_task(call(1, f"a{i}")) for i in range(3)]
+            await asyncio.sleep(0.01)
+            tasks.append(asyncio.create_task(call(2, "b0")))
+            await asyncio.sleep(0.01)
+            self.assertEqual(controller.snapshot()['queue_depth'], 4)
+            controller.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(scenario())
+        # User 2's single call is not stuck behind user 1's backlog
+        self.assertEqual(served, ["a0", "b0", "a1", "a2"])
+        stats = controller.snapshot()
+        self.assertEqual(stats['admitted'], 5)
+        self.assertEqual(stats['max_queue_depth'], 4)
+        self.assertGreater(stats['wait_ms']['max'], 0)
+
+    def test_token_bucket_rejects_with_retry_after(self):
+        controller = _controller(max_concurrency=10, user_rate_per_minute=6, user_burst=2)
+
+        async def scenario():
+            bind_user(_User(1))
+            for _ in range(2):
+                async with controller.slot():
+                    pass
+            with self.assertRaises(LLMSaturated) as ctx:
+                await controller.acquire()
+            return ctx.exception
+
+        exc = asyncio.run(scenario())
+        self.assertEqual(exc.reason, 'user_rate')
+        self.assertGreaterEqual(exc.retry_after, 9)  # one token per 10 seconds
+        with self.assertRaises(LLMSaturated):
+            controller.precheck(_User(1))
+        controller.precheck(_User(2))  # other users unaffected
+
+    def test_full_queue_and_long_wait_fail_fast(self):
+        controller = _controller(max_queue_per_user=1, max_queue_wait=0.05)
+
+        async def scenario():
+            bind_user(_User(1))
+            await controller.acquire()
+            waiting = asyncio.create_task(controller.acquire())
+            await asyncio.sleep(0)
+            with self.assertRaises(LLMSaturated) as full:
+                await controller.acquire()
+            with self.assertRaises(LLMSaturated) as timed_out:
+                await waiting
+            return full.exception, timed_out.exception
+
+        full, timed_out = asyncio.run(scenario())
+        self.assertEqual((full.reason, timed_out.reason), ('queue_full', 'queue_timeout'))
+        stats = controller.snapshot()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['rejected'], {'queue_full': 1, 'queue_timeout': 1})
+
+    def test_release_wakes_a_waiter_on_another_event_loop(self):
+        controller = _controller()
+        asyncio.run(controller.acquire())
+        admitted = threading.Event()
+
+        def other_request():
+            async def run():
+                async with controller.slot():
+                    admitted.set()
+            asyncio.run(run())
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        self.assertFalse(admitted.wait(0.05))
+        controller.release()
+        thread.join(timeout=2)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(controller.snapshot()['in_flight'], 0)
+
+
+class SaturatedApiTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="busy@test.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_chat_answers_429_with_retry_after(self):
+        with mock.patch(
+            'api.orchestrator_views.llm_admission.precheck',
+            side_effect=LLMSaturated('queue_full', 3.2),
+        ):
+            for url in ('/api/chat/', '/api/chat/stream/'):
+                response = self.client.post(url, {'message': "hello"}, format='json')
+                self.assertEqual(response.status_code, 429, url)
+                self.assertEqual(response['Retry-After'], '4')
+                self.assertEqual(response.json()['code'], 'saturated')
+
+    def test_status_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/llm/status/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get('/api/llm/status/').json()
+        self.assertIn('queue_depth', body['admission'])
@@ -0,0 +1,164 @@
+"""
+LLM resilience: retries with backoff, circuit breakers, model failover,
+stream retries before the first token, and hedged requests.
+"""
+import asyncio
+from unittest import mock
+
+import groq
+import httpx
+from django.test import SimpleTestCase
+
+from agents.services import llm_resilience
+from agents.services.groq_agent_base import GroqAgentRunner
+from agents.services.llm_admission import AdmissionController
+
+
+def _status_error(code, headers=None):
+    request = httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions')
+    response = httpx.Response(code, headers=headers or {}, request=request)
+    return groq.APIStatusError(f"HTTP {code}", response=response, body=None)
+
+
+class _Stream:
+    def __init__(self, parts, error=None):
+        self.parts = parts
+        self.error = error
+
+    async def __aiter__(self):
+        if self.error is not None:
+            raise self.error
+        for part in self.parts:
+            yield part
+
+
+class ResilienceTests(SimpleTestCase):
+
+    def setUp(self):
+        llm_resilience._health.clear()
+        patches = [
+            mock.patch.object(llm_resilience, 'llm_admission', AdmissionController(max_concurrency=4)),
+            mock.patch.object(llm_resilience, 'backoff_delay', lambda attempt, exc=None: 0),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(llm_resilience._health.clear)
+
+    def test_transient_errors_are_retried(self):
+        calls = []
+
+        async def call(model):
+            calls.append(model)
+            if len(calls) < 3:
+                raise _status_error(503)
+            return 'ok'
+
+        result, model = asyncio.run(llm_resilience.complete(call, ['big', 'small']))
+        self.assertEqual((result, model), ('ok', 'big'))
+        self.assertEqual(calls, ['big', 'big', 'big'])
+        stats = llm_resilience.snapshot()['big']
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['state'], 'closed')
+
+    def test_non_transient_errors_are_not_retried(self):
+        calls = []
+
+        async def call(model):
+            calls.append(model)
+            raise _status_error(400)
+
+        with self.assertRaises(groq.APIStatusError):
+            asyncio.run(llm_resilience.complete(call, ['big', 'small']))
+        self.assertEqual(calls, ['big'])
+        self.assertEqual(llm_resilience.snapshot()['big']['consecutive_failures'], 0)
+
+    def test_breaker_opens_and_fails_over(self):
+        calls = []
+
+        async def call(model):
+            calls.append(model)
+            if model == 'big':
+                raise groq.APIConnectionError(request=httpx.Request('POST', 'https://api.groq.com'))
+            return f"from {model}"
+
+        with mock.patch.object(llm_resilience, 'BREAKER_FAILURES', 2):
+            llm_resilience._health['big'] = llm_resilience.ModelHealth('big', failure_threshold=2)
+            result, model = asyncio.run(llm_resilience.complete(call, ['big', 'small']))
+            self.assertEqual((result, model), ('from small', 'small'))
+            self.assertEqual(calls, ['big', 'big', 'small'])
+            self.assertEqual(llm_resilience.snapshot()['big']['state'], 'open')
+
+            # While open, 'big' is skipped without a call
+            calls.clear()
+            asyncio.run(llm_resilience.complete(call, ['big', 'small']))
+            self.assertEqual(calls, ['small'])
+
+    def test_all_circuits_open(self):
+        for name in ('big', 'small'):
+            health = llm_resilience.model_health(name)
+            for _ in range(health.failure_threshold):
+                health.record_failure()
+
+        async def call(model):
+            raise AssertionError("no model should be called")
+
+        with self.assertRaises(llm_resilience.CircuitOpen) as ctx:
+            asyncio.run(llm_resilience.complete(call, ['big', 'small']))
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_half_open_probe_closes_circuit(self):
+        health = llm_resilience.model_health('big')
+        for _ in range(health.failure_threshold):
+            health.record_failure()
+        health.opened_at -= health.cooldown
+
+        async def call(model):
+            return 'ok'
+
+        asyncio.run(llm_resilience.complete(call, ['big']))
+        self.assertEqual(health.state, 'closed')
+
+    def test_stream_retries_before_first_chunk(self):
+        attempts = []
+
+        async def call(model):
+            attempts.append(model)
+            if len(attempts) == 1:
+                return _Stream([], error=_status_error(429))
+            return _Stream(['a', 'b'])
+
+        async def consume():
+            return [chunk async for chunk in llm_resilience.stream(call, ['big'])]
+
+        self.assertEqual(asyncio.run(consume()), ['a', 'b'])
+        self.assertEqual(attempts, ['big', 'big'])
+
+    def test_hedged_request_wins_over_slow_primary(self):
+        health = llm_resilience.model_health('big')
+        health.latencies.extend([0.01] * llm_resilience.HEDGE_MIN_SAMPLES)
+        calls = []
+
+        async def call(model):
+            calls.append(model)
+            await asyncio.sleep(5 if len(calls) == 1 else 0)
+            return len(calls)
+
+        with mock.patch.object(llm_resilience, 'HEDGE_ENABLED', True), \
+                mock.patch.object(llm_resilience, 'HEDGE_MIN_DELAY', 0.01):
+            result, _ = asyncio.run(llm_resilience.complete(call, ['big']))
+        self.assertEqual(result, 2)
+        stats = llm_resilience.snapshot()['big']
+        self.assertEqual((stats['hedged'], stats['hedge_wins']), (1, 1))
+        self.assertEqual(llm_resilience.llm_admission.snapshot()['in_flight'], 0)
+
+
+class ModelChainTests(SimpleTestCase):
+
+    def test_failover_chain_uses_faster_models(self):
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'x'}):
+            runner = GroqAgentRunner('test_agent', 'test', model='llama-3.3-70b')
+        self.assertEqual(
+            runner._model_chain(runner.model),
+            ['llama-3.3-70b-versatile', 'mixtral-8x7b-32768', 'gemma2-9b-it'],
+        )
@@ -0,0 +1,124 @@
+"""
+Model routing: tiers from message complexity and intent confidence, live
+health overrides, and the model actually used by the orchestrator.
+"""
+import uuid
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase
+
+from agents.models import AgentSession, Message, User
+from agents.services import llm_resilience
+from agents.services.model_router import ModelRouter, is_small_talk, score_complexity
+from agents.services.orchestrator import orchestrator
+from agents.tests.test_fan_out import FakeRunner
+
+SMALL = 'gemma2-9b-it'
+MEDIUM = 'mixtral-8x7b-32768'
+LARGE = 'llama-3.3-70b-versatile'
+
+CONFIDENT = {'primary_agent': 'study_agent', 'confidence': 0.9}
+
+
+class ModelRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        llm_resilience._health.clear()
+        self.addCleanup(llm_resilience._health.clear)
+        self.router = ModelRouter()
+
+    def route(self, message, intent=CONFIDENT, **kwargs):
+        return self.router.route('study_agent', message, intent, default=LARGE, **kwargs)
+
+    def test_small_talk(self):
+        self.assertTrue(is_small_talk("thanks!"))
+        self.assertTrue(is_small_talk("Good morning :)"))
+        self.assertFalse(is_small_talk("hey can you plan my week"))
+        # Even when the classifier had no idea where to send it
+        decision = self.route("hi there", {'confidence': 0.2})
+        self.assertEqual((decision['model'], decision['reason']), (SMALL, 'small_talk'))
+
+    def test_tiers_follow_complexity(self):
+        self.assertLess(score_complexity("what is a pomodoro"), score_complexity("add a task to call mom"))
+        self.assertEqual(self.route("what is a pomodoro")['model'], SMALL)
+        self.assertEqual(self.route("add a task to call mom tomorrow")['model'], MEDIUM)
+        plan = "Make me a detailed study plan for the next two weeks before my exam, with breaks and reviews"
+        self.assertEqual(self.route(plan)['model'], LARGE)
+
+    def test_uncertain_or_multi_agent_stays_large(self):
+        self.assertEqual(self.route("what is a pomodoro", {'confidence': 0.3})['reason'], 'low_confidence')
+        decision = self.route("what is a pomodoro", {'confidence': 0.9, 'is_multi_agent': True})
+        self.assertEqual(decision['model'], LARGE)
+
+    def test_open_circuit_moves_up_a_tier(self):
+        health = llm_resilience.model_health(SMALL)
+        for _ in range(health.failure_threshold):
+            health.record_failure()
+        decision = self.route("thanks!")
+        self.assertEqual(decision['model'], MEDIUM)
+        self.assertEqual(decision['reason'], 'small_talk+upgraded_for_health')
+
+    def test_slow_model_is_skipped(self):
+        for model, latency in ((SMALL, 20.0), (MEDIUM, 1.0)):
+            health = llm_resilience.model_health(model)
+            for _ in range(12):
+                health.record_success(latency, first_token=True)
+        self.assertEqual(self.route("thanks!", stream=True)['model'], MEDIUM)
+        # Completion latencies are tracked separately from first-token ones
+        self.assertEqual(self.route("thanks!")['model'], SMALL)
+
+    def test_snapshot_and_histograms(self):
+        self.route("thanks!")
+        self.route("what is a pomodoro", {'confidence': 0.1})
+        stats = self.router.snapshot()
+        self.assertEqual(stats['by_model'], {SMALL: 1, LARGE: 1})
+        self.assertEqual([d['reason'] for d in stats['recent']], ['small_talk', 'low_confidence'])
+
+        llm_resilience.model_health(SMALL).record_success(0.3)
+        histogram = llm_resilience.snapshot()[SMALL]['latency_histogram']
+        self.assertEqual([b['count'] for b in histogram if b['count']], [1])
+        self.assertEqual(next(b['le_ms'] for b in histogram if b['count']), 500)
+
+    def test_disabled_uses_runner_default(self):
+        with mock.patch('agents.services.model_router.ROUTER_ENABLED', False):
+            decision = self.route("thanks!")
+        self.assertEqual((decision['model'], decision['reason']), (LARGE, 'disabled'))
+
+
+class OrchestratorRoutingTests(TestCase):
+
+    def setUp(self):
+        llm_resilience._health.clear()
+        self.user = User.objects.create_user(email="router@test.com", password="testpass123")
+        self.session = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+        self.runner = FakeRunner("You're welcome!")
+        patches = [
+            mock.patch.dict(orchestrator.agents, {'study_agent': self.runner}),
+            mock.patch(
+                'agents.services.orchestrator.intent_classifier.classify_intent',
+                mock.AsyncMock(return_value=CONFIDENT),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_small_talk_runs_on_small_model(self):
+        result = async_to_sync(orchestrator.process_message)("thanks!", self.user, session=self.session)
+        self.assertTrue(result['success'], result)
+        self.assertEqual(result['model'], SMALL)
+        self.assertEqual(self.runner.models, [SMALL])
+        reply = Message.objects.filter(session=self.session, role='agent').get()
+        self.assertEqual(reply.metadata['model'], SMALL)
+
+    def test_stream_announces_model(self):
+        async def run():
+            return [e async for e in orchestrator.process_message_stream(
+                "thanks!", self.user, session=self.session
+            )]
+        events = async_to_sync(run)()
+        self.assertEqual(events[0]['model'], SMALL)
+        self.assertEqual(self.runner.models, [SMALL])
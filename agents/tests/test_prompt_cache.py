@@ -0,0 +1,86 @@
+"""
+Prompt layout for prefix caching: stable messages first, per-turn context
+last, block-aligned history, and the prefix measurements.
+"""
+import uuid
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from agents.models import AgentSession, User
+from agents.services.message_store import record_message
+from agents.services.prompt_cache import PrefixStats
+from agents.services.study_agent import study_agent_runner
+
+PROFILE = {'name': 'Ada Lovelace', 'timezone': 'Europe/London', 'learning_style': 'visual'}
+
+
+class PromptLayoutTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="prefix@test.com", password="testpass123")
+        self.session = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+
+    def _turn(self, text, context):
+        record_message(session=self.session, role='user', content=text)
+        return async_to_sync(study_agent_runner._build_messages)(text, self.session.session_id, context)
+
+    def _reply(self, text):
+        record_message(session=self.session, role='agent', content=text)
+
+    def test_per_turn_context_goes_last(self):
+        first = self._turn("Plan my week", dict(PROFILE))
+        self._reply("## Your week")
+        second = self._turn("Thanks!", {**PROFILE, 'saved_items': ["Task: Review notes"]})
+
+        # The message being answered is sent once, at the end
+        self.assertEqual([m['content'] for m in first].count("Plan my week"), 1)
+        self.assertEqual(second[-1], {'role': 'user', 'content': "Thanks!"})
+        self.assertTrue(second[-2]['content'].startswith("Already saved in this conversation"))
+        # Everything the first prompt sent is a prefix of the second
+        self.assertEqual(second[:len(first)], first)
+        self.assertNotIn("Already saved", second[1]['content'])
+
+    def test_history_window_slides_in_steps(self):
+        runner = study_agent_runner
+        for i in range(runner.HISTORY_WINDOW + 5):
+            record_message(session=self.session, role='user' if i % 2 == 0 else 'agent', content=f"m{i}")
+        history = async_to_sync(runner._load_history_from_db)(self.session.session_id)
+        self.assertEqual(history[0]['content'], "m0")
+
+        for i in range(runner.HISTORY_WINDOW + 5, runner.HISTORY_WINDOW + 12):
+            record_message(session=self.session, role='user' if i % 2 == 0 else 'agent', content=f"m{i}")
+        history = async_to_sync(runner._load_history_from_db)(self.session.session_id)
+        # 32 messages: the window starts at a multiple of HISTORY_STEP
+        self.assertEqual(history[0]['content'], f"m{runner.HISTORY_STEP}")
+        self.assertGreaterEqual(len(history), runner.HISTORY_WINDOW)
+
+    def test_command_reports_stable_prefixes(self):
+        out = StringIO()
+        call_command('prompt_prefixes', stdout=out)
+        self.assertIn("byte-identical", out.getvalue())
+        self.assertIn("study_agent", out.getvalue())
+
+
+class PrefixStatsTests(SimpleTestCase):
+
+    def test_shared_prefix_between_turns(self):
+        stats = PrefixStats()
+        system = {'role': 'system', 'content': 'x' * 400}
+        first = [system, {'role': 'user', 'content': 'a' * 40}]
+        second = first + [{'role': 'assistant', 'content': 'b' * 40}, {'role': 'user', 'content': 'c' * 40}]
+
+        self.assertEqual(stats.observe('study_agent', 's1', first), 0)
+        self.assertEqual(stats.observe('study_agent', 's1', second), 440)
+        # Another session has nothing to share with yet
+        self.assertEqual(stats.observe('study_agent', 's2', second), 0)
+
+        report = stats.snapshot()['study_agent']
+        self.assertEqual(report['calls'], 3)
+        self.assertEqual(report['system_prefix_tokens'], 100)
+        self.assertEqual(report['shared_prefix_ratio'], round(440 / (440 + 520 + 520), 3))
+        self.assertIsNone(report['provider_cached_ratio'])
@@ -0,0 +1,85 @@
+"""
+The per-user list endpoints should be served from the composite indexes
+added for their query shapes, not a scan of the single-column FK index.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from agents.models import AgentSession, MealPlan, Message, StudySession, Task, User, WellnessActivity
+from api.pagination import paginate_keyset
+from api.views import MealPlanViewSet, StudySessionViewSet, TaskViewSet, WellnessActivityViewSet
+
+
+def _index_name(model, fields):
+    for index in model._meta.indexes:
+        if list(index.fields) == fields:
+            return index.name
+    raise AssertionError(f"{model.__name__} has no index on {fields}")
+
+
+class ListQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="plans@test.com", password="testpass123")
+        cls.session = AgentSession.objects.create(
+            user=cls.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan assertions are written against SQLite's EXPLAIN QUERY PLAN")
+
+    def _list_queryset(self, viewset_class, params=None):
+        django_request = APIRequestFactory().get('/', params or {})
+        force_authenticate(django_request, user=self.user)
+        view = viewset_class()
+        view.request = Request(django_request)
+        view.format_kwarg = None
+        return view.get_queryset()
+
+    def assertUsesIndex(self, queryset, model, fields):
+        plan = queryset.explain()
+        self.assertIn(_index_name(model, fields), plan, plan)
+
+    def test_meal_plans(self):
+        self.assertUsesIndex(self._list_queryset(MealPlanViewSet), MealPlan, ['user', '-created_at'])
+        self.assertUsesIndex(
+            self._list_queryset(MealPlanViewSet, {'date': '2026-01-01'}),
+            MealPlan, ['user', 'date', '-created_at'],
+        )
+
+    def test_tasks(self):
+        self.assertUsesIndex(
+            self._list_queryset(TaskViewSet, {'status': 'todo'}), Task, ['user', 'status', 'priority']
+        )
+        self.assertUsesIndex(
+            self._list_queryset(TaskViewSet, {'priority': 'high'}), Task, ['user', 'priority', 'due_date']
+        )
+
+    def test_study_sessions(self):
+        self.assertUsesIndex(self._list_queryset(StudySessionViewSet), StudySession, ['user', '-created_at'])
+
+    def test_wellness_activities(self):
+        self.assertUsesIndex(
+            self._list_queryset(WellnessActivityViewSet, {'activity_type': 'sleep'}),
+            WellnessActivity, ['user', 'activity_type', 'recorded_at'],
+        )
+        start = (timezone.now() - timedelta(days=7)).isoformat()
+        self.assertUsesIndex(
+            self._list_queryset(WellnessActivityViewSet, {'start_date': start}),
+            WellnessActivity, ['user', 'recorded_at'],
+        )
+
+    def test_message_history_page(self):
+        messages = Message.objects.filter(session=self.session)
+        self.assertUsesIndex(messages.order_by('-created_at', '-id')[:51], Message, ['session', 'created_at'])
+        # The page query itself, as issued by paginate_keyset
+        with self.assertNumQueries(1):
+            paginate_keyset(messages, 'created_at', 50)
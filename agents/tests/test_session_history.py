@@ -0,0 +1,279 @@
+"""
+Session sidebar and message history endpoints: query counts and
+keyset pagination.
+"""
+import os
+import uuid
+from contextlib import nullcontext
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from django.core.management import call_command
+
+from agents.models import AgentSession, Message, User
+from agents.services.message_store import record_message
+from api.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def _make_session(user, n_messages=0):
+    session = AgentSession.objects.create(
+        user=user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+    )
+    for i in range(n_messages):
+        record_message(
+            session=session, role='user' if i % 2 == 0 else 'agent', content=f"message {i}"
+        )
+    return session
+
+
+class CursorCodecTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        from django.utils import timezone
+        now = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(now, 42)), (now, 42))
+
+    def test_garbage_cursor_rejected(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not-a-cursor")
+
+
+class UserSessionListTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="sessions@test.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_counts_and_preview_without_n_plus_one(self):
+        for n in (1, 2, 3, 4):
+            _make_session(self.user, n_messages=n)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/my-sessions/')
+        results = response.data['results']
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(r['message_count'] for r in results), [1, 2, 3, 4])
+        self.assertTrue(all(r['last_message_preview'].startswith('message') for r in results))
+
+    def test_cursor_pages_cover_every_session_once(self):
+        created = {_make_session(self.user).session_id for _ in range(7)}
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/my-sessions/', params).data
+            seen.extend(r['session_id'] for r in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(set(seen), created)
+
+    def test_other_users_sessions_hidden(self):
+        other = User.objects.create_user(email="other@test.com", password="testpass123")
+        _make_session(other, n_messages=1)
+        self.assertEqual(self.client.get('/api/my-sessions/').data['results'], [])
+
+    def test_bad_cursor_is_400(self):
+        response = self.client.get('/api/my-sessions/', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SessionMessagesPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="history@test.com", password="testpass123")
+        self.session = _make_session(self.user, n_messages=12)
+        self.url = f'/api/sessions/{self.session.session_id}/messages/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_page_is_latest_messages_in_order(self):
+        data = self.client.get(self.url, {'limit': 5}).data
+        self.assertEqual(
+            [m['content'] for m in data['results']],
+            [f"message {i}" for i in range(7, 12)],
+        )
+        self.assertIsNotNone(data['previous_cursor'])
+
+    def test_before_walks_back_to_the_start(self):
+        contents, cursor = [], None
+        while True:
+            params = {'limit': 5}
+            if cursor:
+                params['before'] = cursor
+            data = self.client.get(self.url, params).data
+            contents = [m['content'] for m in data['results']] + contents
+            cursor = data['previous_cursor']
+            if not cursor:
+                break
+        self.assertEqual(contents, [f"message {i}" for i in range(12)])
+
+    def test_after_returns_only_new_messages(self):
+        latest = self.client.get(self.url).data['latest_cursor']
+        self.assertEqual(self.client.get(self.url, {'after': latest}).data['results'], [])
+
+        Message.objects.create(session=self.session, role='user', content="fresh")
+        data = self.client.get(self.url, {'after': latest}).data
+        self.assertEqual([m['content'] for m in data['results']], ["fresh"])
+        self.assertNotEqual(data['latest_cursor'], latest)
+
+    def test_older_pages_keep_the_newest_latest_cursor(self):
+        first = self.client.get(self.url, {'limit': 5}).data
+        older = self.client.get(self.url, {'limit': 5, 'before': first['previous_cursor']}).data
+        self.assertEqual(older['latest_cursor'], first['latest_cursor'])
+        self.assertEqual(self.client.get(self.url, {'after': older['latest_cursor']}).data['results'], [])
+
+    def test_before_and_after_together_rejected(self):
+        latest = self.client.get(self.url).data['latest_cursor']
+        response = self.client.get(self.url, {'after': latest, 'before': latest})
+        self.assertEqual(response.status_code, 400)
+
+    def test_session_list_serializer_does_not_nest_messages(self):
+        data = self.client.get('/api/sessions/').data
+        rows = data['results'] if isinstance(data, dict) else data
+        self.assertNotIn('messages', rows[0])
+
+
+class SessionCounterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="counters@test.com", password="testpass123")
+        self.session = _make_session(self.user)
+
+    def test_record_message_updates_counters(self):
+        record_message(self.session, 'user', "hi")
+        agent_msg = record_message(self.session, 'agent', "hello", metadata={'agent_type': 'study_agent'})
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 2)
+        self.assertEqual(self.session.last_message_at, agent_msg.created_at)
+        self.assertEqual(self.session.last_agent_type, 'study_agent')
+
+    def test_backfill_command_repairs_drift(self):
+        Message.objects.create(session=self.session, role='user', content="raw insert")
+        Message.objects.create(
+            session=self.session, role='agent', content="raw reply",
+            metadata={'agent_type': 'wellness_agent'},
+        )
+        AgentSession.objects.filter(pk=self.session.pk).update(message_count=99)
+
+        call_command('backfill_session_counters', stdout=open(os.devnull, 'w'))
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 2)
+        self.assertEqual(self.session.last_agent_type, 'wellness_agent')
+        self.assertIsNotNone(self.session.last_message_at)
+
+
+class SessionSavedItemsTests(TestCase):
+
+    def setUp(self):
+        from agents.models import Habit, Task
+        self.user = User.objects.create_user(email="saved@test.com", password="testpass123")
+        self.session = _make_session(self.user)
+        for i in range(3):
+            Task.objects.create(user=self.user, session=self.session, title=f"Task {i}")
+        Habit.objects.create(user=self.user, session=self.session, name="Stretch")
+        self.url = f'/api/sessions/{self.session.session_id}/saved-items/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_includes_habits_and_counts_from_rows(self):
+        # session lookup + one query per type; no COUNT queries
+        with self.assertNumQueries(6):
+            data = self.client.get(self.url).data
+        self.assertEqual(len(data['saved_items']['habits']), 1)
+        self.assertEqual(data['counts']['tasks'], 3)
+        self.assertEqual(data['total_count'], 4)
+
+    def test_per_type_pagination_counts_in_one_extra_query(self):
+        with self.assertNumQueries(7):
+            data = self.client.get(self.url, {'limit': 2}).data
+        self.assertEqual(len(data['saved_items']['tasks']), 2)
+        self.assertTrue(data['has_more']['tasks'])
+        self.assertEqual(data['counts']['tasks'], 3)
+
+        data = self.client.get(self.url, {'limit': 2, 'tasks_offset': 2, 'types': 'tasks'}).data
+        self.assertEqual(list(data['saved_items']), ['tasks'])
+        self.assertEqual([t['title'] for t in data['saved_items']['tasks']], ['Task 0'])
+        self.assertFalse(data['has_more']['tasks'])
+
+    def test_summary_lines_for_agent_context(self):
+        from agents.services.session_artifacts import summarize_session_artifacts
+        lines = summarize_session_artifacts(self.session, per_type=2)
+        self.assertIn("Habit: Stretch (daily)", lines)
+        self.assertIn("(+1 more tasks)", lines)
+
+    def test_summary_is_cached_until_an_item_changes(self):
+        from agents.models import Task
+        from agents.services.session_artifacts import summarize_session_artifacts
+        lines = summarize_session_artifacts(self.session)
+        with self.assertNumQueries(0):
+            self.assertEqual(summarize_session_artifacts(self.session), lines)
+
+        task = Task.objects.create(user=self.user, session=self.session, title="Task 3")
+        self.assertIn("Task: Task 3 (medium, todo)", summarize_session_artifacts(self.session))
+        task.delete()
+        self.assertEqual(summarize_session_artifacts(self.session), lines)
+
+
+class MessageSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="search@test.com", password="testpass123")
+        self.other = User.objects.create_user(email="other-search@test.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = _make_session(self.user)
+        record_message(self.session, 'agent', "Try a creamy mushroom pasta with garlic for dinner.")
+        record_message(self.session, 'agent', "Pasta again? A lemon pasta salad works for lunch.")
+        record_message(self.session, 'user', "What should I study tonight?")
+        record_message(_make_session(self.other), 'agent', "Secret pasta recipe for someone else.")
+
+    def test_ranked_snippets_scoped_to_user(self):
+        response = self.client.get('/api/search/', {'q': 'pasta'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['backend'], 'fts5')
+        results = response.data['results']
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all('<mark>' in r['snippet'] for r in results))
+        self.assertNotIn('Secret', ' '.join(r['snippet'] for r in results))
+        # Two hits in the second message outrank one in the first
+        self.assertIn('lemon', results[0]['snippet'])
+
+    def test_stemming_prefix_and_operator_safety(self):
+        self.assertEqual(len(self.client.get('/api/search/', {'q': 'mushrooms'}).data['results']), 1)
+        self.assertEqual(len(self.client.get('/api/search/', {'q': 'stud'}).data['results']), 1)
+        # FTS5 syntax in user input is treated as plain words
+        response = self.client.get('/api/search/', {'q': 'pasta OR owner:u1 NEAR("'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_index_follows_deletes_and_edits(self):
+        message = Message.objects.get(content__startswith="What should")
+        message.content = "Plan a quiz on photosynthesis"
+        message.save()
+        self.assertEqual(len(self.client.get('/api/search/', {'q': 'photosynthesis'}).data['results']), 1)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'tonight'}).data['results'], [])
+
+        self.session.delete()
+        self.assertEqual(self.client.get('/api/search/', {'q': 'pasta'}).data['results'], [])
+
+    def test_snippets_escape_message_html(self):
+        record_message(self.session, 'agent', '<img src=x onerror=alert(1)> quiche & "tart" recipe')
+        for backend in ('fts5', 'like'):
+            with mock.patch('agents.services.message_search._search_fts5',
+                            side_effect=DatabaseError("no fts5")) if backend == 'like' else nullcontext():
+                response = self.client.get('/api/search/', {'q': 'quiche'})
+            self.assertEqual(response.data['backend'], backend)
+            snippet = response.data['results'][0]['snippet']
+            self.assertNotIn('<img', snippet)
+            self.assertIn('&lt;img src=x onerror=alert(1)&gt;', snippet)
+            self.assertIn('<mark>quiche</mark> &amp; &quot;tart&quot;', snippet)
+
+    def test_missing_query_rejected(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
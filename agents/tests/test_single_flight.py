@@ -0,0 +1,215 @@
+"""
+Single-flight coalescing: duplicate turns join the in-flight completion or
+stream instead of running the agent again.  Resumable streams: replay after
+a Last-Event-ID.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from agents.models import AgentSession, Message, User
+from agents.services.orchestrator import orchestrator
+from agents.services.single_flight import Flight, SingleFlight, flight_key, parse_event_id, single_flight
+from agents.tests.test_fan_out import FakeRunner
+
+INTENT = {'primary_agent': 'study_agent', 'confidence': 0.9}
+
+
+class FlightTests(SimpleTestCase):
+
+    def test_joiner_on_another_thread_sees_every_event(self):
+        flights = SingleFlight()
+        flight, leader = flights.begin('stream:k')
+        self.assertTrue(leader)
+        joined, joined_leader = flights.begin('stream:k')
+        self.assertIs(joined, flight)
+        self.assertFalse(joined_leader)
+
+        def lead():
+            for i in range(5):
+                flight.publish({'type': 'chunk', 'content': str(i)})
+                time.sleep(0.01)
+            flights.end(flight)
+
+        async def follow():
+            return [event['content'] async for event in joined.follow()]
+
+        thread = threading.Thread(target=lead)
+        thread.start()
+        seen = asyncio.run(follow())
+        thread.join()
+        self.assertEqual(seen, ['0', '1', '2', '3', '4'])
+        # Finished flights aren't joined
+        self.assertTrue(flights.begin('stream:k')[1])
+
+    def test_joiner_gets_leaders_error(self):
+        flights = SingleFlight()
+        flight, _ = flights.begin('complete:k')
+        joined, _ = flights.begin('complete:k')
+        flights.end(flight, error=ValueError("boom"))
+        with self.assertRaises(ValueError):
+            asyncio.run(joined.wait())
+
+    def test_key(self):
+        session = mock.Mock(session_id='s1')
+        self.assertEqual(flight_key('stream', None, session, "hi"), flight_key('stream', None, session, "hi"))
+        self.assertNotEqual(flight_key('stream', None, session, "hi"), flight_key('complete', None, session, "hi"))
+        self.assertNotEqual(flight_key('stream', None, session, "hi"), flight_key('stream', None, session, "hi!"))
+
+
+class ResumableStreamTests(SimpleTestCase):
+
+    def _stream(self, flights, texts):
+        flight, _ = flights.begin('stream:k', owner=1, resumable=True)
+        self._publish(flight, texts)
+        return flight
+
+    def _publish(self, flight, texts):
+        flight.publish({'type': 'agent_selected', 'agent': 'study_agent'})
+        for text in texts:
+            flight.publish({'type': 'chunk', 'content': text})
+
+    def _follow(self, flight, after=-1):
+        async def follow():
+            return [event async for event in flight.follow(after=after)]
+        return asyncio.run(follow())
+
+    def test_resume_replays_after_last_event_id(self):
+        flights = SingleFlight()
+        flight = self._stream(flights, ["a", "b", "c"])
+        flights.end(flight)
+
+        stream_id, seq = parse_event_id(f"{flight.stream_id}:1")
+        self.assertIs(flights.lookup(stream_id, owner=1), flight)
+        replay = self._follow(flight, after=seq)
+        self.assertEqual([e['content'] for e in replay], ["b", "c"])
+        self.assertEqual(replay[0]['id'], f"{flight.stream_id}:2")
+        self.assertEqual(flights.snapshot()['resumed'], 1)
+
+    def test_evicted_events_become_a_resync(self):
+        flight = Flight('stream:k', buffer_size=2)
+        self._publish(flight, ["a", "b", "c", "d"])
+        flight.finish()
+
+        # The client saw up to "a"; "b" has left the ring
+        replay = self._follow(flight, after=1)
+        self.assertEqual(replay[0]['type'], 'resync')
+        self.assertEqual(replay[0]['content'], "ab")
+        self.assertEqual([e['content'] for e in replay[1:]], ["c", "d"])
+        # From the start, the header survives eviction
+        replay = self._follow(flight)
+        self.assertEqual([e['type'] for e in replay[:2]], ['agent_selected', 'resync'])
+
+    def test_lookup_checks_owner_and_expiry(self):
+        flights = SingleFlight()
+        flight = self._stream(flights, ["a"])
+        self.assertIsNone(flights.lookup(flight.stream_id, owner=2))
+        flights.end(flight)
+        self.assertIs(flights.lookup(flight.stream_id, owner=1), flight)
+        with mock.patch('agents.services.single_flight.STREAM_REPLAY_TTL', 0):
+            time.sleep(0.01)
+            self.assertIsNone(flights.lookup(flight.stream_id, owner=1))
+
+    def test_parse_event_id(self):
+        self.assertEqual(parse_event_id("abc:12"), ("abc", 12))
+        self.assertIsNone(parse_event_id("abc"))
+        self.assertIsNone(parse_event_id(":3"))
+        self.assertIsNone(parse_event_id(None))
+
+
+class ResumeApiTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="resume@test.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.flight, _ = single_flight.begin(f"stream:test:{uuid.uuid4()}", owner=self.user.pk, resumable=True)
+        for text in ("## Your", " week"):
+            self.flight.publish({'type': 'chunk', 'content': text})
+        single_flight.end(self.flight)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_last_event_id_resumes_without_a_new_turn(self):
+        response = self.client.post(
+            '/api/chat/stream/', {'message': "Plan my week"}, format='json',
+            HTTP_LAST_EVENT_ID=f"{self.flight.stream_id}:0",
+        )
+        self.assertEqual(response.status_code, 200)
+        body = self._body(response)
+        self.assertIn(f"id: {self.flight.stream_id}:1\n", body)
+        self.assertIn('" week"', body)
+        self.assertNotIn('"## Your"', body)
+        self.assertTrue(body.rstrip().endswith('{"type": "done"}'))
+
+    def test_resume_endpoint_from_start(self):
+        response = self.client.get(f'/api/chat/stream/{self.flight.stream_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('"## Your"', self._body(response))
+
+    def test_expired_or_foreign_stream_is_gone(self):
+        other = User.objects.create_user(email="other@test.com", password="testpass123")
+        self.client.force_authenticate(user=other)
+        response = self.client.post(
+            '/api/chat/stream/', {'message': "Plan my week"}, format='json',
+            HTTP_LAST_EVENT_ID=f"{self.flight.stream_id}:0",
+        )
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['code'], 'stream_gone')
+
+
+class OrchestratorCoalescingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="flight@test.com", password="testpass123")
+        self.session = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+        self.runner = FakeRunner("## Your week", delay=0.1, parts=3)
+        patches = [
+            mock.patch.dict(orchestrator.agents, {'study_agent': self.runner}),
+            mock.patch(
+                'agents.services.orchestrator.intent_classifier.classify_intent',
+                mock.AsyncMock(return_value=INTENT),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_duplicate_completion_joins(self):
+        async def run():
+            return await asyncio.gather(*(
+                orchestrator.process_message("Plan my week", self.user, session=self.session)
+                for _ in range(3)
+            ))
+        results = async_to_sync(run)()
+        self.assertEqual([r['response'] for r in results], ["## Your week"] * 3)
+        self.assertEqual(sum(bool(r.get('coalesced')) for r in results), 2)
+        self.assertEqual(len(self.runner.contexts), 1)
+        self.assertEqual(Message.objects.filter(session=self.session).count(), 2)
+
+        # Once finished, the same message runs again
+        async_to_sync(orchestrator.process_message)("Plan my week", self.user, session=self.session)
+        self.assertEqual(len(self.runner.contexts), 2)
+
+    def test_duplicate_stream_follows_leader(self):
+        async def consume():
+            return [e async for e in orchestrator.process_message_stream(
+                "Plan my week", self.user, session=self.session
+            )]
+
+        async def run():
+            return await asyncio.gather(consume(), consume())
+        leader, joiner = async_to_sync(run)()
+        self.assertEqual(joiner, leader)
+        self.assertEqual(''.join(e['content'] for e in leader if e['type'] == 'chunk'), "## Your week")
+        self.assertEqual(len(self.runner.contexts), 1)
+        self.assertEqual(Message.objects.filter(session=self.session, role='agent').count(), 1)
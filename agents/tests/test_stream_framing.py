@@ -0,0 +1,91 @@
+"""
+Negotiated stream framing: chunk batching, compact encodings and the
+framing benchmark.
+"""
+import asyncio
+import json
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from agents.models import User
+from agents.services.single_flight import single_flight
+from agents.services.stream_framing import ChunkBatcher, batch_chunks, encode_sse, negotiate
+
+
+def _chunk(text, seq):
+    return {'type': 'chunk', 'content': text, 'id': f"s:{seq}"}
+
+
+class FramingTests(SimpleTestCase):
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate(None), 'json')
+        self.assertEqual(negotiate('compact'), 'compact')
+        self.assertEqual(negotiate('bogus, COMPACT'), 'compact')
+        # msgpack needs binary frames, so SSE falls back
+        self.assertEqual(negotiate('msgpack,compact'), 'compact')
+
+    def test_batcher_merges_chunks_but_not_the_first(self):
+        batcher = ChunkBatcher(interval=0.05)
+        self.assertEqual(batcher.add(_chunk("a", 1), 0.0), [_chunk("a", 1)])
+        self.assertEqual(batcher.add(_chunk("b", 2), 0.01), [])
+        self.assertEqual(batcher.add(_chunk("c", 3), 0.02), [])
+        self.assertEqual(batcher.add(_chunk("d", 4), 0.07), [_chunk("bcd", 4)])
+        self.assertEqual(batcher.add(_chunk("e", 5), 0.08), [])
+        done = {'type': 'actions_applied', 'actions': []}
+        self.assertEqual(batcher.add(done, 0.09), [_chunk("e", 5), done])
+
+    def test_batch_flushes_on_interval_while_waiting(self):
+        async def slow():
+            for i, text in enumerate("abc"):
+                yield _chunk(text, i)
+            await asyncio.sleep(0.2)
+            yield _chunk("d", 3)
+
+        async def run():
+            seen = []
+            async for event in batch_chunks(slow(), interval=0.02):
+                seen.append((event['content'], asyncio.get_running_loop().time()))
+            return seen
+
+        seen = asyncio.run(run())
+        self.assertEqual([text for text, _ in seen], ["a", "bc", "d"])
+        # "bc" went out long before "d" arrived
+        self.assertGreater(seen[2][1] - seen[1][1], 0.1)
+
+    def test_compact_sse_drops_the_duplicate_id(self):
+        event = {'type': 'chunk', 'content': "café", 'id': "s:3"}
+        self.assertEqual(encode_sse(event), 'id: s:3\ndata: {"type": "chunk", "content": "caf\\u00e9", "id": "s:3"}\n\n')
+        self.assertEqual(encode_sse(event, 'compact'), 'id: s:3\ndata: {"type":"chunk","content":"café"}\n\n')
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_stream_framing', tokens=50, repeat=1, stdout=out)
+        self.assertIn("compact", out.getvalue())
+
+
+class CompactStreamApiTests(TestCase):
+
+    def test_stream_negotiates_compact_framing(self):
+        user = User.objects.create_user(email="framing@test.com", password="testpass123")
+        client = APIClient()
+        client.force_authenticate(user=user)
+        flight, _ = single_flight.begin(f"stream:test:{uuid.uuid4()}", owner=user.pk, resumable=True)
+        for text in ("## Your", " week", "!"):
+            flight.publish({'type': 'chunk', 'content': text})
+        single_flight.end(flight)
+
+        response = client.get(f'/api/chat/stream/{flight.stream_id}/', HTTP_X_STREAM_FRAMING='compact')
+        self.assertEqual(response['X-Stream-Framing'], 'compact')
+        data = [
+            json.loads(line[len('data: '):])
+            for line in b''.join(response.streaming_content).decode().splitlines()
+            if line.startswith('data: ')
+        ]
+        self.assertEqual(''.join(d.get('content', '') for d in data), "## Your week!")
+        self.assertNotIn('id', data[0])
+        self.assertEqual(data[-1], {'type': 'done'})
@@ -0,0 +1,190 @@
+"""
+max_tokens budgeting: output types, observed-length budgets, and automatic
+continuation of truncated replies (completions and streams).
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import groq
+import httpx
+from django.test import SimpleTestCase
+
+from agents.services import llm_resilience
+from agents.services.action_applier import action_applier
+from agents.services.groq_agent_base import GroqAgentRunner
+from agents.services.token_budget import (
+    BASE_BUDGETS,
+    CONTINUE_JSON_PROMPT,
+    CONTINUE_PROMPT,
+    FLOORS,
+    TokenBudgeter,
+    continuation_messages,
+    expected_output,
+)
+
+ACTION_REPLY = (
+    "Added it!\n```json\n"
+    '{"actions": [{"action": "create_task", "data": {"title": "Call mom"}}]}'
+    "\n```"
+)
+
+
+class BudgetPolicyTests(SimpleTestCase):
+
+    def test_expected_output(self):
+        self.assertEqual(expected_output("thanks!"), 'brief')
+        self.assertEqual(expected_output("what is a pomodoro"), 'chat')
+        self.assertEqual(expected_output("plan my week"), 'structured')
+        self.assertEqual(expected_output("what is a pomodoro", {'is_multi_agent': True}), 'structured')
+
+    def test_budget_follows_observed_lengths(self):
+        budgeter = TokenBudgeter()
+        plan = budgeter.plan('study_agent', "what is a pomodoro")
+        self.assertEqual((plan['max_tokens'], plan['source']), (BASE_BUDGETS['chat'], 'base'))
+
+        for _ in range(30):
+            budgeter.record(plan, 700)
+        plan = budgeter.plan('study_agent', "what is a pomodoro")
+        # p95 (700) + 25% headroom, rounded up to 64
+        self.assertEqual((plan['max_tokens'], plan['source']), (896, 'observed'))
+        self.assertEqual(budgeter.plan('study_agent', "what is a pomodoro", cap=800)['max_tokens'], 800)
+
+        # Short plans never shrink the structured budget below its floor
+        structured = budgeter.plan('study_agent', "plan my week")
+        for _ in range(30):
+            budgeter.record(structured, 100)
+        self.assertEqual(budgeter.plan('study_agent', "plan my week")['max_tokens'], FLOORS['structured'])
+
+    def test_continuation_prompt_knows_about_open_json_block(self):
+        cut = ACTION_REPLY[:40]
+        self.assertEqual(continuation_messages([], cut)[-1]['content'], CONTINUE_JSON_PROMPT)
+        self.assertEqual(continuation_messages([], "Here is the")[-1]['content'], CONTINUE_PROMPT)
+        self.assertEqual(continuation_messages([], ACTION_REPLY + "\nAnd")[-1]['content'], CONTINUE_PROMPT)
+
+
+def _completion(content, finish_reason):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+        usage=SimpleNamespace(completion_tokens=len(content)),
+    )
+
+
+def _status_error(code):
+    request = httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions')
+    return groq.APIStatusError(f"HTTP {code}", response=httpx.Response(code, request=request), body=None)
+
+
+async def _chunks(content, finish_reason):
+    for char in content:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=char), finish_reason=None)])
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)])
+
+
+class ContinuationTests(SimpleTestCase):
+
+    def setUp(self):
+        llm_resilience._health.clear()
+        self.addCleanup(llm_resilience._health.clear)
+        with mock.patch.dict('os.environ', {'GROQ_API_KEY': 'x'}):
+            self.runner = GroqAgentRunner('test_agent', 'test')
+        self.runner._build_messages = mock.AsyncMock(return_value=[{"role": "user", "content": "add a task"}])
+        self.budgeter = TokenBudgeter()
+        patcher = mock.patch('agents.services.groq_agent_base.token_budget', self.budgeter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A fresh per-user rate bucket: these tests make many calls as one user
+        patcher = mock.patch.object(llm_resilience.llm_admission, '_buckets', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+        self.cut = ACTION_REPLY.index('"title"')
+
+    def _client(self, create):
+        self.runner.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def test_truncated_reply_is_continued(self):
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            if len(self.calls) == 1:
+                return _completion(ACTION_REPLY[:self.cut], 'length')
+            return _completion(ACTION_REPLY[self.cut:], 'stop')
+        self._client(create)
+
+        reply = asyncio.run(self.runner.run_agent("add a task to call mom"))
+        self.assertEqual(reply, ACTION_REPLY)
+        self.assertEqual(len(action_applier.extract_actions(reply)), 1)
+
+        first, second = self.calls
+        self.assertEqual(first['max_tokens'], BASE_BUDGETS['structured'])
+        self.assertEqual(second['max_tokens'], 8000)  # doubled, capped at the runner's max_tokens
+        self.assertEqual(second['messages'][-2]['content'], ACTION_REPLY[:self.cut])
+        self.assertEqual(second['messages'][-1]['content'], CONTINUE_JSON_PROMPT)
+
+        stats = self.budgeter.snapshot()['agents']['test_agent']['structured']
+        self.assertEqual((stats['samples'], stats['truncations'], stats['p50_tokens']), (1, 1, len(ACTION_REPLY)))
+
+    def test_truncated_stream_is_continued(self):
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            if len(self.calls) == 1:
+                return _chunks(ACTION_REPLY[:self.cut], 'length')
+            return _chunks(ACTION_REPLY[self.cut:], 'stop')
+        self._client(create)
+
+        async def consume():
+            return ''.join([c async for c in self.runner.run_agent_stream("add a task to call mom")])
+
+        self.assertEqual(asyncio.run(consume()), ACTION_REPLY)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.budgeter.snapshot()['agents']['test_agent']['structured']['continuations'], 1)
+
+    def test_stream_continuation_stays_on_the_failover_model(self):
+        primary, fallback = self.runner._model_chain(self.runner.model)[:2]
+
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            if len(self.calls) == 1:
+                raise _status_error(503)
+            if len(self.calls) == 2:
+                return _chunks(ACTION_REPLY[:self.cut], 'length')
+            return _chunks(ACTION_REPLY[self.cut:], 'stop')
+        self._client(create)
+
+        async def consume():
+            return ''.join([c async for c in self.runner.run_agent_stream("add a task to call mom")])
+
+        with mock.patch.object(llm_resilience, 'RETRY_ATTEMPTS', 1):
+            self.assertEqual(asyncio.run(consume()), ACTION_REPLY)
+        self.assertEqual([c['model'] for c in self.calls], [primary, fallback, fallback])
+
+    def test_continuations_are_bounded(self):
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            return _completion("more ", 'length')
+        self._client(create)
+
+        with mock.patch('agents.services.groq_agent_base.MAX_CONTINUATIONS', 2):
+            reply = asyncio.run(self.runner.run_agent("tell me about sleep"))
+        self.assertEqual(reply, "more more more ")
+        self.assertEqual([c['max_tokens'] for c in self.calls], [1024, 2048, 4096])
+
+    def test_each_continuation_sends_the_reply_once(self):
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            if kwargs.get('stream'):
+                return _chunks(f"p{len(self.calls)} ", 'length' if len(self.calls) < 3 else 'stop')
+            return _completion(f"p{len(self.calls)} ", 'length' if len(self.calls) < 3 else 'stop')
+        self._client(create)
+
+        async def consume():
+            return ''.join([c async for c in self.runner.run_agent_stream("tell me about sleep")])
+
+        with mock.patch('agents.services.groq_agent_base.MAX_CONTINUATIONS', 2):
+            for run in (lambda: asyncio.run(self.runner.run_agent("tell me about sleep")), lambda: asyncio.run(consume())):
+                self.calls.clear()
+                self.assertEqual(run(), "p1 p2 p3 ")
+                third = self.calls[2]['messages']
+                assistant = [m['content'] for m in third if m['role'] == 'assistant']
+                self.assertEqual(assistant, ["p1 p2 "])
+                self.assertEqual(len(third), 3)
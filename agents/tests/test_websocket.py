@@ -0,0 +1,181 @@
+"""
+WebSocket chat transport: one authentication, many multiplexed turns,
+per-connection limits.
+"""
+import asyncio
+import json
+import uuid
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from agents.models import AgentSession, Message, User
+from agents.services.orchestrator import orchestrator
+from agents.tests.test_fan_out import FakeRunner
+from api.websocket import chat_socket
+
+INTENT = {'primary_agent': 'study_agent', 'confidence': 0.9}
+
+
+class Socket:
+    """Drives the ASGI app like a WebSocket server would."""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def open(self, token, **auth):
+        scope = {'type': 'websocket', 'path': '/ws/chat/', 'headers': []}
+        self.task = asyncio.create_task(chat_socket(scope, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({'type': 'websocket.connect'})
+        assert (await self.outgoing.get())['type'] == 'websocket.accept'
+        await self.send({'type': 'auth', 'token': token, **auth})
+
+    async def send(self, frame):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(frame)})
+
+    async def frame(self):
+        message = await asyncio.wait_for(self.outgoing.get(), 5)
+        if message['type'] == 'websocket.close':
+            return message
+        return json.loads(message['text'])
+
+    async def until_done(self, turns):
+        """Frames grouped by turn until every turn in *turns* is done."""
+        frames, pending = {}, set(turns)
+        while pending:
+            frame = await self.frame()
+            frames.setdefault(frame.get('turn'), []).append(frame)
+            if frame.get('type') == 'done':
+                pending.discard(frame['turn'])
+        return frames
+
+    async def close(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+class ChatSocketTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="socket@test.com", password="testpass123")
+        self.token = str(AccessToken.for_user(self.user))
+        self.session = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+        self.runner = FakeRunner("## Your week", delay=0.05, parts=3)
+        patches = [
+            mock.patch.dict(orchestrator.agents, {'study_agent': self.runner}),
+            mock.patch(
+                'agents.services.orchestrator.intent_classifier.classify_intent',
+                mock.AsyncMock(return_value=INTENT),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_turns_are_multiplexed_on_one_connection(self):
+        other = AgentSession.objects.create(
+            user=self.user, session_id=str(uuid.uuid4()), agent_type='orchestrator'
+        )
+
+        async def run():
+            socket = Socket()
+            await socket.open(self.token)
+            self.assertEqual((await socket.frame())['type'], 'ready')
+            await socket.send({'type': 'chat', 'turn': 'a', 'message': "Plan my week", 'session_id': self.session.session_id})
+            await socket.send({'type': 'chat', 'turn': 'b', 'message': "Plan my exams", 'session_id': other.session_id})
+            frames = await socket.until_done({'a', 'b'})
+            await socket.close()
+            return frames
+
+        frames = async_to_sync(run)()
+        for turn in ('a', 'b'):
+            types = [f['type'] for f in frames[turn]]
+            self.assertEqual(types[0], 'agent_selected')
+            self.assertEqual(types[-1], 'done')
+            self.assertEqual(''.join(f['content'] for f in frames[turn] if f['type'] == 'chunk'), "## Your week")
+        self.assertEqual(len(self.runner.contexts), 2)
+        self.assertEqual(Message.objects.filter(session=other, role='agent').count(), 1)
+
+    def test_compact_framing_batches_chunks(self):
+        async def run():
+            socket = Socket()
+            await socket.open(self.token, framing='compact')
+            ready = await socket.frame()
+            await socket.send({'type': 'chat', 'turn': 'a', 'message': "Plan my week", 'session_id': self.session.session_id})
+            frames = await socket.until_done({'a'})
+            await socket.close()
+            return ready, frames['a']
+
+        ready, frames = async_to_sync(run)()
+        self.assertEqual(ready['framing'], 'compact')
+        chunks = [f['content'] for f in frames if f['type'] == 'chunk']
+        self.assertEqual(''.join(chunks), "## Your week")
+        self.assertLess(len(chunks), 4)
+
+    def test_db_connections_recycled_and_sessions_revalidated(self):
+        async def run():
+            socket = Socket()
+            await socket.open(self.token)
+            await socket.frame()  # ready
+            await socket.send({'type': 'chat', 'turn': 'a', 'message': "Plan my week", 'session_id': self.session.session_id})
+            await socket.until_done({'a'})
+            # Deleted over REST while the socket stays open
+            await sync_to_async(AgentSession.objects.filter(pk=self.session.pk).delete)()
+            await socket.send({'type': 'chat', 'turn': 'b', 'message': "Plan my exams", 'session_id': self.session.session_id})
+            frames = await socket.until_done({'b'})
+            await socket.close()
+            return frames['b']
+
+        with mock.patch('api.websocket.close_old_connections') as close_old:
+            frames = async_to_sync(run)()
+        # Before and after each turn
+        self.assertEqual(close_old.call_count, 4)
+        self.assertEqual(frames[0]['code'], 'session_not_found')
+        self.assertEqual(len(self.runner.contexts), 1)
+
+    def test_invalid_token_closes(self):
+        async def run():
+            socket = Socket()
+            await socket.open("not-a-token")
+            return await socket.frame()
+
+        self.assertEqual(async_to_sync(run)(), {'type': 'websocket.close', 'code': 4401, 'reason': 'Invalid token'})
+
+    def test_turn_limit_and_bad_requests(self):
+        async def run():
+            socket = Socket()
+            await socket.open(self.token)
+            await socket.frame()  # ready
+            await socket.send({'type': 'chat', 'turn': 'a', 'message': "Plan my week", 'session_id': self.session.session_id})
+            await socket.send({'type': 'chat', 'turn': 'b', 'message': "Plan my exams", 'session_id': self.session.session_id})
+            await socket.send({'type': 'chat', 'turn': 'c', 'message': "Hi", 'session_id': 'missing'})
+            frames = await socket.until_done({'a'})
+            await socket.close()
+            return frames
+
+        with mock.patch('api.websocket.MAX_TURNS', 1):
+            frames = async_to_sync(run)()
+        self.assertEqual(frames['b'], [mock.ANY])
+        self.assertEqual(frames['b'][0]['code'], 'too_many_turns')
+        self.assertEqual(frames['c'][0]['code'], 'too_many_turns')
+        self.assertEqual(len(self.runner.contexts), 1)
+
+    def test_disconnected_turn_still_completes(self):
+        async def run():
+            socket = Socket()
+            await socket.open(self.token)
+            await socket.frame()  # ready
+            await socket.send({'type': 'chat', 'turn': 'a', 'message': "Plan my week", 'session_id': self.session.session_id})
+            await socket.frame()  # agent_selected
+            await socket.close()
+            await asyncio.sleep(0.3)
+
+        async_to_sync(run)()
+        reply = Message.objects.get(session=self.session, role='agent')
+        self.assertEqual(reply.content, "## Your week")
@@ -8,7 +8,7 @@ class ChatMessageSerializer(serializers.Serializer):
     force_agent = serializers.ChoiceField(
         required=False,
         allow_null=True,
-        choices=['meal_planner_agent', 'productivity_agent', 'study_agent', 'wellness_agent']
+        choices=['meal_planner_agent', 'productivity_agent', 'study_agent', 'wellness_agent', 'knowledge_agent']
     )
 
 
@@ -17,6 +17,9 @@ class ChatResponseSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     response = serializers.JSONField(required=False)
     agent = serializers.CharField(required=False)
+    agents = serializers.JSONField(required=False)
+    model = serializers.CharField(required=False)
+    coalesced = serializers.BooleanField(required=False)
     intent_classification = serializers.JSONField(required=False)
     session_id = serializers.CharField(required=False)
     error = serializers.CharField(required=False)
@@ -1,16 +1,29 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.http import StreamingHttpResponse
-from agents.models import AgentSession, MealPlan, Task, StudySession, WellnessActivity
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Substr
+from agents.models import AgentSession, Message
 from agents.services.orchestrator import orchestrator
+from agents.services import llm_resilience
+from agents.services.llm_admission import LLMSaturated, llm_admission
+from agents.services.model_router import model_router
+from agents.services.prompt_cache import prompt_prefixes
+from agents.services.single_flight import parse_event_id, single_flight
+from agents.services.stream_framing import encode_sse, frame_events, negotiate
+from agents.services.token_budget import token_budget
 from .orchestrator_serializers import ChatMessageSerializer, ChatResponseSerializer
+from .pagination import InvalidCursor, encode_cursor, paginate_keyset, parse_page_size
+from agents.services.session_artifacts import get_session_artifacts
+from agents.services.message_search import search_messages
 from .serializers import (
     MealPlanSerializer, 
     TaskSerializer, 
     StudySessionSerializer, 
-    WellnessActivitySerializer
+    WellnessActivitySerializer,
+    HabitSerializer
 )
 import asyncio
 import json
@@ -18,6 +31,40 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Characters of the latest message shown in the session sidebar
+SESSION_PREVIEW_LENGTH = 120
+
+# Message history page sizes (one page = one (session, created_at) range scan)
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+# Search result page sizes
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_QUERY_LENGTH = 200
+
+# Saved-items endpoint: serializer per session_artifacts type
+ARTIFACT_SERIALIZERS = {
+    'meal_plans': MealPlanSerializer,
+    'tasks': TaskSerializer,
+    'study_sessions': StudySessionSerializer,
+    'wellness_activities': WellnessActivitySerializer,
+    'habits': HabitSerializer,
+}
+
+
+def _saturated_response(exc: LLMSaturated) -> Response:
+    """429 for a chat turn turned away by LLM admission control."""
+    response = Response({
+        'success': False,
+        'error': str(exc),
+        'code': 'saturated',
+        'reason': exc.reason,
+        'retry_after': exc.retry_after,
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -47,6 +94,12 @@ def chat(request):
                 'error': 'Session not found or does not belong to user'
             }, status=status.HTTP_404_NOT_FOUND)
     
+    # Fail fast when this turn could not get an LLM slot anyway
+    try:
+        llm_admission.precheck(request.user)
+    except LLMSaturated as e:
+        return _saturated_response(e)
+    
     # Process message through orchestrator
     try:
         # Note: In a real Django view, we should use a wrapper to run the async orchestrator
@@ -67,6 +120,8 @@ def chat(request):
         response_serializer = ChatResponseSerializer(result)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
         
+    except LLMSaturated as e:
+        return _saturated_response(e)
     except Exception as e:
         import traceback
         return Response({
@@ -76,38 +131,18 @@ def chat(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def chat_stream(request):
+def _stream_framing(request) -> str:
+    """Framing the client asked for (``X-Stream-Framing`` or ``?framing=``); see stream_framing."""
+    return negotiate(request.headers.get('X-Stream-Framing') or request.query_params.get('framing'))
+
+
+def _sse_response(make_events, framing='json', status_code=200) -> StreamingHttpResponse:
     """
-    Stream agent responses in real-time using Server-Sent Events (SSE)
+    Serve the async event iterator returned by ``make_events()`` as
+    Server-Sent Events in *framing*.  Events with an ``id`` (resumable
+    streams) get an SSE ``id:`` line, which clients echo back as
+    ``Last-Event-ID``.
     """
-    serializer = ChatMessageSerializer(data=request.data)
-    
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
-    message = serializer.validated_data['message']
-    session_id = serializer.validated_data.get('session_id')
-    force_agent = serializer.validated_data.get('force_agent')
-    
-    # Get or create session
-    session = None
-    if session_id:
-        try:
-            session = AgentSession.objects.get(
-                session_id=session_id,
-                user=request.user
-            )
-        except AgentSession.DoesNotExist:
-            def error_stream():
-                yield f"data: {json.dumps({'error': 'Session not found'})}\n\n"
-            return StreamingHttpResponse(
-                error_stream(),
-                content_type='text/event-stream',
-                status=404
-            )
-    
     def event_stream():
         """Generator function for SSE streaming"""
         import queue
@@ -124,12 +159,7 @@ def chat_stream(request):
             
             async def collect():
                 try:
-                    async for chunk in orchestrator.process_message_stream(
-                        message=message,
-                        user=request.user,
-                        session=session,
-                        force_agent=force_agent
-                    ):
+                    async for chunk in frame_events(make_events(), framing):
                         q.put(('data', chunk))
                 except Exception as e:
                     import traceback
@@ -162,7 +192,7 @@ def chat_stream(request):
                 msg_type, data = item
                 
                 if msg_type == 'data':
-                    yield f"data: {json.dumps(data)}\n\n"
+                    yield encode_sse(data, framing)
                 elif msg_type == 'error':
                     yield f"data: {json.dumps({'error': data, 'type': 'error'})}\n\n"
                     break
@@ -174,13 +204,105 @@ def chat_stream(request):
     
     response = StreamingHttpResponse(
         event_stream(),
-        content_type='text/event-stream'
+        content_type='text/event-stream',
+        status=status_code
     )
     response['Cache-Control'] = 'no-cache'
     response['X-Accel-Buffering'] = 'no'
+    response['X-Stream-Framing'] = framing
     return response
 
 
+def _resume_stream(request, stream_id, after=-1):
+    """
+    Replay a live or recently finished stream after sequence number
+    *after* and follow it live; 410 when it has expired (or isn't this
+    user's).
+    """
+    flight = single_flight.lookup(stream_id, owner=request.user.pk)
+    if flight is None:
+        return Response({
+            'error': 'Stream expired or not found; reload the session messages',
+            'code': 'stream_gone',
+        }, status=status.HTTP_410_GONE)
+    return _sse_response(lambda: flight.follow(after=after), _stream_framing(request))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chat_stream(request):
+    """
+    Stream agent responses in real-time using Server-Sent Events (SSE).
+    
+    A client that lost the connection re-sends the request with a
+    ``Last-Event-ID`` header (the last ``id:`` it received): the stream is
+    replayed from there and continues live, without a new generation.
+    ``X-Stream-Framing: compact`` batches chunks (see stream_framing).
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+    if last_event_id:
+        parsed = parse_event_id(last_event_id)
+        if parsed is None:
+            return Response({'error': 'Malformed Last-Event-ID'}, status=status.HTTP_400_BAD_REQUEST)
+        return _resume_stream(request, *parsed)
+    
+    serializer = ChatMessageSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id')
+    force_agent = serializer.validated_data.get('force_agent')
+    
+    # Get or create session
+    session = None
+    if session_id:
+        try:
+            session = AgentSession.objects.get(
+                session_id=session_id,
+                user=request.user
+            )
+        except AgentSession.DoesNotExist:
+            def error_stream():
+                yield f"data: {json.dumps({'error': 'Session not found'})}\n\n"
+            return StreamingHttpResponse(
+                error_stream(),
+                content_type='text/event-stream',
+                status=404
+            )
+    
+    try:
+        llm_admission.precheck(request.user)
+    except LLMSaturated as e:
+        return _saturated_response(e)
+    
+    return _sse_response(lambda: orchestrator.process_message_stream(
+        message=message,
+        user=request.user,
+        session=session,
+        force_agent=force_agent
+    ), _stream_framing(request))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_stream_resume(request, stream_id):
+    """
+    Resume a stream (EventSource-friendly): replays events after the
+    ``Last-Event-ID`` header or ``?last_event_id=`` (a full id or just the
+    sequence number), from the start if neither is given, then follows it
+    live.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    if not last_event_id:
+        return _resume_stream(request, stream_id)
+    parsed = parse_event_id(last_event_id if ':' in last_event_id else f"{stream_id}:{last_event_id}")
+    if parsed is None or parsed[0] != stream_id:
+        return Response({'error': 'Last-Event-ID does not belong to this stream'}, status=status.HTTP_400_BAD_REQUEST)
+    return _resume_stream(request, *parsed)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_available_agents(request):
@@ -193,34 +315,94 @@ def get_available_agents(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_llm_status(request):
+    """
+    LLM admission control (slots in flight, queue depth, wait-time
+    percentiles, rejections), per-model circuit breakers and latency
+    histograms, model routing decisions, max_tokens budgets and cacheable
+    prompt-prefix sizes per agent, and coalesced duplicate turns (staff only).
+    """
+    return Response({
+        'admission': llm_admission.snapshot(),
+        'models': llm_resilience.snapshot(),
+        'routing': model_router.snapshot(),
+        'token_budgets': token_budget.snapshot(),
+        'prompt_prefixes': prompt_prefixes.snapshot(),
+        'coalescing': single_flight.snapshot(),
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_sessions(request):
     """
-    Get all sessions for the current user
+    Get the current user's sessions, most recently active first.
+
+    Keyset-paginated on ``(updated_at, id)``: pass ``?cursor=<next_cursor>``
+    from the previous page and optionally ``?limit=`` (max 100).  Counts and
+    last-activity come from the denormalized AgentSession columns; only the
+    preview needs a (session, created_at) lookup.
     """
+    limit = parse_page_size(request)
+    cursor = request.query_params.get('cursor')
+    
+    last_message = Message.objects.filter(
+        session=OuterRef('pk')
+    ).order_by('-created_at', '-id')
+    
     sessions = AgentSession.objects.filter(
         user=request.user
-    ).order_by('-updated_at')
+    ).annotate(
+        last_message_preview=Substr(
+            Subquery(last_message.values('content')[:1]), 1, SESSION_PREVIEW_LENGTH
+        ),
+        last_message_role=Subquery(last_message.values('role')[:1]),
+    )
     
-    session_data = []
-    for session in sessions:
-        session_data.append({
+    try:
+        page, next_cursor = paginate_keyset(sessions, 'updated_at', limit, cursor)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    session_data = [
+        {
             'session_id': session.session_id,
             'agent_type': session.agent_type,
             'created_at': session.created_at.isoformat(),
             'updated_at': session.updated_at.isoformat(),
-            'message_count': session.messages.count()
-        })
+            'message_count': session.message_count,
+            'last_message_at': session.last_message_at.isoformat() if session.last_message_at else None,
+            'last_agent_type': session.last_agent_type,
+            'last_message_preview': session.last_message_preview,
+            'last_message_role': session.last_message_role,
+        }
+        for session in page
+    ]
     
-    return Response(session_data, status=status.HTTP_200_OK)
+    return Response({
+        'results': session_data,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_session_messages(request, session_id):
     """
-    Get all messages for a specific session
+    Get messages for a specific session, keyset-paginated on ``(created_at, id)``.
+
+    Results are always in chronological order.
+
+    - No cursor: the latest ``limit`` messages (default 50, max 200).
+    - ``?before=<previous_cursor>``: the page of older messages.
+    - ``?after=<latest_cursor>``: only messages newer than the cursor, for
+      incremental refresh after a reconnect or poll.
+
+    ``latest_cursor`` always points at the newest message seen, so it stays
+    valid for ``?after=`` polling while older pages are being loaded.
     """
     try:
         session = AgentSession.objects.get(
@@ -232,19 +414,105 @@ def get_session_messages(request, session_id):
             'error': 'Session not found or does not belong to user'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    messages = session.messages.all().order_by('created_at')
+    limit = parse_page_size(request, default=MESSAGE_PAGE_SIZE, maximum=MAX_MESSAGE_PAGE_SIZE)
+    before = request.query_params.get('before')
+    after = request.query_params.get('after')
+    if before and after:
+        return Response({
+            'error': 'Pass either before or after, not both'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    messages = Message.objects.filter(session=session)
+    previous_cursor = next_cursor = None
+    try:
+        if after:
+            page, next_cursor = paginate_keyset(
+                messages, 'created_at', limit, after, descending=False
+            )
+        else:
+            page, previous_cursor = paginate_keyset(
+                messages, 'created_at', limit, before, descending=True
+            )
+            page.reverse()
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if before:
+        # An older page: the session's newest message is not on it
+        newest = messages.order_by('-created_at', '-id').values_list('created_at', 'id').first()
+        latest_cursor = encode_cursor(*newest) if newest else None
+    elif page:
+        latest_cursor = encode_cursor(page[-1].created_at, page[-1].pk)
+    else:
+        latest_cursor = after
     
     message_data = [
         {
+            'id': msg.id,
             'role': msg.role,
             'content': msg.content,
             'metadata': msg.metadata,
             'created_at': msg.created_at.isoformat()
         }
-        for msg in messages
+        for msg in page
+    ]
+    
+    return Response({
+        'results': message_data,
+        'previous_cursor': previous_cursor,
+        'next_cursor': next_cursor,
+        'latest_cursor': latest_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_user_messages(request):
+    """
+    Full-text search over the current user's conversation history.
+
+    Query params: ``q`` (required), ``session_id`` (optional, one session),
+    ``limit`` (default 20, max 50) and ``offset``.  Results are ranked best
+    match first; ``snippet`` is HTML-escaped text with matched words wrapped
+    in ``<mark>``, safe to render as HTML.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        return Response({
+            'error': f'q must be at most {MAX_SEARCH_QUERY_LENGTH} characters'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    limit = parse_page_size(request, default=SEARCH_PAGE_SIZE, maximum=MAX_SEARCH_PAGE_SIZE)
+    try:
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+    except (TypeError, ValueError):
+        offset = 0
+    
+    found = search_messages(
+        request.user,
+        query,
+        limit=limit,
+        offset=offset,
+        session_id=request.query_params.get('session_id') or None,
+    )
+    
+    results = [
+        {
+            **hit,
+            'created_at': hit['created_at'].isoformat() if hit['created_at'] else None,
+        }
+        for hit in found['results']
     ]
     
-    return Response(message_data, status=status.HTTP_200_OK)
+    return Response({
+        'query': query,
+        'results': results,
+        'has_more': found['has_more'],
+        'next_offset': offset + len(results) if found['has_more'] else None,
+        'backend': found['backend'],
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -415,10 +683,15 @@ def delete_session(request, session_id):
 def get_session_saved_items(request, session_id):
     """
     Get all items saved from a specific agent session
-    Returns meal plans, tasks, study sessions, and wellness activities
+    Returns meal plans, tasks, study sessions, wellness activities and habits
+
+    Optional query params:
+    - ``types``: comma-separated subset, e.g. ``tasks,habits``
+    - ``limit``: page size per type (default: everything)
+    - ``<type>_offset``: per-type offset, e.g. ``tasks_offset=20``
     """
     try:
-        session = AgentSession.objects.get(
+        session = AgentSession.objects.select_related('user__profile').get(
             session_id=session_id,
             user=request.user
         )
@@ -427,24 +700,28 @@ def get_session_saved_items(request, session_id):
             'error': 'Session not found or does not belong to user'
         }, status=status.HTTP_404_NOT_FOUND)
     
-    # Gather all related items
-    meal_plans = MealPlan.objects.filter(session=session)
-    tasks = Task.objects.filter(session=session)
-    study_sessions = StudySession.objects.filter(session=session)
-    wellness_activities = WellnessActivity.objects.filter(session=session)
+    types = request.query_params.get('types')
+    types = [t.strip() for t in types.split(',')] if types else None
+    limit = None
+    if request.query_params.get('limit'):
+        limit = parse_page_size(request)
+    offsets = {}
+    for artifact_type in ARTIFACT_SERIALIZERS:
+        raw = request.query_params.get(f'{artifact_type}_offset')
+        if raw and raw.isdigit():
+            offsets[artifact_type] = int(raw)
+    
+    artifacts = get_session_artifacts(
+        session, types=types, limit=limit, offsets=offsets, with_habit_status=True
+    )
     
     return Response({
         'session_id': session_id,
         'saved_items': {
-            'meal_plans': MealPlanSerializer(meal_plans, many=True).data,
-            'tasks': TaskSerializer(tasks, many=True).data,
-            'study_sessions': StudySessionSerializer(study_sessions, many=True).data,
-            'wellness_activities': WellnessActivitySerializer(wellness_activities, many=True).data,
+            artifact_type: ARTIFACT_SERIALIZERS[artifact_type](page['items'], many=True).data
+            for artifact_type, page in artifacts.items()
         },
-        'total_count': (
-            meal_plans.count() + 
-            tasks.count() + 
-            study_sessions.count() + 
-            wellness_activities.count()
-        )
+        'counts': {artifact_type: page['total'] for artifact_type, page in artifacts.items()},
+        'has_more': {artifact_type: page['has_more'] for artifact_type, page in artifacts.items()},
+        'total_count': sum(page['total'] for page in artifacts.values()),
     }, status=status.HTTP_200_OK)
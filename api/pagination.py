@@ -0,0 +1,78 @@
+"""
+Keyset (cursor) pagination helpers for the function-based history endpoints.
+
+Offset pagination gets slower the deeper a user scrolls and skips/duplicates
+rows when new messages arrive between page loads.  These helpers page on a
+``(timestamp, id)`` tuple instead, so every page is a single index range
+scan regardless of how much history precedes it.
+
+Cursors are opaque URL-safe strings encoding ``<isoformat>|<pk>``.
+"""
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(value: datetime, pk: int) -> str:
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from exc
+
+
+def parse_page_size(request, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Read ``?limit=`` from the request, clamped to ``[1, maximum]``."""
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def keyset_filter(field: str, cursor: str, descending: bool) -> Q:
+    """
+    Build the ``WHERE`` clause for rows strictly after *cursor* in
+    ``(field, id)`` order — e.g. for descending order:
+    ``field < v OR (field = v AND id < pk)``.
+    """
+    value, pk = decode_cursor(cursor)
+    op = 'lt' if descending else 'gt'
+    return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+
+
+def paginate_keyset(queryset, field: str, limit: int, cursor: str | None = None, descending: bool = True):
+    """
+    Return ``(rows, next_cursor)`` for one page of *queryset* ordered by
+    ``(field, id)``.  Fetches ``limit + 1`` rows to detect a further page
+    without a COUNT query.
+    """
+    prefix = '-' if descending else ''
+    if cursor:
+        queryset = queryset.filter(keyset_filter(field, cursor, descending))
+    rows = list(queryset.order_by(f'{prefix}{field}', f'{prefix}id')[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows, next_cursor
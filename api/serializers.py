@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from agents.services.user_time import user_local_today
 from agents.models import (
     AgentSession, 
     Message, 
@@ -18,11 +19,16 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class AgentSessionSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
-    
+    # Messages are intentionally not nested: load them page by page from
+    # /api/sessions/<session_id>/messages/ instead.
     class Meta:
         model = AgentSession
-        fields = ['id', 'session_id', 'agent_type', 'created_at', 'updated_at', 'messages']
+        fields = [
+            'id', 'session_id', 'agent_type',
+            'message_count', 'last_message_at', 'last_agent_type',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = ['message_count', 'last_message_at', 'last_agent_type']
 
 
 class MealPlanSerializer(serializers.ModelSerializer):
@@ -180,5 +186,9 @@ class HabitSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'current_streak', 'best_streak', 'total_completions', 'created_at', 'updated_at']
     
     def get_completed_today(self, obj):
-        from datetime import date
-        return obj.logs.filter(date=date.today(), completed=True).exists()
\ No newline at end of file
+        # Annotated by HabitViewSet.get_queryset to avoid a query per habit
+        annotated = getattr(obj, 'completed_today_flag', None)
+        if annotated is not None:
+            return annotated
+        today = self.context.get('today') or user_local_today(obj.user)
+        return obj.logs.filter(date=today, completed=True).exists()
\ No newline at end of file
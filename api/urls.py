@@ -25,10 +25,13 @@ urlpatterns = [
     # Orchestrator endpoints
     path('chat/', orchestrator_views.chat, name='chat'),
     path('chat/stream/', orchestrator_views.chat_stream, name='chat-stream'),
+    path('chat/stream/<str:stream_id>/', orchestrator_views.chat_stream_resume, name='chat-stream-resume'),
     path('agents/', orchestrator_views.get_available_agents, name='available-agents'),
+    path('llm/status/', orchestrator_views.get_llm_status, name='llm-status'),
     path('my-sessions/', orchestrator_views.get_user_sessions, name='user-sessions'),
     path('sessions/<str:session_id>/messages/', orchestrator_views.get_session_messages, name='session-messages'),
     path('sessions/<str:session_id>/delete/', orchestrator_views.delete_session, name='delete-session'),
+    path('search/', orchestrator_views.search_user_messages, name='search-messages'),
     
     # Save agent data endpoints
     path('save-agent-response/', orchestrator_views.save_agent_response, name='save-agent-response'),
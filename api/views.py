@@ -2,6 +2,9 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
 from agents.models import (
     AgentSession, 
     Message, 
@@ -23,6 +26,9 @@ from .serializers import (
     HabitLogSerializer
 )
 from agents.services.orchestrator import orchestrator
+from agents.services.user_time import user_local_today
+from agents.services import knowledge_index
+from agents.services.message_store import record_message
 from asgiref.sync import async_to_sync
 import uuid
 import logging
@@ -51,7 +57,7 @@ class AgentSessionViewSet(viewsets.ModelViewSet):
             )
         
         # Create user message
-        user_message = Message.objects.create(
+        user_message = record_message(
             session=session,
             role='user',
             content=content
@@ -94,6 +100,12 @@ class MessageViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Message.objects.filter(session__user=self.request.user).order_by('created_at')
 
+    def perform_destroy(self, instance):
+        """Delete the message and its knowledge document (messages have no delete receiver)."""
+        with transaction.atomic():
+            knowledge_index.remove_instance(instance)
+            instance.delete()
+
 
 class MealPlanViewSet(viewsets.ModelViewSet):
     """ViewSet for managing meal plans with enhanced save-to-agent logic"""
@@ -334,12 +346,31 @@ class HabitViewSet(viewsets.ModelViewSet):
     serializer_class = HabitSerializer
     permission_classes = [IsAuthenticated]
     
+    def get_local_today(self):
+        """The requesting user's calendar date (per UserProfile.timezone)."""
+        if not hasattr(self, '_local_today'):
+            self._local_today = user_local_today(self.request.user)
+        return self._local_today
+    
     def get_queryset(self):
         qs = Habit.objects.filter(user=self.request.user, is_active=True)
         category = self.request.query_params.get('category')
         if category:
             qs = qs.filter(category=category)
-        return qs
+        # Resolve completed_today in the same query (uses the habit/date index)
+        return qs.annotate(
+            completed_today_flag=Exists(
+                HabitLog.objects.filter(
+                    habit=OuterRef('pk'), date=self.get_local_today(), completed=True
+                )
+            )
+        )
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request and self.request.user.is_authenticated:
+            context['today'] = self.get_local_today()
+        return context
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -347,30 +378,30 @@ class HabitViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def toggle_today(self, request, pk=None):
         """Toggle habit completion for today. One-click endpoint."""
-        from datetime import date, datetime
-        
         habit = self.get_object()
-        today = date.today()
+        today = self.get_local_today()
+        now = timezone.now()
         
         log, created = HabitLog.objects.get_or_create(
             habit=habit,
             date=today,
-            defaults={'completed': True, 'completed_at': datetime.now(), 'count': 1}
+            defaults={'completed': True, 'completed_at': now, 'count': 1}
         )
         
         if not created:
             log.completed = not log.completed
-            log.completed_at = datetime.now() if log.completed else None
+            log.completed_at = now if log.completed else None
             log.count = 1 if log.completed else 0
             log.save()
         
         # Update streak and total completions
-        habit.calculate_streak()
+        habit.calculate_streak(today=today)
         habit.total_completions = habit.logs.filter(completed=True).count()
         habit.save(update_fields=['total_completions'])
         
         return Response({
             'completed': log.completed,
+            'date': str(today),
             'current_streak': habit.current_streak,
             'best_streak': habit.best_streak,
             'total_completions': habit.total_completions,
@@ -379,14 +410,18 @@ class HabitViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def daily_digest(self, request):
         """Get today's habit summary: which habits are due, which are done."""
-        from datetime import date
+        today = self.get_local_today()
+        habits = list(self.get_queryset())
         
-        today = date.today()
-        habits = self.get_queryset()
+        # Single query for today's logs across all habits (habit/date index)
+        logs_by_habit = {
+            log.habit_id: log
+            for log in HabitLog.objects.filter(habit__in=habits, date=today)
+        }
         
         digest = []
         for habit in habits:
-            log = habit.logs.filter(date=today).first()
+            log = logs_by_habit.get(habit.id)
             digest.append({
                 'id': habit.id,
                 'name': habit.name,
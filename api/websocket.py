@@ -0,0 +1,321 @@
+"""
+WebSocket chat transport (``/ws/chat/``), served by ``lifeos.asgi``.
+
+Every ``POST /api/chat/stream/`` repeats JWT authentication, the session
+lookup and a new connection.  A WebSocket authenticates once and then
+carries any number of turns, for any of the user's sessions, concurrently.
+
+Protocol (JSON text frames):
+
+Client -> server::
+
+    {"type": "auth", "token": "<JWT>", "framing": "msgpack,compact"}   first frame, within WS_AUTH_TIMEOUT
+    {"type": "chat", "turn": "t1", "message": "...", "session_id": "...", "force_agent": null}
+    {"type": "resume", "turn": "t1", "last_event_id": "<stream_id>:<seq>"}
+    {"type": "cancel", "turn": "t1"}
+    {"type": "ping"}
+
+``framing`` is optional (see agents.services.stream_framing); ``ready``
+reports the one chosen.  With ``msgpack`` the server sends binary frames
+and also accepts them.
+
+Server -> client: ``ready`` after authentication, then the stream events of
+each turn (``agent_selected``, ``chunk``, ``resync``, ``actions_applied``,
+``error``) tagged with the client's ``turn`` id and closed by a ``done``
+frame; ``pong``; ``error`` frames with a ``code`` for rejected requests.
+
+Limits per connection: ``WS_MAX_TURNS`` concurrent turns, frames up to
+``WS_MAX_FRAME_BYTES``, and ``WS_SEND_QUEUE`` outgoing frames.  When the
+queue is full the turn producing events waits, so a slow client slows its
+own generations instead of growing server memory.  On disconnect the
+turns still finish (their replies are saved and resumable, as with SSE);
+only ``cancel`` stops one.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from agents.models import AgentSession
+from agents.services.llm_admission import LLMSaturated, llm_admission
+from agents.services.orchestrator import orchestrator
+from agents.services.single_flight import parse_event_id, single_flight
+from agents.services.stream_framing import encode_ws, frame_events, msgpack, negotiate
+from .orchestrator_serializers import ChatMessageSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_TURNS = int(getattr(settings, 'WS_MAX_TURNS', 4))
+SEND_QUEUE = int(getattr(settings, 'WS_SEND_QUEUE', 256))
+MAX_FRAME_BYTES = int(getattr(settings, 'WS_MAX_FRAME_BYTES', 16384))
+AUTH_TIMEOUT = float(getattr(settings, 'WS_AUTH_TIMEOUT', 10))
+# session_id -> pk of sessions already checked to be the user's
+MAX_CACHED_SESSIONS = 64
+
+# Close codes
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_TOO_BIG = 1009
+
+# Turns outlive their connection; keep them referenced until they finish
+_orphaned_turns = set()
+
+
+class ChatConnection:
+    """One authenticated socket and the turns running on it."""
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.user = None
+        self.token_expires: Optional[float] = None
+        self.framing = 'json'
+        self.turns: Dict[str, asyncio.Task] = {}
+        self.sessions: OrderedDict = OrderedDict()  # session_id -> pk
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE)
+        self.closed = False
+
+    async def run(self) -> None:
+        event = await self.receive()
+        if event['type'] != 'websocket.connect':
+            return
+        await self.send({'type': 'websocket.accept'})
+        sender = asyncio.create_task(self._sender())
+        try:
+            if not await self._authenticate():
+                return
+            await self._emit({
+                'type': 'ready', 'user_id': self.user.pk, 'max_turns': MAX_TURNS, 'framing': self.framing,
+            })
+            while not self.closed:
+                event = await self.receive()
+                if event['type'] == 'websocket.disconnect':
+                    break
+                frame = await self._decode(event)
+                if frame is not None:
+                    await self._dispatch(frame)
+        finally:
+            self._close()
+            sender.cancel()
+            for task in self.turns.values():
+                _orphaned_turns.add(task)
+                task.add_done_callback(_orphaned_turns.discard)
+
+    # Framing
+
+    async def _sender(self) -> None:
+        try:
+            while True:
+                frame = await self.outbox.get()
+                await self.send(encode_ws(frame, self.framing))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed, dropping connection: {e}")
+            self._close()
+
+    async def _emit(self, frame: Dict[str, Any]) -> None:
+        """Queue *frame* for the client; waits while the queue is full."""
+        if not self.closed:
+            await self.outbox.put(frame)
+
+    def _close(self) -> None:
+        self.closed = True
+        # Unblock producers waiting on a full queue; later emits are dropped
+        while not self.outbox.empty():
+            self.outbox.get_nowait()
+
+    async def _close_with(self, code: int, reason: str) -> None:
+        self._close()
+        try:
+            await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+        except Exception:
+            pass  # already gone
+
+    async def _decode(self, event) -> Optional[Dict[str, Any]]:
+        raw = event.get('text')
+        if raw is None:
+            raw = event.get('bytes')
+        if raw is None:
+            return None
+        if len(raw) > MAX_FRAME_BYTES:
+            await self._close_with(CLOSE_TOO_BIG, 'Frame too large')
+            return None
+        try:
+            if isinstance(raw, bytes) and self.framing == 'msgpack':
+                frame = msgpack.unpackb(raw)
+            else:
+                frame = json.loads(raw)
+        except ValueError:
+            frame = None
+        if not isinstance(frame, dict):
+            await self._emit({'type': 'error', 'code': 'bad_frame', 'error': 'Frames must be JSON objects'})
+            return None
+        return frame
+
+    # Authentication
+
+    async def _authenticate(self) -> bool:
+        """Validate the JWT in the first frame; closes with 4401 if it isn't valid."""
+        try:
+            event = await asyncio.wait_for(self.receive(), AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self._close_with(CLOSE_UNAUTHORIZED, 'Authentication timeout')
+            return False
+        if event['type'] == 'websocket.disconnect':
+            return False
+        frame = await self._decode(event)
+        if self.closed:
+            return False
+        if not frame or frame.get('type') != 'auth' or not frame.get('token'):
+            await self._close_with(CLOSE_UNAUTHORIZED, 'Expected an auth frame')
+            return False
+
+        authenticator = JWTAuthentication()
+        try:
+            token = authenticator.get_validated_token(frame['token'])
+            self.user = await sync_to_async(authenticator.get_user)(token)
+        except (InvalidToken, AuthenticationFailed) as e:
+            logger.info(f"WebSocket authentication failed: {e}")
+            await self._close_with(CLOSE_UNAUTHORIZED, 'Invalid token')
+            return False
+        self.token_expires = token.get('exp')
+        self.framing = negotiate(frame.get('framing'), binary=True)
+        return True
+
+    # Requests
+
+    async def _dispatch(self, frame: Dict[str, Any]) -> None:
+        kind = frame.get('type')
+        if kind == 'ping':
+            await self._emit({'type': 'pong'})
+            return
+        if kind not in ('chat', 'resume', 'cancel'):
+            await self._emit({'type': 'error', 'code': 'bad_frame', 'error': f"Unknown frame type: {kind}"})
+            return
+
+        turn = str(frame.get('turn') or uuid.uuid4().hex)
+        if kind == 'cancel':
+            task = self.turns.get(turn)
+            if task is not None:
+                task.cancel()
+            return
+        if self.token_expires is not None and time.time() >= self.token_expires:
+            await self._close_with(CLOSE_UNAUTHORIZED, 'Token expired')
+            return
+        if turn in self.turns:
+            await self._emit({'type': 'error', 'turn': turn, 'code': 'duplicate_turn', 'error': 'Turn already running'})
+            return
+        if len(self.turns) >= MAX_TURNS:
+            await self._emit({
+                'type': 'error', 'turn': turn, 'code': 'too_many_turns',
+                'error': f"At most {MAX_TURNS} turns can run at once on a connection",
+            })
+            return
+
+        handler = self._chat if kind == 'chat' else self._resume
+        task = asyncio.create_task(self._run_turn(turn, handler(turn, frame)))
+        self.turns[turn] = task
+        task.add_done_callback(lambda _: self.turns.pop(turn, None))
+
+    async def _run_turn(self, turn: str, work) -> None:
+        # Turns run outside Django's request cycle: recycle stale or broken
+        # DB connections around each one, as request_started/finished would
+        await sync_to_async(close_old_connections)()
+        try:
+            await work
+        except asyncio.CancelledError:
+            await self._emit({'type': 'done', 'turn': turn, 'cancelled': True})
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket turn {turn} failed: {e}", exc_info=True)
+            await self._emit({'type': 'error', 'turn': turn, 'error': str(e)})
+        finally:
+            await sync_to_async(close_old_connections)()
+        await self._emit({'type': 'done', 'turn': turn})
+
+    async def _chat(self, turn: str, frame: Dict[str, Any]) -> None:
+        serializer = ChatMessageSerializer(data=frame)
+        if not serializer.is_valid():
+            await self._emit({'type': 'error', 'turn': turn, 'code': 'invalid', 'errors': serializer.errors})
+            return
+        data = serializer.validated_data
+        try:
+            session = await self._session(data.get('session_id'))
+        except AgentSession.DoesNotExist:
+            await self._emit({'type': 'error', 'turn': turn, 'code': 'session_not_found', 'error': 'Session not found'})
+            return
+        try:
+            llm_admission.precheck(self.user)
+        except LLMSaturated as e:
+            await self._emit({
+                'type': 'error', 'turn': turn, 'code': 'saturated', 'error': str(e),
+                'reason': e.reason, 'retry_after': e.retry_after,
+            })
+            return
+
+        async for event in frame_events(orchestrator.process_message_stream(
+            message=data['message'],
+            user=self.user,
+            session=session,
+            force_agent=data.get('force_agent')
+        ), self.framing):
+            await self._emit({**event, 'turn': turn})
+
+    async def _resume(self, turn: str, frame: Dict[str, Any]) -> None:
+        """Replay a stream after ``last_event_id`` (e.g. after reconnecting) and follow it."""
+        parsed = parse_event_id(frame.get('last_event_id'))
+        flight = single_flight.lookup(parsed[0], owner=self.user.pk) if parsed else None
+        if flight is None:
+            await self._emit({
+                'type': 'error', 'turn': turn, 'code': 'stream_gone',
+                'error': 'Stream expired or not found; reload the session messages',
+            })
+            return
+        async for event in frame_events(flight.follow(after=parsed[1]), self.framing):
+            await self._emit({**event, 'turn': turn})
+
+    async def _session(self, session_id: Optional[str]) -> Optional[AgentSession]:
+        """
+        The user's session *session_id*, fetched fresh every turn (it may have
+        been deleted over REST); only the ownership check is remembered.
+        """
+        if not session_id:
+            return None
+        pk = self.sessions.get(session_id)
+        try:
+            if pk is None:
+                session = await sync_to_async(AgentSession.objects.get)(session_id=session_id, user=self.user)
+            else:
+                session = await sync_to_async(AgentSession.objects.get)(pk=pk)
+        except AgentSession.DoesNotExist:
+            self.sessions.pop(session_id, None)
+            raise
+        self.sessions[session_id] = session.pk
+        self.sessions.move_to_end(session_id)
+        if len(self.sessions) > MAX_CACHED_SESSIONS:
+            self.sessions.popitem(last=False)
+        return session
+
+
+async def chat_socket(scope, receive, send) -> None:
+    """ASGI application for ``/ws/chat/``."""
+    await ChatConnection(scope, receive, send).run()
+
+
+async def reject_socket(scope, receive, send) -> None:
+    """Refuse a WebSocket on any other path."""
+    event = await receive()
+    if event['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': 4404})
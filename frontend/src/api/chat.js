@@ -24,92 +24,153 @@ export const sendMessage = async (message, sessionId = null, forceAgent = null)
     });
 };
 
-export const streamChat = async ({ message, sessionId, onChunk, onAgentSelected, onActionsApplied, onError, onDone }) => {
-    const token = localStorage.getItem('lifeos_token');
+// Reconnect attempts after a dropped stream (resumed from the last event id)
+const STREAM_RESUME_ATTEMPTS = 3;
 
-    try {
-        // Prepare headers
-        const headers = {
-            'Content-Type': 'application/json',
-        };
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
 
-        // Add JWT token if available
-        if (token) {
-            headers['Authorization'] = `Bearer ${token}`;
-        }
+export const streamChat = async ({ message, sessionId, onChunk, onResync, onAgentSelected, onActionsApplied, onError, onDone }) => {
+    const token = localStorage.getItem('lifeos_token');
+    // Last SSE id received; sent back as Last-Event-ID to resume after a drop
+    let lastEventId = null;
+    let attempt = 0;
+
+    while (true) {
+        try {
+            // Prepare headers; compact framing batches chunks (same events, fewer bytes)
+            const headers = {
+                'Content-Type': 'application/json',
+                'X-Stream-Framing': 'compact',
+            };
+
+            // Add JWT token if available
+            if (token) {
+                headers['Authorization'] = `Bearer ${token}`;
+            }
 
-        // Add CSRF token for session authentication
-        const csrfToken = getCookie('csrftoken');
-        if (csrfToken) {
-            headers['X-CSRFToken'] = csrfToken;
-        }
+            // Add CSRF token for session authentication
+            const csrfToken = getCookie('csrftoken');
+            if (csrfToken) {
+                headers['X-CSRFToken'] = csrfToken;
+            }
 
-        const response = await fetch('/api/chat/stream/', {
-            method: 'POST',
-            headers: headers,
-            credentials: 'include', // Important for session auth
-            body: JSON.stringify({
-                message,
-                session_id: sessionId,
-            }),
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-        }
+            // Resuming: the server replays what we missed instead of starting a new turn
+            if (lastEventId) {
+                headers['Last-Event-ID'] = lastEventId;
+            }
 
-        const reader = response.body.getReader();
-        const decoder = new TextDecoder();
-        let buffer = '';
+            let response;
+            try {
+                response = await fetch('/api/chat/stream/', {
+                    method: 'POST',
+                    headers: headers,
+                    credentials: 'include', // Important for session auth
+                    body: JSON.stringify({
+                        message,
+                        session_id: sessionId,
+                    }),
+                });
+            } catch (networkError) {
+                networkError.retryable = true;
+                throw networkError;
+            }
 
-        while (true) {
-            const { done, value } = await reader.read();
-            if (done) {
-                if (onDone) onDone();
-                break;
+            if (response.status === 429) {
+                const retryAfter = response.headers.get('Retry-After') || 'a few';
+                throw new Error(`LifeOS is busy right now. Please try again in ${retryAfter} seconds.`);
+            }
+            if (response.status === 410) {
+                throw new Error('The connection was lost and the reply can no longer be resumed. Reload the conversation to see it.');
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
             }
 
-            buffer += decoder.decode(value, { stream: true });
-            const lines = buffer.split('\n');
-            buffer = lines.pop() || '';
-
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    try {
-                        const data = JSON.parse(line.slice(6));
-                        console.log('[STREAM] Parsed data:', data);
-
-                        if (data.type === 'agent_selected' && onAgentSelected) {
-                            onAgentSelected(data);
-                        } else if (data.type === 'chunk' && onChunk) {
-                            console.log('[STREAM] Chunk content:', data.content);
-                            onChunk(data.content);
-                        } else if (data.type === 'actions_applied' && onActionsApplied) {
-                            // Sprint 3: Action Feedback UX
-                            onActionsApplied(data.actions);
-                        } else if (data.type === 'error' && onError) {
-                            onError(data.error);
-                        } else if (data.type === 'done' && onDone) {
-                            onDone();
-                            return; // Stop processing
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                let chunk;
+                try {
+                    chunk = await reader.read();
+                } catch (networkError) {
+                    networkError.retryable = true;
+                    throw networkError;
+                }
+                const { done, value } = chunk;
+                if (done) {
+                    // Closed without a done event: the connection dropped mid-stream
+                    if (lastEventId) {
+                        const dropped = new Error('Stream interrupted');
+                        dropped.retryable = true;
+                        throw dropped;
+                    }
+                    if (onDone) onDone();
+                    return;
+                }
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop() || '';
+
+                for (const line of lines) {
+                    if (line.startsWith('id: ')) {
+                        lastEventId = line.slice(4).trim();
+                    } else if (line.startsWith('data: ')) {
+                        try {
+                            const data = JSON.parse(line.slice(6));
+                            console.log('[STREAM] Parsed data:', data);
+                            attempt = 0;
+
+                            if (data.type === 'agent_selected' && onAgentSelected) {
+                                onAgentSelected(data);
+                            } else if (data.type === 'chunk' && onChunk) {
+                                console.log('[STREAM] Chunk content:', data.content);
+                                onChunk(data.content);
+                            } else if (data.type === 'resync' && onResync) {
+                                // Part of what we missed is gone: replace the text so far
+                                onResync(data.content);
+                            } else if (data.type === 'actions_applied' && onActionsApplied) {
+                                // Sprint 3: Action Feedback UX
+                                onActionsApplied(data.actions);
+                            } else if (data.type === 'error' && onError) {
+                                onError(data.error);
+                            } else if (data.type === 'done' && onDone) {
+                                onDone();
+                                return; // Stop processing
+                            }
+                        } catch (e) {
+                            console.error('JSON parse error:', e, 'Line:', line);
                         }
-                    } catch (e) {
-                        console.error('JSON parse error:', e, 'Line:', line);
                     }
                 }
             }
+        } catch (error) {
+            if (error.retryable && lastEventId && attempt < STREAM_RESUME_ATTEMPTS) {
+                attempt += 1;
+                console.warn(`[STREAM] Connection lost, resuming from ${lastEventId} (attempt ${attempt})`);
+                await sleep(500 * 2 ** (attempt - 1));
+                continue;
+            }
+            if (onError) onError(error.message);
+            return;
         }
-    } catch (error) {
-        if (onError) onError(error.message);
     }
 };
 
-export const getSessions = async () => {
-    return client.get('/my-sessions/');
+// params: { limit, cursor } — cursor is next_cursor from the previous page
+export const getSessions = async (params = {}) => {
+    return client.get('/my-sessions/', { params });
+};
+
+// params: { limit, before, after } — cursors come from the previous response
+export const getSessionMessages = async (sessionId, params = {}) => {
+    return client.get(`/sessions/${sessionId}/messages/`, { params });
 };
 
-export const getSessionMessages = async (sessionId) => {
-    return client.get(`/sessions/${sessionId}/messages/`);
+export const searchMessages = async (q, params = {}) => {
+    return client.get('/search/', { params: { q, ...params } });
 };
 
 export const saveMealPlan = async (mealPlanData) => {
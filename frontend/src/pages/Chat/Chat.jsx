@@ -48,6 +48,7 @@ const Chat = () => {
         appendUserMessage,
         appendAgentPlaceholder,
         appendChunk,
+        replaceLastContent,
         setLastMsgAgent,
         setLastMsgActions,
         deleteMessage,
@@ -81,6 +82,7 @@ const Chat = () => {
         appendUserMessage,
         appendAgentPlaceholder,
         appendChunk,
+        replaceLastContent,
         setLastMsgAgent,
         setLastMsgActions,
     });
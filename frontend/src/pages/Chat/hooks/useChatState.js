@@ -50,6 +50,15 @@ export function useChatState() {
         });
     };
 
+    /** Replace the streaming message's text (a resumed stream resynchronising) */
+    const replaceLastContent = (content) => {
+        setMessages(prev => {
+            const next = [...prev];
+            next[next.length - 1] = { ...next[next.length - 1], content };
+            return next;
+        });
+    };
+
     const setLastMsgAgent = (agentName, rawAgent) => {
         setMessages(prev => {
             const next = [...prev];
@@ -102,6 +111,7 @@ export function useChatState() {
         appendUserMessage,
         appendAgentPlaceholder,
         appendChunk,
+        replaceLastContent,
         setLastMsgAgent,
         setLastMsgActions,
         deleteMessage,
@@ -18,6 +18,7 @@ export function useChatTransport({
     appendUserMessage,
     appendAgentPlaceholder,
     appendChunk,
+    replaceLastContent,
     setLastMsgAgent,
     setLastMsgActions,
 }) {
@@ -36,6 +37,7 @@ export function useChatTransport({
             message: content,
             sessionId,
             onChunk: (chunk) => appendChunk(chunk),
+            onResync: (content) => replaceLastContent(content),
             onAgentSelected: (data) => {
                 if (!sessionId && data.session_id) setSessionId(data.session_id);
                 const agentName = data.agent
@@ -50,7 +52,7 @@ export function useChatTransport({
                 setIsTyping(false);
                 try {
                     const sessionsResponse = await getSessions();
-                    setSessions(sessionsResponse.data);
+                    setSessions(sessionsResponse.data.results);
                 } catch (err) {
                     console.error('Failed to refresh sessions:', err);
                 }
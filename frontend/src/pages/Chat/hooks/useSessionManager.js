@@ -24,7 +24,7 @@ export function useSessionManager({
         const loadChatHistory = async () => {
             try {
                 const sessionsResponse = await getSessions();
-                const loadedSessions = sessionsResponse.data;
+                const loadedSessions = sessionsResponse.data.results;
                 setSessions(loadedSessions);
 
                 if (loadedSessions?.length > 0) {
@@ -32,7 +32,7 @@ export function useSessionManager({
                     setSessionId(lastSession.session_id);
 
                     const messagesResponse = await getSessionMessages(lastSession.session_id);
-                    const loadedMessages = _mapMessages(messagesResponse.data);
+                    const loadedMessages = _mapMessages(messagesResponse.data.results);
                     setMessages(loadedMessages);
 
                     if (loadedMessages.length > 0 && !historyLoadedRef.current) {
@@ -60,7 +60,7 @@ export function useSessionManager({
             setSessionId(sid);
             setSavedItemsMap({});
             const messagesResponse = await getSessionMessages(sid);
-            setMessages(_mapMessages(messagesResponse.data));
+            setMessages(_mapMessages(messagesResponse.data.results));
         } catch (error) {
             console.error('Failed to load session:', error);
         } finally {
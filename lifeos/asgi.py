@@ -2,6 +2,9 @@
 ASGI config for LifeOS project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSockets on ``/ws/chat/`` go to the chat transport
+in ``api.websocket`` (run under an ASGI server, e.g.
+``uvicorn lifeos.asgi:application``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +16,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lifeos.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from api.websocket import chat_socket, reject_socket  # noqa: E402
+
+WEBSOCKET_ROUTES = {
+    '/ws/chat/': chat_socket,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        handler = WEBSOCKET_ROUTES.get(scope['path'], reject_socket)
+        return await handler(scope, receive, send)
+    return await django_application(scope, receive, send)